@@ -0,0 +1,60 @@
+"""
+Versioned cache of the public book catalog.
+
+Every write to ``Book`` bumps a version counter once its transaction
+commits. Cached list responses and ETags embed the version, so a bump
+invalidates all of them at once and a matching ``If-None-Match`` can be
+answered without touching the database.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = "book_service:catalog_version"
+CATALOG_RESPONSE_TIMEOUT = 60 * 60
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a counter lost to eviction or a restart
+        # never reuses a version that cached responses are stored under.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version() -> int:
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def bump_catalog_version_on_commit() -> None:
+    # Bumping before commit would let a reader cache pre-commit rows under
+    # the new version.
+    transaction.on_commit(bump_catalog_version)
+
+
+def _url_digest(url: str) -> str:
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def catalog_key(version: int, url: str) -> str:
+    return f"book_service:catalog:{version}:{_url_digest(url)}"
+
+
+def catalog_etag(version: int, url: str) -> str:
+    return f'"{version}-{_url_digest(url)[:16]}"'
@@ -0,0 +1,38 @@
+from book_service.models import Book
+from book_service.serializers import BookSerializer
+from library_service.imports import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_READERS,
+    RowValidator,
+    import_rows,
+)
+
+# Imported columns that replace those of a book with the same ISBN. The
+# inventory is only imported with new books: for a stored one it counts the
+# copies on the shelf, which borrowings, returns and waitlist holds keep up
+# to date, so a catalog row must not overwrite it.
+UPSERT_FIELDS = ["title", "author", "cover", "daily_fee"]
+
+
+def save_books(rows):
+    """Insert the books of ``rows`` or update those whose ISBN exists"""
+    # A later row of the same ISBN wins; not every database lets one
+    # statement touch a row twice.
+    books = {row["isbn"]: row for row in rows}
+    Book.objects.upsert(
+        list(books.values()), unique_fields=["isbn"], update_fields=UPSERT_FIELDS
+    )
+
+
+def import_books(stream, import_type, batch_size=IMPORT_BATCH_SIZE, on_progress=None):
+    """
+    Upsert the books of the binary ``stream`` of an ``import_type`` file by
+    ISBN, validated like ``BookSerializer`` input; returns the report
+    """
+    return import_rows(
+        IMPORT_READERS[import_type](stream),
+        RowValidator(BookSerializer, required=("isbn",)),
+        save_books,
+        batch_size=batch_size,
+        on_progress=on_progress,
+    )
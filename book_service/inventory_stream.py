@@ -0,0 +1,300 @@
+"""
+Server-sent events stream of book inventory changes.
+
+Every committed change to a book's inventory is published to ``broker``:
+copies taken or put back by borrowings as ``delta`` events, the inventory
+written by book creates and updates as ``inventory`` events, and deleted
+books as ``deleted`` events. Changes that are not known per book, such as
+catalog imports, publish a ``resync`` event, after which clients should
+reload the books they show.
+
+The broker keeps the latest ``INVENTORY_STREAM_HISTORY`` events in a ring
+that every stream reads at its own position. A publish wakes each event
+loop with streams once, whatever the number of streams, and a slow client
+only falls behind on its own. Streams are served at ``STREAM_PATH`` by the
+ASGI application as coroutines, so idle clients hold no thread. A client
+reconnecting with ``Last-Event-ID`` is sent the events it missed, or
+``resync`` once they have left the ring.
+
+The broker is per process: a stream sees the writes made by its own
+process, so the API must be served by the same ASGI process. Queryset
+updates of the inventory that bypass ``BookManager`` are not published.
+A process serves at most ``INVENTORY_STREAM_MAX_CONNECTIONS`` streams;
+further clients are answered 503 with ``Retry-After``.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+
+from django.conf import settings
+from django.db import transaction
+
+STREAM_PATH = "/api/book-service/books/inventory-stream/"
+HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    # Proxies such as nginx must pass events on as they come.
+    (b"x-accel-buffering", b"no"),
+]
+KEEPALIVE = b": keepalive\n\n"
+# Seconds a client turned away for too many streams is asked to wait
+RETRY_AFTER_SECONDS = 10
+
+
+class InventoryBroker:
+    """Ring of the latest inventory events, read by streams on event loops"""
+
+    def __init__(self, history):
+        self.history = history
+        self._reset()
+        # A forked server worker starts its own history, under its own epoch.
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=self.history)
+        self.last_id = 0
+        # Event ids start with the epoch, so an id sent by an earlier process
+        # or another worker is never taken for one of ours.
+        self.epoch = format(time.time_ns(), "x")
+        # loop -> [streams, keepalive timer]; changed under the lock.
+        self._loops = {}
+        # loop -> futures of the loop's waiting streams; only used in its loop.
+        self._waiters = {}
+
+    @property
+    def streams(self):
+        with self._lock:
+            return sum(streams for streams, _ in self._loops.values())
+
+    def _format(self, event_id, name, data):
+        return (
+            f"id: {self.epoch}-{event_id}\nevent: {name}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+        ).encode()
+
+    def publish(self, events):
+        """Send ``(name, data)`` events to every stream; safe from any thread"""
+        with self._lock:
+            for name, data in events:
+                self.last_id += 1
+                self._events.append(self._format(self.last_id, name, data))
+            loops = list(self._loops)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop, True)
+            except RuntimeError:
+                # The loop was closed with its streams still registered.
+                pass
+
+    def _wake(self, loop, published):
+        for waiter in self._waiters.pop(loop, ()):
+            # Streams cancelled while waiting leave their future behind.
+            if not waiter.done():
+                waiter.set_result(published)
+
+    def _tick(self, loop):
+        with self._lock:
+            if loop not in self._loops:
+                return
+            self._loops[loop][1] = loop.call_later(
+                settings.INVENTORY_STREAM_KEEPALIVE_SECONDS, self._tick, loop
+            )
+        self._wake(loop, False)
+
+    def _subscribe(self, loop):
+        with self._lock:
+            if loop in self._loops:
+                self._loops[loop][0] += 1
+                return
+            self._loops[loop] = [
+                1,
+                loop.call_later(
+                    settings.INVENTORY_STREAM_KEEPALIVE_SECONDS, self._tick, loop
+                ),
+            ]
+
+    def _unsubscribe(self, loop):
+        with self._lock:
+            self._loops[loop][0] -= 1
+            if self._loops[loop][0]:
+                return
+            _, timer = self._loops.pop(loop)
+        timer.cancel()
+        self._waiters.pop(loop, None)
+
+    def _position(self, last_event_id):
+        """Id after which a stream resuming from ``last_event_id`` reads"""
+        epoch, _, event_id = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not event_id.isdigit():
+            return None
+        return int(event_id) if int(event_id) <= self.last_id else None
+
+    def _read(self, position):
+        """Encoded events after id ``position``, and the id they end at"""
+        with self._lock:
+            missed = self.last_id - position
+            if missed > len(self._events):
+                return self._format(self.last_id, "resync", {}), self.last_id
+            events = self._events
+            return (
+                b"".join(events[i] for i in range(len(events) - missed, len(events))),
+                self.last_id,
+            )
+
+    async def _wait(self, loop):
+        """Wait for a publish, True, or the next keepalive, False"""
+        waiter = loop.create_future()
+        self._waiters.setdefault(loop, []).append(waiter)
+        return await waiter
+
+    async def stream(self, last_event_id=None):
+        """
+        Encoded events published after ``last_event_id``, or from now on,
+        and a keepalive comment whenever the stream has been idle for
+        ``INVENTORY_STREAM_KEEPALIVE_SECONDS``
+        """
+        loop = asyncio.get_running_loop()
+        self._subscribe(loop)
+        try:
+            position = self._position(last_event_id)
+            # EventSource reconnects after this many milliseconds.
+            yield b"retry: 3000\n\n"
+            if position is None:
+                position = self.last_id
+                if last_event_id is not None:
+                    yield self._format(position, "resync", {})
+
+            keepalive = False
+            while True:
+                # Nothing may be awaited between reading the ring and
+                # waiting, or a publish in between would not wake the stream.
+                chunk, position = self._read(position)
+                if chunk or keepalive:
+                    yield chunk or KEEPALIVE
+                    keepalive = False
+                    continue
+                keepalive = not await self._wait(loop)
+        finally:
+            self._unsubscribe(loop)
+
+
+broker = InventoryBroker(settings.INVENTORY_STREAM_HISTORY)
+
+
+def publish_on_commit(events):
+    """Publish ``(name, data)`` events once the current transaction commits"""
+    # Events of a rolled back write must never reach clients.
+    transaction.on_commit(functools.partial(broker.publish, events))
+
+
+def publish_deltas_on_commit(counts, sign):
+    """Publish a ``delta`` event of ``sign * counts[book_id]`` for every book"""
+    publish_on_commit(
+        [
+            ("delta", {"book": book_id, "delta": sign * count})
+            for book_id, count in counts.items()
+        ]
+    )
+
+
+def security_headers():
+    """Headers ``SecurityMiddleware`` adds to every response"""
+    headers = []
+    if settings.SECURE_CONTENT_TYPE_NOSNIFF:
+        headers.append((b"x-content-type-options", b"nosniff"))
+    if settings.SECURE_REFERRER_POLICY:
+        policy = settings.SECURE_REFERRER_POLICY
+        if not isinstance(policy, str):
+            policy = ",".join(policy)
+        headers.append((b"referrer-policy", policy.encode()))
+    if settings.SECURE_CROSS_ORIGIN_OPENER_POLICY:
+        headers.append(
+            (
+                b"cross-origin-opener-policy",
+                settings.SECURE_CROSS_ORIGIN_OPENER_POLICY.encode(),
+            )
+        )
+    return headers
+
+
+class InventoryStreamMiddleware:
+    """
+    ASGI middleware serving the inventory stream at ``STREAM_PATH`` and
+    passing every other request on to ``app``.
+
+    The stream bypasses Django's handler, which would keep a thread for
+    every open stream: each of its requests runs its sync code in a thread
+    of its own that lives as long as the request does. It therefore sets
+    the headers of ``SecurityMiddleware`` itself.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.streams = 0
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != STREAM_PATH:
+            return await self.app(scope, receive, send)
+        if scope["method"] != "GET":
+            return await self._refuse(send, 405, [(b"allow", b"GET")])
+        with self._lock:
+            full = self.streams >= settings.INVENTORY_STREAM_MAX_CONNECTIONS
+            if not full:
+                self.streams += 1
+        if full:
+            return await self._refuse(
+                send, 503, [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())]
+            )
+
+        try:
+            last_event_id = dict(scope["headers"]).get(b"last-event-id")
+            stream = broker.stream(last_event_id and last_event_id.decode("latin-1"))
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": HEADERS + security_headers(),
+                }
+            )
+            sending = asyncio.ensure_future(self._send_events(stream, send))
+            listening = asyncio.ensure_future(self._wait_for_disconnect(receive))
+            try:
+                await asyncio.wait(
+                    (sending, listening), return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                sending.cancel()
+                listening.cancel()
+                await asyncio.gather(sending, listening, return_exceptions=True)
+        finally:
+            with self._lock:
+                self.streams -= 1
+
+    @staticmethod
+    async def _refuse(send, status, headers):
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _send_events(stream, send):
+        async with aclosing(stream):
+            async for chunk in stream:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from book_service.models import Book
+from book_service.search import search_books
+from library_service.benchmarking import format_summary, isolated_database, summarize
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zen", "dor", "wyn"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the first page of FTS5 book search with an icontains "
+        "(LIKE) scan over a large catalog"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--page-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        words = sorted(
+            {
+                "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+                for _ in range(20_000)
+            }
+        )
+
+        with isolated_database():
+            started = time.perf_counter()
+            self.seed(rng, words, options["books"])
+            self.stdout.write(
+                f"seeded {options['books']} books "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+            page = options["page_size"]
+
+            def fts(term):
+                return search_books(Book.objects.all(), term).order_by("rank", "id")[
+                    :page
+                ]
+
+            def like(term):
+                return Book.objects.filter(
+                    Q(title__icontains=term) | Q(author__icontains=term)
+                ).order_by("id")[:page]
+
+            # Rare terms force the LIKE scan through the whole table.
+            terms = rng.sample(words, options["queries"])
+            missing = [f"qx{i}" for i in range(options["queries"])]
+            for label, samples in (
+                ("fts5 search", self.measure(fts, terms)),
+                ("icontains scan", self.measure(like, terms)),
+                ("fts5 search, no match", self.measure(fts, missing)),
+                ("icontains scan, no match", self.measure(like, missing)),
+            ):
+                self.stdout.write(format_summary(label, summarize(samples)))
+
+    @staticmethod
+    def measure(build_queryset, terms):
+        samples = []
+        for term in terms:
+            started = time.perf_counter()
+            list(build_queryset(term).values_list("id", flat=True))
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    @staticmethod
+    def seed(rng, words, count, batch_size=20_000):
+        for start in range(0, count, batch_size):
+            Book.objects.bulk_create(
+                Book(
+                    title=" ".join(rng.choices(words, k=rng.randint(1, 5))).title(),
+                    author=" ".join(rng.choices(words, k=2)).title(),
+                    cover="hard",
+                    inventory=1,
+                    daily_fee=1,
+                )
+                for _ in range(min(batch_size, count - start))
+            )
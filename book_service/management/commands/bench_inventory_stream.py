@@ -0,0 +1,125 @@
+import asyncio
+import resource
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory
+
+from book_service.inventory_stream import STREAM_PATH, broker
+from book_service.models import Book
+from library_service.asgi import application
+from library_service.benchmarking import format_summary, isolated_database, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold many inventory streams open on the ASGI application, make "
+        "borrow and return writes from a worker thread and measure how long "
+        "their events take to reach every stream"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--streams", type=int, default=5000)
+        parser.add_argument("--events", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            book = Book.objects.create(
+                title="stream", author="bench", cover="hard", inventory=1, daily_fee=1
+            )
+            connection.close()
+            asyncio.run(self.run(book.id, **options))
+
+    async def run(self, book_id, streams, events, interval, **options):
+        scope = AsyncRequestFactory().get(STREAM_PATH).scope
+        disconnect = asyncio.Event()
+        arrivals = []
+        subscribed = asyncio.Event()
+        connected = delivered = 0
+
+        async def client():
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    await disconnect.wait()
+                    return {"type": "http.disconnect"}
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                nonlocal connected, delivered
+                body = message.get("body", b"")
+                if body.startswith(b"id:"):
+                    # Events published while a stream was sending arrive
+                    # together.
+                    arrivals.append((time.perf_counter(), body))
+                    delivered += body.count(b"id: ")
+                elif body.startswith(b"retry:"):
+                    connected += 1
+                    if connected == streams:
+                        subscribed.set()
+
+            await application(dict(scope), receive, send)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        clients = [asyncio.ensure_future(client()) for _ in range(streams)]
+        await subscribed.wait()
+        self.stdout.write(
+            f"{broker.streams} streams open in "
+            f"{time.perf_counter() - started:.1f}s, "
+            f"{threading.active_count()} threads, max RSS +"
+            f"{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024:.0f}MB"
+        )
+
+        # Writes come from a thread, as those of the sync views do.
+        sent = await asyncio.to_thread(self.write, book_id, events, interval)
+        deadline = time.perf_counter() + 30
+        while delivered < streams * events and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+        disconnect.set()
+        await asyncio.gather(*clients)
+
+        latencies = []
+        last_arrival = {}
+        for arrived, body in arrivals:
+            for line in body.splitlines():
+                if line.startswith(b"id: "):
+                    event_id = int(line.rpartition(b"-")[2])
+                    latencies.append(arrived - sent[event_id])
+                    last_arrival[event_id] = max(arrived, last_arrival.get(event_id, 0))
+        self.stdout.write(
+            f"delivered {delivered} of {streams * events} events, "
+            f"{broker.streams} streams left open"
+        )
+        self.stdout.write(format_summary("delivery, per stream", summarize(latencies)))
+        self.stdout.write(
+            format_summary(
+                "delivery, to the last stream",
+                summarize(
+                    [arrived - sent[event] for event, arrived in last_arrival.items()]
+                ),
+            )
+        )
+
+    @staticmethod
+    def write(book_id, events, interval):
+        """Borrow and return a copy in turn; commit time of every event id"""
+        sent = {}
+        for i in range(events):
+            time.sleep(interval)
+            started = time.perf_counter()
+            with transaction.atomic():
+                if i % 2:
+                    Book.objects.put_back_copies({book_id: 1})
+                else:
+                    Book.objects.take_copy(book_id)
+            sent[broker.last_id] = started
+        connection.close()
+        return sent
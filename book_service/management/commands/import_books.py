@@ -0,0 +1,58 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book_service.imports import import_books
+from library_service.imports import IMPORT_BATCH_SIZE, IMPORT_TYPES
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert books by ISBN from an NDJSON or CSV file, streamed in "
+        "batches, reporting progress and the errors of invalid rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--type",
+            choices=list(IMPORT_TYPES),
+            help="File type; by default csv for .csv files, ndjson otherwise",
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        import_type = options["type"] or (
+            "csv" if options["path"].lower().endswith(".csv") else "ndjson"
+        )
+        try:
+            file = open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc.strerror}")
+
+        with file:
+            report = import_books(
+                file,
+                import_type,
+                batch_size=options["batch_size"],
+                on_progress=self.progress,
+            )
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        if report.failed > len(report.errors):
+            self.stderr.write(
+                f"... {report.failed - len(report.errors)} more invalid rows"
+            )
+        self.stdout.write(
+            f"imported {report.imported} of {report.rows} rows from "
+            f"{os.path.basename(options['path'])}, "
+            f"{report.rows_per_second:.0f} rows/s"
+        )
+
+    def progress(self, report):
+        self.stdout.write(
+            f"{report.rows} rows: {report.imported} imported, "
+            f"{report.failed} invalid, {report.rows_per_second:.0f} rows/s"
+        )
@@ -0,0 +1,99 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:37
+
+import book_service.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE book_service_book_fts USING fts5(
+        title,
+        author,
+        content='book_service_book',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER book_service_book_fts_insert AFTER INSERT ON book_service_book
+    BEGIN
+        INSERT INTO book_service_book_fts (rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER book_service_book_fts_delete AFTER DELETE ON book_service_book
+    BEGIN
+        INSERT INTO book_service_book_fts (book_service_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    # Only title and author changes touch the index; inventory updates on
+    # every borrow and return must not pay for reindexing.
+    """
+    CREATE TRIGGER book_service_book_fts_update
+    AFTER UPDATE OF title, author ON book_service_book
+    BEGIN
+        INSERT INTO book_service_book_fts (book_service_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO book_service_book_fts (rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    "INSERT INTO book_service_book_fts (book_service_book_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS book_service_book_fts_insert",
+    "DROP TRIGGER IF EXISTS book_service_book_fts_delete",
+    "DROP TRIGGER IF EXISTS book_service_book_fts_update",
+    "DROP TABLE IF EXISTS book_service_book_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book_service", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchIndex",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="book_service.book",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("author", models.TextField()),
+                (
+                    "document",
+                    book_service.models.SearchField(db_column="book_service_book_fts"),
+                ),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "book_service_book_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(run_on_sqlite(FTS_SQL), run_on_sqlite(DROP_FTS_SQL)),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:29
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module("book_service.migrations.0002_book_search_index")
+
+# SQLite rebuilds the book table to add or drop a unique column, which
+# drops the triggers that keep the search index in sync.
+TRIGGERS_SQL = [sql for sql in search_index.FTS_SQL if "CREATE TRIGGER" in sql]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book_service", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, search_index.run_on_sqlite(TRIGGERS_SQL)
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="isbn",
+            field=models.CharField(blank=True, max_length=17, null=True, unique=True),
+        ),
+        migrations.RunPython(
+            search_index.run_on_sqlite(TRIGGERS_SQL), migrations.RunPython.noop
+        ),
+    ]
@@ -2,15 +2,114 @@ import enum
 
 from django.db import models
 
+from book_service.cache import bump_catalog_version_on_commit
+from book_service.inventory_stream import publish_deltas_on_commit, publish_on_commit
+from library_service.imports import upsert
+
 
 class CoverType(enum.Enum):
     hard = "HARD"
     soft = "SOFT"
 
 
+class BookQuerySet(models.QuerySet):
+    """
+    Bumps the catalog version, and publishes the inventory of the books, on
+    writes that bypass model signals
+    """
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if updated:
+            bump_catalog_version_on_commit()
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            bump_catalog_version_on_commit()
+            publish_on_commit(
+                [
+                    ("inventory", {"book": book.pk, "inventory": book.inventory})
+                    for book in created
+                    if book.pk is not None
+                ]
+            )
+        return created
+
+    def upsert(self, rows, unique_fields, update_fields):
+        """Insert book ``rows`` or update those that match on ``unique_fields``"""
+        upsert(self.model, rows, unique_fields, update_fields, using=self.db)
+        if rows:
+            bump_catalog_version_on_commit()
+            # The ids of the upserted books are not known.
+            publish_on_commit([("resync", {})])
+
+
+class BookManager(models.Manager.from_queryset(BookQuerySet)):
+    """
+    Inventory changes are single conditional UPDATE statements, so that
+    concurrent borrows and returns never lose or duplicate a copy. Each one
+    publishes its deltas to the inventory stream on commit.
+    """
+
+    def take_copy(self, book_id) -> bool:
+        """Decrement inventory if a copy is available; False if none is"""
+        taken = bool(
+            self.filter(pk=book_id, inventory__gt=0).update(
+                inventory=models.F("inventory") - 1
+            )
+        )
+        if taken:
+            publish_deltas_on_commit({book_id: 1}, -1)
+        return taken
+
+    @staticmethod
+    def _copies(counts: dict):
+        return models.Case(
+            *(
+                models.When(pk=book_id, then=models.Value(count))
+                for book_id, count in counts.items()
+            ),
+            output_field=models.PositiveIntegerField(),
+        )
+
+    def take_copies(self, counts: dict) -> bool:
+        """
+        Take ``counts[book_id]`` copies of every book in one UPDATE.
+
+        Either every book has enough copies and all are taken, or the
+        update is incomplete and False is returned; callers must then roll
+        back their transaction.
+        """
+        if not counts:
+            return True
+        enough_copies = models.Q()
+        for book_id, count in counts.items():
+            enough_copies |= models.Q(pk=book_id, inventory__gte=count)
+        updated = self.filter(enough_copies).update(
+            inventory=models.F("inventory") - self._copies(counts)
+        )
+        if updated != len(counts):
+            return False
+        publish_deltas_on_commit(counts, -1)
+        return True
+
+    def put_back_copies(self, counts: dict) -> None:
+        """Return ``counts[book_id]`` copies of every book in one UPDATE"""
+        if not counts:
+            return
+        self.filter(pk__in=counts).update(
+            inventory=models.F("inventory") + self._copies(counts)
+        )
+        publish_deltas_on_commit(counts, 1)
+
+
 class Book(models.Model):
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255)
+    # Natural key of catalog imports; books added by hand may have none.
+    isbn = models.CharField(max_length=17, unique=True, null=True, blank=True)
     cover = models.CharField(
         max_length=4, choices=[(tag.name, tag.value) for tag in CoverType]
     )
@@ -20,5 +119,46 @@ class Book(models.Model):
         decimal_places=2,
     )
 
+    objects = BookManager()
+
     def __str__(self) -> str:
         return self.title
+
+
+class SearchField(models.TextField):
+    """Hidden column named after an FTS5 table, the left side of MATCH"""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+class BookSearchIndex(models.Model):
+    """
+    FTS5 index of book titles and authors, SQLite only.
+
+    The table is created by a migration and kept in sync with the book
+    table by triggers, so it also follows bulk and queryset writes.
+    """
+
+    book = models.OneToOneField(
+        Book,
+        primary_key=True,
+        db_column="rowid",
+        on_delete=models.DO_NOTHING,
+        related_name="search_index",
+    )
+    title = models.TextField()
+    author = models.TextField()
+    document = SearchField(db_column="book_service_book_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "book_service_book_fts"
@@ -0,0 +1,44 @@
+"""
+Full-text search over book titles and authors.
+
+On SQLite the ``book_service_book_fts`` FTS5 index answers prefix queries
+ranked by bm25; other backends fall back to ``icontains`` on both columns.
+Either way every term of the query must match.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import F, Q
+
+TERM = re.compile(r"\w+")
+
+
+def search_terms(text: str) -> list[str]:
+    return TERM.findall(text)
+
+
+def fts_query(terms: list[str]) -> str:
+    """FTS5 query matching every term as a prefix"""
+    # Quoting keeps user input from being parsed as FTS5 query syntax.
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_books(queryset, text: str):
+    """
+    Filter books matching ``text``. On SQLite the result is annotated with
+    ``rank``, lower meaning more relevant.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == "sqlite":
+        return queryset.filter(search_index__document__match=fts_query(terms)).annotate(
+            rank=F("search_index__rank")
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(author__icontains=term)
+    return queryset.filter(condition)
@@ -1,9 +1,28 @@
 from rest_framework import serializers
 
 from book_service.models import Book
+from library_service.projection import Projection
 
 
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
-        fields = ["id", "title", "author", "cover", "inventory", "daily_fee"]
+        fields = ["id", "title", "author", "isbn", "cover", "inventory", "daily_fee"]
+        # Blank ISBNs would collide on the unique constraint; omit it instead.
+        extra_kwargs = {"isbn": {"allow_blank": False}}
+
+
+class BookImportErrorSerializer(serializers.Serializer):
+    line = serializers.IntegerField()
+    errors = serializers.DictField()
+
+
+class BookImportReportSerializer(serializers.Serializer):
+    rows = serializers.IntegerField()
+    imported = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    errors = BookImportErrorSerializer(many=True)
+
+
+class BookProjection(Projection):
+    serializer_class = BookSerializer
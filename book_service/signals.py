@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from book_service.cache import bump_catalog_version_on_commit
+from book_service.inventory_stream import publish_on_commit
+from book_service.models import Book
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Book)
+def publish_inventory(sender, instance, update_fields=None, **kwargs):
+    # A save writes the inventory it holds, whatever borrowings took since
+    # the book was read, so clients are sent the count rather than a delta.
+    if update_fields is None or "inventory" in update_fields:
+        publish_on_commit(
+            [("inventory", {"book": instance.pk, "inventory": instance.inventory})]
+        )
+
+
+@receiver(post_delete, sender=Book)
+def publish_deleted(sender, instance, **kwargs):
+    publish_on_commit([("deleted", {"book": instance.pk})])
@@ -1,3 +1,633 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import CharField
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service import inventory_stream
+from book_service.inventory_stream import InventoryBroker
+from book_service.models import Book
+from book_service.serializers import BookSerializer
+from library_service.asgi import application
+from library_service.asyncviews import AsyncReadASGIHandler
+from library_service import imports as library_imports
+from library_service.imports import RowValidator
+from library_service.pagination import KeysetPagination
+
+BOOK_URL = reverse("book:book-list")
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "book",
+        "author": "author",
+        "inventory": 10,
+        "cover": "hard",
+        "daily_fee": 10.00,
+    }
+    defaults.update(params)
+    return Book.objects.create(**defaults)
+
+
+def detail_url(book_id):
+    return reverse("book:book-detail", args=[book_id])
+
+
+class PublicBookApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_list_books_is_paginated_by_id(self):
+        books = [sample_book(title=f"book {i}") for i in range(5)]
+
+        first = self.client.get(BOOK_URL, {"page_size": 3})
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            first.data["results"] + second.data["results"],
+            BookSerializer(books, many=True).data,
+        )
+        self.assertIsNone(second.data["next"])
+
+    def test_tampered_cursor_is_invalid(self):
+        sample_book()
+        pagination = KeysetPagination()
+        for position in (["x"], [{"a": 1}]):
+            res = self.client.get(
+                BOOK_URL, {"cursor": pagination.encode_cursor(position)}
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND, position)
+        res = self.client.get(
+            BOOK_URL, {"search": "book", "cursor": pagination.encode_cursor(["x", 1])}
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.book = sample_book()
+
+    def test_matching_etag_returns_304_without_queries(self):
+        res = self.client.get(BOOK_URL)
+        etag = res["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_cached_catalog_is_served_without_queries(self):
+        first = self.client.get(BOOK_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(BOOK_URL)
+
+        self.assertEqual(second.data, first.data)
+
+    def test_book_update_invalidates_catalog(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        etag = self.client.get(BOOK_URL)["ETag"]
+        self.client.force_authenticate(admin)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(self.book.id), {"title": "renamed"})
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(res.data["results"][0]["title"], "renamed")
+
+    def test_inventory_change_invalidates_catalog(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.take_copy(self.book.id)
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["inventory"], 9)
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.dune = sample_book(title="Dune", author="Frank Herbert")
+        self.children = sample_book(
+            title="Children of Dune and the Golden Path", author="Frank Herbert"
+        )
+        self.emma = sample_book(title="Emma", author="Jane Austen")
+
+    def search(self, text, **params):
+        res = self.client.get(BOOK_URL, {"search": text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in res.data["results"]]
+
+    def test_search_matches_prefixes_of_title_and_author(self):
+        self.assertEqual(self.search("austen"), ["Emma"])
+        self.assertEqual(self.search("Her"), [self.dune.title, self.children.title])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("herbert child"), [self.children.title])
+
+    def test_results_are_ranked_by_relevance(self):
+        shortest_last = sample_book(title="Dune", author="Anonymous")
+        Book.objects.filter(pk=shortest_last.pk).update(title="Dune Dune")
+
+        self.assertEqual(self.search("dune")[0], "Dune Dune")
+
+    def test_ranked_results_are_paginated(self):
+        books = [sample_book(title=f"Dune vol {i}") for i in range(5)]
+
+        titles = []
+        res = self.client.get(BOOK_URL, {"search": "dune", "page_size": 2})
+        while True:
+            titles += [book["title"] for book in res.data["results"]]
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertCountEqual(
+            titles,
+            [self.dune.title, self.children.title] + [book.title for book in books],
+        )
+        self.assertEqual(titles, self.search("dune", page_size=10))
+
+    def test_index_follows_updates_and_deletes(self):
+        self.emma.title = "Persuasion"
+        self.emma.save()
+        self.dune.delete()
+
+        self.assertEqual(self.search("persuasion"), ["Persuasion"])
+        self.assertEqual(self.search("emma"), [])
+        self.assertEqual(self.search("dune"), [self.children.title])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('dune" OR "emma'), [])
+        self.assertEqual(self.search("*"), [])
+
+    def test_other_backends_fall_back_to_icontains(self):
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            titles = self.search("herbert UNE")
+
+        self.assertEqual(titles, [self.dune.title, self.children.title])
+
+
+IMPORT_URL = reverse("book:book-import-books")
+
+
+def ndjson(*rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def book_row(isbn, **params):
+    return {
+        "isbn": isbn,
+        "title": f"Book {isbn}",
+        "author": "Author",
+        "cover": "soft",
+        "inventory": 3,
+        "daily_fee": "1.50",
+        **params,
+    }
+
+
+class BookImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+
+    def import_books(self, body, content_type="application/x-ndjson", **params):
+        url = IMPORT_URL + (f"?{urlencode(params)}" if params else "")
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(url, body, content_type=content_type)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_ndjson_rows_are_upserted_by_isbn(self):
+        existing = sample_book(isbn="111", title="Old title", inventory=1)
+
+        report = self.import_books(
+            ndjson(
+                book_row("111", title="New title", inventory=7),
+                book_row("222", cover="hard", daily_fee=2),
+                book_row("222", title="Last row wins"),
+            )
+        )
+
+        self.assertEqual(report, {"rows": 3, "imported": 3, "failed": 0, "errors": []})
+        existing.refresh_from_db()
+        # The shelf count of a stored book is left to borrowings and returns.
+        self.assertEqual((existing.title, existing.inventory), ("New title", 1))
+        added = Book.objects.get(isbn="222")
+        self.assertEqual(added.title, "Last row wins")
+        self.assertEqual(added.daily_fee, Decimal("1.50"))
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_csv_with_byte_order_mark_is_imported(self):
+        body = "\ufeffisbn,title,author,cover,inventory,daily_fee\r\n" + (
+            '333,"Dune, Messiah",Frank Herbert,hard,5,0.5\r\n'
+        )
+
+        report = self.import_books(body.encode(), content_type="text/csv")
+
+        self.assertEqual(report["imported"], 1)
+        book = Book.objects.get(isbn="333")
+        self.assertEqual((book.title, book.cover), ("Dune, Messiah", "hard"))
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        body = (
+            ndjson(book_row("1"), book_row("2", cover="paper"))
+            + b"not json\n\n"
+            + ndjson({"title": "No ISBN"}, book_row("3", title="Not UTF-8: ?"))
+        ).replace(b"?", b"\xff")
+
+        report = self.import_books(body)
+
+        self.assertEqual((report["rows"], report["imported"]), (5, 1))
+        self.assertEqual(report["failed"], 4)
+        errors = {error["line"]: error["errors"] for error in report["errors"]}
+        self.assertEqual(errors[2], {"cover": ['"paper" is not a valid choice.']})
+        self.assertEqual(errors[3], {"non_field_errors": ["Expected a JSON object."]})
+        self.assertEqual(errors[5]["isbn"], ["This field is required."])
+        self.assertIn("title", errors[6])
+        self.assertEqual(list(Book.objects.values_list("isbn", flat=True)), ["1"])
+
+    def test_fast_validation_matches_the_serializer(self):
+        validator = RowValidator(BookSerializer, required=("isbn",))
+        # Every field of a book has a fast path that agrees with its probes.
+        self.assertTrue(all(fast for _, _, fast in validator.fields))
+        values = {
+            "title": ["Dune", "  Dune  ", "", "x" * 256, "a\x00b", 12, None],
+            "cover": ["hard", "HARD", "", 1],
+            "inventory": ["5", 5, "-1", "5.0", " 5 ", "", True, 2**31],
+            "daily_fee": ["1.5", "01.50", "99.99", "100", "1.505", 3, 1.5, "-1"],
+        }
+        for field, candidates in values.items():
+            for value in candidates:
+                with self.subTest(field=field, value=value):
+                    row = {**book_row("1"), field: value}
+                    serializer = BookSerializer(data=row)
+                    if serializer.is_valid():
+                        self.assertEqual(
+                            validator.validate(row), serializer.validated_data
+                        )
+                    else:
+                        with self.assertRaises(ValidationError) as raised:
+                            validator.validate(row)
+                        self.assertEqual(raised.exception.detail, serializer.errors)
+
+    def test_fast_validation_that_differs_is_not_used(self):
+        def validate(value):
+            return value.upper() if isinstance(value, str) else value
+
+        validate.probes = ["Dune"]
+        with mock.patch.dict(
+            library_imports._FAST_PATHS,
+            {CharField: lambda field: validate},
+        ):
+            validator = RowValidator(BookSerializer, required=("isbn",))
+
+        self.assertEqual(validator.validate(book_row("1"))["title"], "Book 1")
+        fast_paths = {name: fast for name, _, fast in validator.fields}
+        self.assertIsNone(fast_paths["title"])
+        self.assertIsNotNone(fast_paths["inventory"])
+
+    def test_imported_books_are_searchable_and_listed(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        self.import_books(ndjson(book_row("9", title="Persuasion")))
+
+        res = self.client.get(BOOK_URL, {"search": "persuasion"})
+        self.assertEqual([book["isbn"] for book in res.data["results"]], ["9"])
+        self.assertNotEqual(self.client.get(BOOK_URL)["ETag"], etag)
+
+    def test_unknown_type_is_rejected(self):
+        res = self.client.post(IMPORT_URL + "?type=xml", b"", content_type="text/xml")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_is_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@user.user")
+        )
+
+        res = self.client.post(
+            IMPORT_URL, ndjson(book_row("1")), content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Book.objects.exists())
+
+    def test_command_imports_file_in_batches(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+            file.write(b"isbn,title,author,cover,inventory,daily_fee\n")
+            for i in range(5):
+                file.write(f"{i},Book {i},Author,soft,1,1\n".encode())
+            file.write(b"5,Book 5,Author,soft,-1,1\n")
+            file.flush()
+            out, err = io.StringIO(), io.StringIO()
+
+            call_command(
+                "import_books", file.name, batch_size=2, stdout=out, stderr=err
+            )
+
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertEqual(out.getvalue().count("rows:"), 3)
+        self.assertIn("imported 5 of 6 rows", out.getvalue())
+        self.assertIn("line 7:", err.getvalue())
+
+
+STREAM_URL = inventory_stream.STREAM_PATH
+
+
+def parse_events(chunk):
+    """(id, event, data) of every event in a chunk of the stream"""
+    events = []
+    for block in chunk.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if ": " in line
+        )
+        if "event" in fields:
+            events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class InventoryBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = InventoryBroker(history=3)
+
+    @staticmethod
+    def delta(book, delta):
+        return [("delta", {"book": book, "delta": delta})]
+
+    async def test_streams_get_events_published_from_other_threads(self):
+        streams = [self.broker.stream() for _ in range(50)]
+        for stream in streams:
+            await anext(stream)
+        reads = [asyncio.ensure_future(anext(stream)) for stream in streams]
+        await asyncio.sleep(0)
+
+        await asyncio.to_thread(self.broker.publish, self.delta(1, -1))
+        chunks = await asyncio.gather(*reads)
+
+        self.assertEqual(self.broker.streams, 50)
+        self.assertEqual(self.broker.streams, 50)
+        self.assertEqual(
+            [parse_events(chunk) for chunk in chunks],
+            [[(f"{self.broker.epoch}-1", "delta", {"book": 1, "delta": -1})]] * 50,
+        )
+        for stream in streams:
+            await stream.aclose()
+        self.assertEqual(self.broker.streams, 0)
+
+    async def test_reconnect_replays_missed_events(self):
+        self.broker.publish(self.delta(1, -1))
+        self.broker.publish(self.delta(2, -1) + self.delta(3, 1))
+
+        stream = self.broker.stream(f"{self.broker.epoch}-1")
+        await anext(stream)
+        events = parse_events(await anext(stream))
+        await stream.aclose()
+
+        self.assertEqual(
+            [(event_id.split("-")[1], data["book"]) for event_id, _, data in events],
+            [("2", 2), ("3", 3)],
+        )
+
+    async def test_reconnect_resyncs_when_events_are_gone(self):
+        for book in range(5):
+            self.broker.publish(self.delta(book, 1))
+
+        for last_event_id in (
+            f"{self.broker.epoch}-1",
+            f"{self.broker.epoch}-99",
+            "0-5",
+            "garbage",
+        ):
+            stream = self.broker.stream(last_event_id)
+            await anext(stream)
+            events = parse_events(await anext(stream))
+            await stream.aclose()
+
+            self.assertEqual(
+                events, [(f"{self.broker.epoch}-5", "resync", {})], last_event_id
+            )
+
+    @override_settings(INVENTORY_STREAM_KEEPALIVE_SECONDS=0.01)
+    async def test_idle_streams_get_keepalives(self):
+        stream = self.broker.stream()
+        await anext(stream)
+
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        await stream.aclose()
+
+        self.assertEqual(chunk, inventory_stream.KEEPALIVE)
+
+    async def test_cancelled_stream_leaves_the_others_waiting(self):
+        first, second = self.broker.stream(), self.broker.stream()
+        await anext(first)
+        await anext(second)
+        cancelled = asyncio.ensure_future(anext(first))
+        waiting = asyncio.ensure_future(anext(second))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        self.broker.publish(self.delta(1, 1))
+
+        self.assertEqual(len(parse_events(await waiting)), 1)
+        await second.aclose()
+
+
+class InventoryStreamAsgiTests(SimpleTestCase):
+    @staticmethod
+    def request(path, method="GET", headers=()):
+        """Send a request to the ASGI application; (messages, disconnect)"""
+        scope = AsyncRequestFactory().generic(method, path).scope
+        # As sent by servers; the factory would turn dashes into underscores.
+        scope["headers"] = [*scope["headers"], *headers]
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        handler = asyncio.ensure_future(application(scope, receive, messages.put))
+
+        async def disconnect():
+            disconnected.set()
+            await asyncio.wait_for(handler, 5)
+
+        return messages, disconnect
+
+    async def test_stream_is_served_until_the_client_disconnects(self):
+        messages, disconnect = self.request(STREAM_URL)
+        start = await messages.get()
+        retry = await messages.get()
+        # Published from a thread, like the writes of sync views.
+        thread = threading.Thread(
+            target=inventory_stream.broker.publish,
+            args=[[("delta", {"book": 7, "delta": -1})]],
+        )
+        thread.start()
+        event = await asyncio.wait_for(messages.get(), 5)
+        thread.join()
+        await disconnect()
+
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        self.assertIn((b"x-content-type-options", b"nosniff"), start["headers"])
+        self.assertEqual(retry["body"], b"retry: 3000\n\n")
+        self.assertEqual(
+            parse_events(event["body"])[0][1:], ("delta", {"book": 7, "delta": -1})
+        )
+        self.assertEqual(inventory_stream.broker.streams, 0)
+
+    async def test_last_event_id_header_resumes_the_stream(self):
+        broker = inventory_stream.broker
+        broker.publish([("delta", {"book": 1, "delta": 1})])
+        last_event_id = f"{broker.epoch}-{broker.last_id}"
+        broker.publish([("delta", {"book": 2, "delta": 1})])
+
+        messages, disconnect = self.request(
+            STREAM_URL, headers=[(b"last-event-id", last_event_id.encode())]
+        )
+        await messages.get()
+        await messages.get()
+        event = await asyncio.wait_for(messages.get(), 5)
+        await disconnect()
+
+        self.assertEqual(parse_events(event["body"])[0][2]["book"], 2)
+
+    @override_settings(INVENTORY_STREAM_MAX_CONNECTIONS=1)
+    async def test_streams_beyond_the_limit_are_refused(self):
+        messages, disconnect = self.request(STREAM_URL)
+        self.assertEqual((await messages.get())["status"], 200)
+
+        refused, refused_disconnect = self.request(STREAM_URL)
+        start = await refused.get()
+        await refused_disconnect()
+        await disconnect()
+        again, again_disconnect = self.request(STREAM_URL)
+        again_start = await again.get()
+        await again_disconnect()
+
+        self.assertEqual(start["status"], 503)
+        self.assertIn((b"retry-after", b"10"), start["headers"])
+        self.assertEqual(again_start["status"], 200)
+        self.assertEqual(application.streams, 0)
+
+    async def test_stream_only_accepts_get(self):
+        messages, disconnect = self.request(STREAM_URL, method="POST")
+        start = await messages.get()
+        await disconnect()
+
+        self.assertEqual(start["status"], 405)
+
+    def test_other_requests_are_left_to_django(self):
+        self.assertIsInstance(application.app, AsyncReadASGIHandler)
+
+
+class InventoryPublishingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.book = sample_book(inventory=3)
+        self.publish = mock.patch.object(inventory_stream.broker, "publish").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def published(self):
+        return [event for call in self.publish.call_args_list for event in call[0][0]]
+
+    def test_copies_taken_and_put_back_are_published_on_commit(self):
+        other = sample_book()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Book.objects.take_copy(self.book.id)
+            Book.objects.take_copies({self.book.id: 2, other.id: 1})
+            Book.objects.put_back_copies({other.id: 1})
+        self.assertEqual(self.published(), [])
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(
+            self.published(),
+            [
+                ("delta", {"book": self.book.id, "delta": -1}),
+                ("delta", {"book": self.book.id, "delta": -2}),
+                ("delta", {"book": other.id, "delta": -1}),
+                ("delta", {"book": other.id, "delta": 1}),
+            ],
+        )
+
+    def test_failed_takes_publish_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.take_copies({self.book.id: 4})
+            Book.objects.filter(pk=self.book.id).update(inventory=0)
+            Book.objects.take_copy(self.book.id)
+
+        self.assertEqual(self.published(), [])
+
+    def test_book_writes_publish_their_inventory(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(self.book.id), {"inventory": 8})
+            self.client.delete(detail_url(self.book.id))
+
+        self.assertEqual(
+            self.published(),
+            [
+                ("inventory", {"book": self.book.id, "inventory": 8}),
+                ("deleted", {"book": self.book.id}),
+            ],
+        )
+
+    def test_imports_publish_a_resync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                IMPORT_URL,
+                ndjson(book_row("111")),
+                content_type="application/x-ndjson",
+            )
+
+        self.assertEqual(self.published(), [("resync", {})])
@@ -1,17 +1,189 @@
-from rest_framework import viewsets
+import io
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+
+from book_service.cache import (
+    CATALOG_RESPONSE_TIMEOUT,
+    aget_catalog_version,
+    catalog_etag,
+    catalog_key,
+    get_catalog_version,
+)
 
+from book_service.imports import import_books
 from book_service.models import Book
-from book_service.serializers import BookSerializer
+from book_service.search import search_books
+from book_service.serializers import (
+    BookSerializer,
+    BookProjection,
+    BookImportReportSerializer,
+)
+from library_service.asyncviews import AsyncReadMixin
+from library_service.imports import IMPORT_TYPES
+from library_service.pagination import KeysetPagination
+from library_service.projection import ProjectedListModelMixin
+from library_service.routers import ReplicaReadsMixin, primary_reads
+
+
+class BookPagination(KeysetPagination):
+    ordering = ("id",)
 
+    def get_ordering(self, request, queryset, view):
+        # Search results are ranked; rank ties are broken by id.
+        if "rank" in queryset.query.annotations:
+            return ("rank", "id")
+        return self.ordering
 
-class BookViewSet(viewsets.ModelViewSet):
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="search",
+                type=str,
+                description="Books whose title and author contain words "
+                "starting with every search term, most relevant first "
+                "(e.g., ?search=herb dune)",
+            ),
+        ]
+    )
+)
+class BookViewSet(
+    AsyncReadMixin,
+    ReplicaReadsMixin,
+    ProjectedListModelMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    projection_class = BookProjection
+    pagination_class = BookPagination
+
+    def get_queryset(self):
+        queryset = self.queryset
+        search = self.request.query_params.get("search")
+        if search and self.action == "list":
+            queryset = search_books(queryset, search)
+        return queryset
+
+    def perform_update(self, serializer):
+        # Copies added to the inventory are handed to the waitlist in the
+        # same transaction, before anyone can borrow them from the shelf.
+        with transaction.atomic():
+            super().perform_update(serializer)
 
     def get_permissions(self):
         if self.action == "list":
             return [AllowAny()]
-        elif self.action in ("retrieve", "update", "partial_update", "destroy"):
+        elif self.action in (
+            "retrieve",
+            "update",
+            "partial_update",
+            "destroy",
+            "import_books",
+        ):
             return [IsAdminUser()]
         return [IsAuthenticatedOrReadOnly()]
+
+    def catalog_validators(self, request, version):
+        """
+        ETag and cache key of the requested catalog page at ``version``,
+        with a 304 response when the client has it already
+        """
+        url = request.build_absolute_uri()
+        etag = catalog_etag(version, url)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+            return etag, None, response
+        return etag, catalog_key(version, url), None
+
+    def cached_catalog(self, request):
+        """
+        ETag and cache key of the requested catalog page, with the response
+        when it can be served without building the page
+        """
+        etag, key, response = self.catalog_validators(request, get_catalog_version())
+        if response is None:
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data, headers={"ETag": etag})
+        return etag, key, response
+
+    async def acached_catalog(self, request):
+        etag, key, response = self.catalog_validators(
+            request, await aget_catalog_version()
+        )
+        if response is None:
+            data = await cache.aget(key)
+            if data is not None:
+                response = Response(data, headers={"ETag": etag})
+        return etag, key, response
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the catalog from the versioned cache; a matching
+        ``If-None-Match`` gets 304 without a database query.
+        """
+        etag, key, response = self.cached_catalog(request)
+        if response is None:
+            # The response is cached under the current version, so it must
+            # not be built from a replica that lags behind it.
+            with primary_reads():
+                data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, CATALOG_RESPONSE_TIMEOUT)
+            response = Response(data, headers={"ETag": etag})
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        etag, key, response = await self.acached_catalog(request)
+        if response is None:
+            with primary_reads():
+                data = (await super().alist(request, *args, **kwargs)).data
+            await cache.aset(key, data, CATALOG_RESPONSE_TIMEOUT)
+            response = Response(data, headers={"ETag": etag})
+        return response
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="type",
+                type=str,
+                enum=[*IMPORT_TYPES],
+                description="NDJSON or CSV rows; by default the type of the "
+                "Content-Type header, else NDJSON (e.g., ?type=csv)",
+            ),
+        ],
+        request={
+            content_type: OpenApiTypes.BINARY for content_type in IMPORT_TYPES.values()
+        },
+        responses=BookImportReportSerializer,
+    )
+    @action(methods=["POST"], detail=False, url_path="import")
+    def import_books(self, request):
+        """
+        Upsert books by ISBN from NDJSON or CSV rows with the fields of a
+        book, read from the body as it arrives; invalid rows are skipped and
+        reported with their line number
+        """
+        content_types = {value: key for key, value in IMPORT_TYPES.items()}
+        import_type = request.query_params.get("type") or content_types.get(
+            request.content_type.partition(";")[0].strip(), "ndjson"
+        )
+        if import_type not in IMPORT_TYPES:
+            raise ValidationError(
+                {"type": f"Must be one of: {', '.join(IMPORT_TYPES)}."}
+            )
+
+        report = import_books(request.stream or io.BytesIO(), import_type)
+        return Response(BookImportReportSerializer(report.as_dict()).data)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, OverdueScanCheckpoint
 
 admin.site.register(Borrowing)
+admin.site.register(OverdueScanCheckpoint)
@@ -0,0 +1,77 @@
+import contextlib
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from library_service.benchmarking import format_summary, isolated_database, summarize
+from telegram_bot import telegram_helper
+from telegram_bot.stub_server import StubTelegramServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark POST /borrowings/ latency with the notification outbox "
+        "and with the previous inline Telegram call"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--telegram-latency",
+            type=float,
+            default=150,
+            help="Simulated Telegram round trip in milliseconds",
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database(), StubTelegramServer(
+            latency=options["telegram_latency"] / 1000
+        ) as server, mock.patch.object(telegram_helper, "TELEGRAM_API_URL", server.url):
+            for mode in ("outbox", "inline"):
+                samples = self.run(mode, options["requests"])
+                self.stdout.write(format_summary(mode, summarize(samples)))
+
+    def run(self, mode, requests):
+        book = Book.objects.create(
+            title=f"bench-{mode}",
+            author="bench",
+            cover="hard",
+            inventory=requests,
+            daily_fee=1,
+        )
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"{mode}-{i}@bench.local", password="!")
+            for i in range(requests)
+        )
+        payload = {
+            "book": book.id,
+            "expected_return_date": (now().date() + timedelta(days=7)).isoformat(),
+        }
+        url = reverse("borrowing:borrowing-list")
+        client = APIClient()
+
+        # The inline mode reproduces the old request path, where the
+        # Telegram round trip happened inside the borrowing transaction.
+        notifier = contextlib.nullcontext()
+        if mode == "inline":
+            notifier = mock.patch(
+                "borrowing.models.enqueue_telegram_message",
+                telegram_helper.send_telegram_message,
+            )
+
+        samples = []
+        with notifier:
+            for user in users:
+                client.force_authenticate(user)
+                started = time.perf_counter()
+                response = client.post(url, payload)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 201, response.content
+        return samples
@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service.benchmarking import isolated_database
+
+
+class Command(BaseCommand):
+    help = "Compare N single return-borrowing calls with one bulk-return of N"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=500)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            client = APIClient()
+            client.force_authenticate(
+                get_user_model().objects.create(email="desk@bench.local", is_staff=True)
+            )
+
+            ids = self.seed("single", options["borrowings"])
+            started = time.perf_counter()
+            for borrowing_id in ids:
+                client.post(
+                    reverse("borrowing:borrowing-return-borrowing", args=[borrowing_id])
+                )
+            self.report("single returns", len(ids), time.perf_counter() - started)
+
+            ids = self.seed("bulk", options["borrowings"])
+            started = time.perf_counter()
+            client.post(
+                reverse("borrowing:borrowing-bulk-return"),
+                {"ids": ids},
+                format="json",
+            )
+            self.report("bulk return", len(ids), time.perf_counter() - started)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(
+            f"{label}: {count} borrowings in {elapsed * 1000:.1f}ms "
+            f"({count / elapsed:.0f} returns/s)"
+        )
+
+    @staticmethod
+    def seed(prefix, count):
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"{prefix}-{i}",
+                author="bench",
+                cover="hard",
+                inventory=0,
+                daily_fee=1,
+            )
+            for i in range(10)
+        )
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"{prefix}-{i}@bench.local") for i in range(count)
+        )
+        expected_return_date = now().date() + timedelta(days=7)
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                book=books[i % len(books)],
+                user=user,
+                expected_return_date=expected_return_date,
+            )
+            for i, user in enumerate(users)
+        )
+        return [borrowing.id for borrowing in borrowings]
@@ -0,0 +1,109 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service.benchmarking import isolated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare summing fees per user in a Python loop with the "
+        "fees-summary endpoint's single GROUP BY query"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.seed(options["borrowings"])
+            client = APIClient()
+            client.force_authenticate(
+                get_user_model().objects.create(email="desk@bench.local", is_staff=True)
+            )
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                totals = self.python_totals()
+                elapsed = time.perf_counter() - started
+            self.report("python loop", len(totals), len(queries), elapsed)
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                res = client.get(reverse("borrowing:borrowing-fees-summary"))
+                elapsed = time.perf_counter() - started
+            self.report("fees-summary", len(res.data), len(queries), elapsed)
+
+            mismatches = sum(
+                Decimal(row["fees"]) != totals[row["id"]] for row in res.data
+            )
+            self.stdout.write(f"mismatching totals: {mismatches}")
+
+    def report(self, label, groups, queries, elapsed):
+        self.stdout.write(
+            f"{label}: {groups} users, {queries} queries " f"in {elapsed * 1000:.1f}ms"
+        )
+
+    @staticmethod
+    def python_totals():
+        today = now().date()
+        totals = defaultdict(Decimal)
+        for borrowing in Borrowing.objects.select_related("book").iterator():
+            end = borrowing.actual_return_date or today
+            days = max((end - borrowing.borrow_date).days, 1)
+            overdue = max((end - borrowing.expected_return_date).days, 0)
+            daily_fee = borrowing.book.daily_fee
+            totals[borrowing.user_id] += days * daily_fee + (
+                overdue * daily_fee * settings.OVERDUE_FEE_MULTIPLIER
+            )
+        return totals
+
+    @staticmethod
+    def seed(count, batch_size=10_000):
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"fees-{i}",
+                author="bench",
+                cover="hard",
+                inventory=0,
+                daily_fee=Decimal(i % 10 + 1) / 4,
+            )
+            for i in range(100)
+        )
+        users = get_user_model().objects.bulk_create(
+            (
+                get_user_model()(email=f"fees-{i}@bench.local")
+                for i in range(count // 10)
+            ),
+            batch_size=batch_size,
+        )
+        today = now().date()
+        # Nine returned borrowings and one active per user.
+        Borrowing.objects.bulk_create(
+            (
+                Borrowing(
+                    book=books[i % len(books)],
+                    user=users[i % len(users)],
+                    expected_return_date=today + timedelta(days=i % 20),
+                    actual_return_date=(
+                        today + timedelta(days=i % 30) if i >= len(users) else None
+                    ),
+                    is_active=i < len(users),
+                )
+                for i in range(count)
+            ),
+            batch_size=batch_size,
+        )
+        Borrowing.objects.update(borrow_date=today - timedelta(days=30))
@@ -0,0 +1,86 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from book_service.models import Book
+from book_service.serializers import BookProjection, BookSerializer
+from borrowing.models import Borrowing
+from borrowing.serializers import BorrowingListProjection, BorrowingListSerializer
+from library_service.benchmarking import isolated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows per second and peak memory of the list serializers "
+        "and their values() projections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.seed(options["rows"])
+            borrowings = Borrowing.objects.select_related()
+            books = Book.objects.all()
+
+            self.measure(
+                "BorrowingListSerializer",
+                lambda: BorrowingListSerializer(borrowings.all(), many=True).data,
+            )
+            self.measure(
+                "BorrowingListProjection",
+                lambda: BorrowingListProjection().represent(
+                    BorrowingListProjection().values(borrowings.all())
+                ),
+            )
+            self.measure(
+                "BookSerializer", lambda: BookSerializer(books.all(), many=True).data
+            )
+            self.measure(
+                "BookProjection",
+                lambda: BookProjection().represent(
+                    BookProjection().values(books.all())
+                ),
+            )
+
+    def measure(self, label, serialize):
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = len(serialize())
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{label}: {rows / elapsed:.0f} rows/s, "
+            f"peak {peak / 1024 / 1024:.1f} MiB for {rows} rows"
+        )
+
+    @staticmethod
+    def seed(rows):
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"title {i}",
+                author=f"author {i}",
+                cover="hard",
+                inventory=10,
+                daily_fee="1.50",
+            )
+            for i in range(rows)
+        )
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"reader{i}@bench.local") for i in range(rows)
+        )
+        expected_return_date = now().date() + timedelta(days=7)
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                book=book,
+                user=user,
+                expected_return_date=expected_return_date,
+            )
+            for book, user in zip(books, users)
+        )
@@ -0,0 +1,79 @@
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from book_service.models import Book
+from borrowing import overdue
+from borrowing.models import Borrowing
+from library_service.benchmarking import isolated_database
+
+
+class Command(BaseCommand):
+    help = "Measure scan_overdue throughput and peak memory on seeded rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=100_000)
+        parser.add_argument(
+            "--chunk-size", type=int, default=overdue.DEFAULT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            self.seed(options["borrowings"])
+
+            tracemalloc.start()
+            result = overdue.scan_overdue(chunk_size=options["chunk_size"])
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.report("full scan", result, peak)
+
+            result = overdue.scan_overdue(chunk_size=options["chunk_size"])
+            self.report("incremental rerun", result)
+
+    def report(self, label, result, peak=None):
+        line = (
+            f"{label}: {result['rows']} rows, {result['reminders']} reminders "
+            f"in {result['elapsed']:.2f}s ({result['rows_per_second']:.0f} rows/s)"
+        )
+        if peak is not None:
+            line += f", peak {peak / 2**20:.1f} MiB"
+        self.stdout.write(line)
+
+    @staticmethod
+    def seed(count, batch_size=10_000):
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"overdue-{i}",
+                author="bench",
+                cover="hard",
+                inventory=0,
+                daily_fee=1,
+            )
+            for i in range(100)
+        )
+        users = get_user_model().objects.bulk_create(
+            (get_user_model()(email=f"overdue-{i}@bench.local") for i in range(count)),
+            batch_size=batch_size,
+        )
+        today = now().date()
+        Borrowing.objects.bulk_create(
+            (
+                Borrowing(
+                    book=books[i % len(books)],
+                    user=user,
+                    expected_return_date=today + timedelta(days=i % 10),
+                )
+                for i, user in enumerate(users)
+            ),
+            batch_size=batch_size,
+        )
+        # Borrow dates are set on insert, so shift the rows into the past
+        # afterwards: nine in ten end up overdue.
+        Borrowing.objects.update(borrow_date=today - timedelta(days=30))
+        for offset in range(10):
+            Borrowing.objects.filter(
+                expected_return_date=today + timedelta(days=offset)
+            ).update(expected_return_date=today - timedelta(days=9 - offset))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from borrowing import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily and all-time borrowing statistics from the "
+        "borrowings, one chunk of days or books per transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days-per-chunk",
+            type=int,
+            default=rollups.DEFAULT_DAYS_PER_CHUNK,
+            help="Days of borrowings recounted per transaction",
+        )
+        parser.add_argument(
+            "--books-per-chunk",
+            type=int,
+            default=rollups.DEFAULT_BOOKS_PER_CHUNK,
+            help="Book totals recounted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        result = rollups.rebuild_rollups(
+            days_per_chunk=options["days_per_chunk"],
+            books_per_chunk=options["books_per_chunk"],
+            on_progress=self.stdout.write,
+        )
+        self.stdout.write(
+            f"recounted {result['days']} days in {result['chunks']} chunks "
+            f"in {result['elapsed']:.2f}s"
+        )
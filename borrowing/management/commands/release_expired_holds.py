@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from borrowing.models import WaitlistEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Pass the copies of expired waitlist holds to the next users in "
+        "line, or back to the shelf"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Holds released per transaction",
+        )
+
+    def handle(self, *args, **options):
+        released = WaitlistEntry.objects.release_expired_holds(
+            batch_size=options["batch_size"]
+        )
+        self.stdout.write(f"released {released} expired holds")
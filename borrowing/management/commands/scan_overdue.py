@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from borrowing import overdue
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue Telegram reminders for borrowings that became overdue "
+        "since the last run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=overdue.DEFAULT_CHUNK_SIZE,
+            help="Rows fetched per round trip and checkpointed together",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore the checkpoint and remind every overdue borrowing",
+        )
+
+    def handle(self, *args, **options):
+        result = overdue.scan_overdue(
+            chunk_size=options["chunk_size"], full=options["full"]
+        )
+        self.stdout.write(
+            f"scanned={result['rows']} reminders={result['reminders']} "
+            f"in {result['elapsed']:.2f}s ({result['rows_per_second']:.0f} rows/s)"
+        )
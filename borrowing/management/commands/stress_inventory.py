@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from book_service.models import Book
+from borrowing.stress import run_inventory_stress
+from library_service.benchmarking import isolated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent borrows and duplicate returns against one book "
+        "and check that its inventory stays consistent"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument(
+            "--inventory",
+            type=int,
+            default=20,
+            help="Copies of the book; keep it below --users to force stock-outs",
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            book = Book.objects.create(
+                title="stress",
+                author="stress",
+                cover="hard",
+                inventory=options["inventory"],
+                daily_fee=1,
+            )
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(email=f"stress-{i}@bench.local", password="!")
+                for i in range(options["users"])
+            )
+            result = run_inventory_stress(
+                book, users, workers=options["workers"], rounds=options["rounds"]
+            )
+
+        self.stdout.write(
+            f"borrowed={result['borrowed']} rejected={result['rejected']} "
+            f"returned={result['returned']} "
+            f"duplicate_returns={result['duplicate_returns']} "
+            f"final_inventory={result['inventory']}"
+        )
+        self.stdout.write(
+            f"{result['operations_per_second']:.0f} operations/s "
+            f"in {result['elapsed']:.2f}s"
+        )
+        if not result["consistent"]:
+            raise CommandError("Inventory is inconsistent with borrowings")
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing", "0003_borrowing_active_indexes_and_constraint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueScanCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=63, unique=True)),
+                ("expected_return_date", models.DateField()),
+                ("borrowing_id", models.PositiveBigIntegerField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
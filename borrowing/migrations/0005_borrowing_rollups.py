@@ -0,0 +1,116 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book_service", "0003_book_isbn"),
+        ("borrowing", "0004_overduescancheckpoint"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("borrowed", models.PositiveIntegerField(default=0)),
+                ("returned", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BookStats",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="book_service.book",
+                    ),
+                ),
+                ("borrowed", models.PositiveIntegerField(default=0)),
+                ("returned", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="UserDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("borrowed", models.PositiveIntegerField(default=0)),
+                ("returned", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("actual_return_date__isnull", False)),
+                fields=["actual_return_date"],
+                name="borrowing_returned_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bookdailystats",
+            name="book",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="book_service.book",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookstats",
+            index=models.Index(
+                fields=["-borrowed", "book"], name="book_stats_ranking_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userdailystats",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookdailystats",
+            index=models.Index(fields=["date"], name="book_daily_stats_date_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="bookdailystats",
+            constraint=models.UniqueConstraint(
+                fields=("book", "date"), name="book_daily_stats_book_date_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userdailystats",
+            constraint=models.UniqueConstraint(
+                fields=("user", "date"), name="user_daily_stats_user_date_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book_service", "0003_book_isbn"),
+        ("borrowing", "0005_borrowing_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WaitlistEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("hold_expires_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist",
+                        to="book_service.book",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("hold_expires_at__isnull", True)),
+                        fields=["book", "id"],
+                        name="waitlist_waiting_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("hold_expires_at__isnull", False)),
+                        fields=["hold_expires_at"],
+                        name="waitlist_hold_expiry_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("book", "user"),
+                        name="one_waitlist_entry_per_user_and_book",
+                        violation_error_message="You are already on the waitlist of this book.",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:50
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def sum_book_days(apps, schema_editor):
+    """Library totals of the days already counted per book"""
+    BookDailyStats = apps.get_model("borrowing", "BookDailyStats")
+    LibraryDailyStats = apps.get_model("borrowing", "LibraryDailyStats")
+    db = schema_editor.connection.alias
+    LibraryDailyStats.objects.using(db).bulk_create(
+        LibraryDailyStats(
+            date=row["date"],
+            borrowed=row["total_borrowed"],
+            returned=row["total_returned"],
+        )
+        for row in BookDailyStats.objects.using(db)
+        .values("date")
+        .annotate(total_borrowed=Sum("borrowed"), total_returned=Sum("returned"))
+        .order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing", "0006_waitlistentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryDailyStats",
+            fields=[
+                ("date", models.DateField(primary_key=True, serialize=False)),
+                ("borrowed", models.PositiveIntegerField(default=0)),
+                ("returned", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(sum_book_days, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,63 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    connections,
+    models,
+    transaction,
+)
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils.timezone import now
 
 from book_service.models import Book
-from telegram_bot.telegram_helper import send_telegram_message
+from library_service.functions import DaysBetween
+from library_service.imports import insert_rows
+from telegram_bot.outbox import enqueue_telegram_message, enqueue_telegram_messages
 from user.models import User
 
 
+class BorrowingQuerySet(models.QuerySet):
+    def with_fees(self, today=None):
+        """
+        Annotate what every borrowing costs, computed by the database.
+
+        ``days_borrowed`` (at least one) and ``overdue_days`` run up to the
+        actual return date, or to ``today`` for open borrowings. ``fine``
+        charges each overdue day ``OVERDUE_FEE_MULTIPLIER`` times the daily
+        fee and ``fee`` is the rental of every borrowed day plus the fine.
+        """
+        end = Coalesce(
+            "actual_return_date",
+            Value(today or now().date(), output_field=models.DateField()),
+        )
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            days_borrowed=Greatest(DaysBetween(end, "borrow_date"), Value(1)),
+            overdue_days=Greatest(DaysBetween(end, "expected_return_date"), Value(0)),
+        ).annotate(
+            fine=models.ExpressionWrapper(
+                F("overdue_days")
+                * F("book__daily_fee")
+                * Value(settings.OVERDUE_FEE_MULTIPLIER),
+                output_field=money,
+            ),
+            fee=models.ExpressionWrapper(
+                F("days_borrowed") * F("book__daily_fee") + F("fine"),
+                output_field=money,
+            ),
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        record_created(created, using=self.db)
+        return created
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField(auto_now_add=True)
     expected_return_date = models.DateField()
@@ -18,14 +68,18 @@ class Borrowing(models.Model):
     )
     is_active = models.BooleanField(default=True)
 
+    objects = BorrowingQuerySet.as_manager()
+
+    _waitlist_entry = None
+
     @staticmethod
     def validate_borrowing(
         expected_return_date,
         borrow_date,
         actual_return_date,
         book,
-        user,
         error_to_raise,
+        holds_copy=False,
     ):
         if expected_return_date and borrow_date:
             if expected_return_date < borrow_date:
@@ -41,25 +95,88 @@ class Borrowing(models.Model):
                         "actual_return_date": "Actual return date must be later or equal than the borrow date."
                     }
                 )
-        if book.inventory == 0:
+        if book.inventory == 0 and not holds_copy:
             raise error_to_raise({"book.inventory": "Inventory must be more than 0"})
-        if user.borrowings.filter(is_active=True).count() == 1:
-            raise error_to_raise({"user": "User already has an active borrowing."})
 
     def return_borrowing(self):
-        if self.actual_return_date:
-            raise ValidationError("It has already been returned.")
+        return_date = now().date()
 
         with transaction.atomic():
-            self.actual_return_date = now().date()
-            self.is_active = False
+            returned = Borrowing.objects.filter(
+                pk=self.pk, actual_return_date__isnull=True
+            ).update(actual_return_date=return_date, is_active=False)
+            if not returned:
+                raise ValidationError("It has already been returned.")
 
-            self.book.inventory += 1
-            self.book.save(update_fields=["inventory"])
+            Book.objects.put_back_copies(
+                WaitlistEntry.objects.hand_out({self.book_id: 1})
+            )
+            record_stats(returned=[(self.book_id, self.user_id, return_date)])
+
+        self.actual_return_date = return_date
+        self.is_active = False
+
+    @staticmethod
+    def return_borrowings(queryset, ids) -> dict:
+        """
+        Return every borrowing of ``queryset`` listed in ``ids`` with one
+        UPDATE for the borrowings and one grouped UPDATE for the books.
 
-            super(Borrowing, self).save(
-                update_fields=["actual_return_date", "is_active"]
+        Returns the outcome for each id: "returned", "already_returned"
+        or "not_found".
+        """
+        return_date = now().date()
+        outcomes = dict.fromkeys(ids, "not_found")
+
+        with transaction.atomic():
+            rows = (
+                queryset.select_for_update()
+                .filter(pk__in=ids)
+                .values_list("id", "book_id", "user_id", "actual_return_date")
             )
+            returned_books = Counter()
+            returned = []
+            for borrowing_id, book_id, user_id, actual_return_date in rows:
+                if actual_return_date:
+                    outcomes[borrowing_id] = "already_returned"
+                else:
+                    outcomes[borrowing_id] = "returned"
+                    returned_books[book_id] += 1
+                    returned.append((book_id, user_id, return_date))
+
+            Borrowing.objects.filter(
+                pk__in=[pk for pk, outcome in outcomes.items() if outcome == "returned"]
+            ).update(actual_return_date=return_date, is_active=False)
+            Book.objects.put_back_copies(WaitlistEntry.objects.hand_out(returned_books))
+            record_stats(returned=returned)
+
+        return outcomes
+
+    def _leave_waitlist(self) -> bool:
+        """
+        Remove the user's waitlist entry for the book; True if it held a
+        copy for them, which they borrow instead of one from the shelf
+        """
+        if self._waitlist_entry is None:
+            return False
+        # The entry may have been given a hold since it was read. An expired
+        # hold is left to release_expired_holds, which passes it on.
+        entries = WaitlistEntry.objects.filter(
+            book_id=self.book_id, user_id=self.user_id
+        )
+        held, _ = entries.filter(hold_expires_at__gt=now()).delete()
+        if held:
+            return True
+        entries.waiting().delete()
+        return False
+
+    def creation_message(self) -> str:
+        return (
+            f"New Borrowing Created:\n"
+            f"Book: {self.book.title}\n"
+            f"User: {self.user.email}\n"
+            f"Expected Return: {self.expected_return_date}"
+        )
 
     def clean(self):
         self.validate_borrowing(
@@ -67,8 +184,9 @@ class Borrowing(models.Model):
             borrow_date=self.borrow_date,
             actual_return_date=self.actual_return_date,
             book=self.book,
-            user=self.user,
             error_to_raise=ValidationError,
+            holds_copy=self._waitlist_entry is not None
+            and self._waitlist_entry.holds_copy(),
         )
 
     def save(
@@ -81,34 +199,66 @@ class Borrowing(models.Model):
         if self.actual_return_date:
             self.is_active = False
 
-        self.full_clean()
-
         is_new = self.pk is None
-
-        with transaction.atomic():
-            if is_new:
-                if self.book.inventory < 1:
-                    raise ValidationError(
-                        "Cannot borrow book. Inventory must be at least 1."
-                    )
-                self.book.inventory -= 1
-                self.book.save(update_fields=["inventory"])
-                try:
-                    message = (
-                        f"New Borrowing Created:\n"
-                        f"Book: {self.book.title}\n"
-                        f"User: {self.user.email}\n"
-                        f"Expected Return: {self.expected_return_date}"
-                    )
-                    send_telegram_message(message)
-                except Exception as e:
-                    raise ValidationError(f"Failed to send notification: {e}")
-
-        return super(Borrowing, self).save(
-            force_insert, force_update, using, update_fields
+        # A copy held for the user on the waitlist is theirs to borrow even
+        # when none is left on the shelf.
+        self._waitlist_entry = (
+            WaitlistEntry.objects.filter(
+                book_id=self.book_id, user_id=self.user_id
+            ).first()
+            if is_new
+            else None
         )
 
+        # Foreign keys and constraints are enforced by the database; checking
+        # them here would cost a query each on every save.
+        self.full_clean(exclude=["book", "user"], validate_constraints=False)
+
+        try:
+            with transaction.atomic():
+                if is_new:
+                    if not (
+                        self._leave_waitlist() or Book.objects.take_copy(self.book_id)
+                    ):
+                        raise ValidationError(
+                            "Cannot borrow book. Inventory must be at least 1."
+                        )
+                    enqueue_telegram_message(self.creation_message())
+
+                super(Borrowing, self).save(
+                    force_insert, force_update, using, update_fields
+                )
+                if is_new:
+                    record_created([self], using=self._state.db)
+        except IntegrityError:
+            # Only now pay for the constraint queries, to report which one
+            # was violated.
+            self.validate_constraints()
+            raise
+
     class Meta:
+        indexes = [
+            models.Index(
+                fields=["-borrow_date", "-id"], name="borrowing_borrow_date_id_idx"
+            ),
+            models.Index(
+                fields=["user", "is_active"], name="borrowing_user_active_idx"
+            ),
+            # Partial rather than led by is_active: SQLite compiles the
+            # boolean filter to a bare WHERE "is_active", which cannot seek
+            # on the leading column of a composite index.
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(is_active=True),
+                name="borrowing_active_due_idx",
+            ),
+            # Returns of a day, recounted by rebuild_rollups
+            models.Index(
+                fields=["actual_return_date"],
+                condition=models.Q(actual_return_date__isnull=False),
+                name="borrowing_returned_idx",
+            ),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(expected_return_date__gte=models.F("borrow_date")),
@@ -118,7 +268,330 @@ class Borrowing(models.Model):
                 check=models.Q(actual_return_date__gte=models.F("borrow_date")),
                 name="actual_return_date_gte_borrow_date",
             ),
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(is_active=True),
+                name="one_active_borrowing_per_user",
+                violation_error_message="User already has an active borrowing.",
+            ),
         ]
 
     def __str__(self):
         return f"Borrow date: {self.borrow_date}, expected return date: {self.expected_return_date}"
+
+
+class RollupQuerySet(models.QuerySet):
+    counters = ("borrowed", "returned")
+
+    def increment(self, key_fields, counts):
+        """
+        Add ``counts``, values of ``key_fields`` -> [borrowed, returned], to
+        the matching rows, creating missing ones, in one statement per batch
+        """
+        if not counts:
+            return
+        connection = connections[self.db]
+        ops = connection.ops
+        opts = self.model._meta
+        fields = [opts.get_field(name) for name in (*key_fields, *self.counters)]
+        table = ops.quote_name(opts.db_table)
+        keys = [ops.quote_name(field.column) for field in fields[: len(key_fields)]]
+        counters = [ops.quote_name(name) for name in self.counters]
+        if connection.features.supports_update_conflicts_with_target:
+            on_conflict = f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET " + ", ".join(
+                f"{column} = {table}.{column} + EXCLUDED.{column}"
+                for column in counters
+            )
+        else:
+            on_conflict = "ON DUPLICATE KEY UPDATE " + ", ".join(
+                f"{column} = {column} + VALUES({column})" for column in counters
+            )
+
+        rows = [
+            [
+                field.get_db_prep_save(value, connection)
+                for field, value in zip(fields, (*key, *values))
+            ]
+            for key, values in counts.items()
+        ]
+        insert_rows(self.model, fields, rows, on_conflict, using=self.db)
+
+
+def record_stats(borrowed=(), returned=(), using=None):
+    """
+    Count the borrowings started (``borrowed``) and returned (``returned``),
+    given as (book id, user id, date), into the rollups of ``rollups.py``
+    with one statement per table; must run in the transaction of the write
+    """
+    book_days = defaultdict(lambda: [0, 0])
+    user_days = defaultdict(lambda: [0, 0])
+    books = defaultdict(lambda: [0, 0])
+    days = defaultdict(lambda: [0, 0])
+    for index, events in enumerate((borrowed, returned)):
+        for book_id, user_id, date in events:
+            book_days[(book_id, date)][index] += 1
+            user_days[(user_id, date)][index] += 1
+            books[(book_id,)][index] += 1
+            days[(date,)][index] += 1
+    using = using or DEFAULT_DB_ALIAS
+    BookDailyStats.objects.using(using).increment(("book", "date"), book_days)
+    UserDailyStats.objects.using(using).increment(("user", "date"), user_days)
+    BookStats.objects.using(using).increment(("book",), books)
+    LibraryDailyStats.objects.using(using).increment(("date",), days)
+
+
+def record_created(borrowings, using=None):
+    """Count new ``borrowings``, and those of them already returned"""
+    record_stats(
+        borrowed=[(b.book_id, b.user_id, b.borrow_date) for b in borrowings],
+        returned=[
+            (b.book_id, b.user_id, b.actual_return_date)
+            for b in borrowings
+            if b.actual_return_date
+        ],
+        using=using,
+    )
+
+
+class BookDailyStats(models.Model):
+    """Borrowings of a book started and returned on one day"""
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    date = models.DateField()
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "date"], name="book_daily_stats_book_date_uniq"
+            ),
+        ]
+        indexes = [models.Index(fields=["date"], name="book_daily_stats_date_idx")]
+
+    def __str__(self):
+        return f"{self.book_id} on {self.date}: +{self.borrowed} -{self.returned}"
+
+
+class UserDailyStats(models.Model):
+    """Borrowings of a user started and returned on one day"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    date = models.DateField()
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date"], name="user_daily_stats_user_date_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.date}: +{self.borrowed} -{self.returned}"
+
+
+class LibraryDailyStats(models.Model):
+    """Borrowings of the whole library started and returned on one day"""
+
+    date = models.DateField(primary_key=True)
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.date}: +{self.borrowed} -{self.returned}"
+
+
+class BookStats(models.Model):
+    """All-time borrowings of a book, ranked by ``borrowed``"""
+
+    book = models.OneToOneField(
+        Book, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-borrowed", "book"], name="book_stats_ranking_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.book_id}: +{self.borrowed} -{self.returned}"
+
+
+class OverdueScanCheckpoint(models.Model):
+    """
+    Position of the last borrowing reminded by ``scan_overdue``.
+
+    Overdue borrowings are scanned in (expected_return_date, id) order, so
+    a rerun resumes after this key and only sees newly overdue ones.
+    """
+
+    name = models.CharField(max_length=63, unique=True)
+    expected_return_date = models.DateField()
+    borrowing_id = models.PositiveBigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.expected_return_date} #{self.borrowing_id}"
+
+
+class WaitlistQuerySet(models.QuerySet):
+    def waiting(self):
+        return self.filter(hold_expires_at__isnull=True)
+
+    def hand_out(self, copies) -> Counter:
+        """
+        Hold returned ``copies``, book id -> count, for the users first in
+        line for each book and queue their notifications; returns the
+        copies nobody waits for, which go back on the shelf.
+
+        Each book costs one query reading only the entries it holds copies
+        for, through ``waitlist_waiting_idx``, however long its line is.
+        Must run in the transaction that returns the copies.
+        """
+        hold_expires_at = now() + timedelta(hours=settings.WAITLIST_HOLD_HOURS)
+        leftover = Counter()
+        held = []
+        for book_id, count in copies.items():
+            entries = list(
+                self.waiting()
+                .filter(book_id=book_id)
+                .select_related("book", "user")
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("id")[:count]
+            )
+            held += entries
+            if len(entries) < count:
+                leftover[book_id] = count - len(entries)
+
+        if held:
+            self.filter(pk__in=[entry.pk for entry in held]).update(
+                hold_expires_at=hold_expires_at
+            )
+            for entry in held:
+                entry.hold_expires_at = hold_expires_at
+            enqueue_telegram_messages([entry.hold_message() for entry in held])
+        return leftover
+
+    def hand_out_shelved(self, shelved) -> None:
+        """
+        Hold copies on the shelf, book id -> count, for the users waiting
+        for each book, as ``hand_out`` does with returned copies. For
+        inventory raised other than by returns, such as a staff edit of a
+        book; must run in the transaction that raised it.
+        """
+        for book_id, count in shelved.items():
+            waiting = self.waiting().filter(book_id=book_id)[:count].count()
+            # Copies already borrowed since are left to their borrowers.
+            if waiting and Book.objects.take_copies({book_id: waiting}):
+                Book.objects.put_back_copies(self.hand_out({book_id: waiting}))
+
+    def release_expired_holds(self, batch_size=1000) -> int:
+        """
+        Pass the copies of holds that expired to the next users in line, or
+        back to the shelf, ``batch_size`` holds per transaction; returns the
+        number of holds released
+        """
+        released = 0
+        while True:
+            with transaction.atomic():
+                expired = list(
+                    self.filter(hold_expires_at__lte=now())
+                    .select_for_update(skip_locked=True)
+                    .order_by("hold_expires_at")
+                    .values_list("id", "book_id")[:batch_size]
+                )
+                if not expired:
+                    return released
+                self.filter(pk__in=[pk for pk, _ in expired]).delete()
+                Book.objects.put_back_copies(
+                    self.hand_out(Counter(book_id for _, book_id in expired))
+                )
+            released += len(expired)
+
+
+class WaitlistEntry(models.Model):
+    """
+    A user waiting for a copy of a book, first come, first served. A copy
+    returned while users wait is held for the first of them until
+    ``hold_expires_at``, instead of going back on the shelf, and so are
+    copies added by saving the book (see ``borrowing.signals``). Imports
+    only set the inventory of new books, which nobody waits for; queryset
+    updates of the inventory bypass the line.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="waitlist")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="waitlist_entries",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+
+    objects = WaitlistQuerySet.as_manager()
+
+    def leave(self):
+        """Remove the entry, passing a copy held for it to the next in line"""
+        with transaction.atomic():
+            # Read again, as a hold may have been given since
+            hold = (
+                WaitlistEntry.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("hold_expires_at", flat=True)
+                .first()
+            )
+            WaitlistEntry.objects.filter(pk=self.pk).delete()
+            if hold is not None:
+                Book.objects.put_back_copies(
+                    WaitlistEntry.objects.hand_out({self.book_id: 1})
+                )
+
+    def holds_copy(self) -> bool:
+        return self.hold_expires_at is not None and self.hold_expires_at > now()
+
+    def hold_message(self) -> str:
+        return (
+            f"Book On Hold:\n"
+            f"Book: {self.book.title}\n"
+            f"User: {self.user.email}\n"
+            f"Held Until: {self.hold_expires_at:%Y-%m-%d %H:%M %Z}"
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                name="one_waitlist_entry_per_user_and_book",
+                violation_error_message="You are already on the waitlist of this book.",
+            ),
+        ]
+        indexes = [
+            # The line of a book in order, without the users holding a copy
+            models.Index(
+                fields=["book", "id"],
+                condition=models.Q(hold_expires_at__isnull=True),
+                name="waitlist_waiting_idx",
+            ),
+            models.Index(
+                fields=["hold_expires_at"],
+                condition=models.Q(hold_expires_at__isnull=False),
+                name="waitlist_hold_expiry_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} waiting for {self.book_id}"
@@ -0,0 +1,182 @@
+"""
+Borrowing statistics kept up to date with every write.
+
+Borrowings started and returned are counted per book and day, per user and
+day, per day for the whole library, and per book for all time, in the
+transaction that creates or returns them, so statistics are read from a
+bounded number of rollup rows however long the history is. Writes that
+bypass ``record_stats`` (deleting borrowings, editing their dates in the
+admin) are corrected by ``rebuild_rollups``, which recounts whole days from
+the borrowings.
+"""
+
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils.timezone import now
+
+from book_service.models import Book
+from borrowing.models import (
+    BookDailyStats,
+    BookStats,
+    Borrowing,
+    LibraryDailyStats,
+    UserDailyStats,
+)
+
+DEFAULT_DAYS_PER_CHUNK = 31
+DEFAULT_BOOKS_PER_CHUNK = 1000
+DAILY_ROLLUPS = (BookDailyStats, UserDailyStats, LibraryDailyStats)
+
+
+def _counts():
+    return defaultdict(lambda: [0, 0])
+
+
+def recount_days(start, end, using=DEFAULT_DB_ALIAS):
+    """
+    Replace the daily rollups from ``start`` to ``end`` with counts of the
+    borrowings; must run in a transaction, which keeps concurrent writes
+    from being counted twice or lost. Book totals are recounted separately.
+    """
+    for model in DAILY_ROLLUPS:
+        model.objects.using(using).filter(date__range=(start, end)).delete()
+
+    book_days = _counts()
+    user_days = _counts()
+    days = _counts()
+    borrowings = Borrowing.objects.using(using).order_by()
+    for index, date_field in enumerate(("borrow_date", "actual_return_date")):
+        groups = (
+            borrowings.filter(**{f"{date_field}__range": (start, end)})
+            .values_list("book_id", "user_id", date_field)
+            .annotate(count=Count("id"))
+        )
+        for book_id, user_id, date, count in groups:
+            book_days[(book_id, date)][index] += count
+            user_days[(user_id, date)][index] += count
+            days[(date,)][index] += count
+
+    BookDailyStats.objects.using(using).increment(("book", "date"), book_days)
+    UserDailyStats.objects.using(using).increment(("user", "date"), user_days)
+    LibraryDailyStats.objects.using(using).increment(("date",), days)
+
+
+def recount_book_totals(first_id, last_id, using=DEFAULT_DB_ALIAS):
+    """
+    Replace the all-time counts of books ``first_id`` to ``last_id`` with
+    the sums of their daily rollups; must run in a transaction
+    """
+    BookStats.objects.using(using).filter(pk__gte=first_id, pk__lte=last_id).delete()
+    totals = (
+        BookDailyStats.objects.using(using)
+        .filter(book_id__gte=first_id, book_id__lte=last_id)
+        .values("book_id")
+        .annotate(total_borrowed=Sum("borrowed"), total_returned=Sum("returned"))
+        .order_by()
+    )
+    BookStats.objects.using(using).bulk_create(
+        BookStats(
+            book_id=row["book_id"],
+            borrowed=row["total_borrowed"],
+            returned=row["total_returned"],
+        )
+        for row in totals
+    )
+
+
+def rebuild_rollups(
+    days_per_chunk=DEFAULT_DAYS_PER_CHUNK,
+    books_per_chunk=DEFAULT_BOOKS_PER_CHUNK,
+    on_progress=None,
+):
+    """
+    Recount every rollup from the borrowings, ``days_per_chunk`` days and
+    then ``books_per_chunk`` book totals per transaction, so writers are
+    held up by one chunk at a time. ``on_progress`` is called with a line
+    describing each chunk.
+    """
+    started = time.perf_counter()
+    bounds = Borrowing.objects.aggregate(
+        first=Min("borrow_date"),
+        last_borrowed=Max("borrow_date"),
+        last_returned=Max("actual_return_date"),
+    )
+    today = now().date()
+    first = bounds["first"] or today
+    last = max(filter(None, (today, bounds["last_borrowed"], bounds["last_returned"])))
+
+    with transaction.atomic():
+        outside = ~Q(date__range=(first, last))
+        for model in DAILY_ROLLUPS:
+            model.objects.filter(outside).delete()
+
+    chunks = 0
+    start = first
+    while start <= last:
+        end = min(start + timedelta(days=days_per_chunk - 1), last)
+        with transaction.atomic():
+            recount_days(start, end)
+        chunks += 1
+        if on_progress is not None:
+            on_progress(f"days {start} to {end}")
+        start = end + timedelta(days=1)
+
+    books = Book.objects.aggregate(first=Min("id"), last=Max("id"))
+    if books["first"] is not None:
+        for first_id in range(books["first"], books["last"] + 1, books_per_chunk):
+            last_id = first_id + books_per_chunk - 1
+            with transaction.atomic():
+                recount_book_totals(first_id, last_id)
+            chunks += 1
+            if on_progress is not None:
+                on_progress(f"book totals {first_id} to {last_id}")
+
+    return {
+        "days": (last - first).days + 1,
+        "chunks": chunks,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def top_books(limit):
+    """The ``limit`` most borrowed books of all time, from their index"""
+    return BookStats.objects.select_related("book").order_by("-borrowed", "book")[
+        :limit
+    ]
+
+
+def daily_series(start, end, book=None, user=None):
+    """
+    Borrowings started and returned on every day from ``start`` to ``end``,
+    of one book or user, or of the whole library; days without any are 0.
+    One rollup row is read per day.
+    """
+    if user is not None:
+        rows = UserDailyStats.objects.filter(user_id=user)
+    elif book is not None:
+        rows = BookDailyStats.objects.filter(book_id=book)
+    else:
+        rows = LibraryDailyStats.objects.all()
+    days = {
+        row["date"]: row
+        for row in rows.filter(date__range=(start, end)).values(
+            "date", "borrowed", "returned"
+        )
+    }
+
+    series = []
+    for offset in range((end - start).days + 1):
+        date = start + timedelta(days=offset)
+        row = days.get(date, {})
+        series.append(
+            {
+                "date": date,
+                "borrowed": row.get("borrowed", 0),
+                "returned": row.get("returned", 0),
+            }
+        )
+    return series
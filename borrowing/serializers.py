@@ -1,8 +1,17 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.db.models import Count, Q
+from django.utils.timezone import now
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
 
+from book_service.models import Book
 from book_service.serializers import BookSerializer
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, WaitlistEntry
+from library_service.projection import Projection
+from telegram_bot.outbox import enqueue_telegram_messages
 from user.serializers import UserSerializer
 
 
@@ -23,6 +32,10 @@ class BorrowingSerializer(serializers.ModelSerializer):
 class BorrowingDetailSerializer(BorrowingSerializer):
     book = BookSerializer(read_only=True)
     user = UserSerializer(read_only=True)
+    fee = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta(BorrowingSerializer.Meta):
+        fields = BorrowingSerializer.Meta.fields + ["fee"]
 
 
 class BorrowingListSerializer(BorrowingSerializer):
@@ -30,6 +43,11 @@ class BorrowingListSerializer(BorrowingSerializer):
     user = serializers.SlugRelatedField(read_only=True, slug_field="email")
 
 
+class BorrowingListProjection(Projection):
+    serializer_class = BorrowingListSerializer
+    lookups = {"book": "book__title", "user": "user__email"}
+
+
 class BorrowingCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
@@ -54,3 +72,181 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.return_borrowing()
         return instance
+
+
+class BorrowingBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a whole batch with a fixed number of queries and creates it
+    with one INSERT and one grouped inventory UPDATE.
+
+    Must be validated and saved inside one transaction.
+    """
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        request = self.context["request"]
+        for item in attrs:
+            item.setdefault("user", request.user.id)
+
+        books = Book.objects.in_bulk({item["book"] for item in attrs})
+        users = (
+            get_user_model()
+            .objects.only("id", "email")
+            .annotate(
+                active_borrowings=Count(
+                    "borrowings", filter=Q(borrowings__is_active=True)
+                )
+            )
+            .in_bulk({item["user"] for item in attrs})
+        )
+        requested_copies = Counter(item["book"] for item in attrs)
+        requested_borrowings = Counter(item["user"] for item in attrs)
+        today = now().date()
+
+        errors = []
+        for item in attrs:
+            item_errors = {}
+            book = books.get(item["book"])
+            user = users.get(item["user"])
+            if item["expected_return_date"] < today:
+                item_errors["expected_return_date"] = [
+                    "Expected return date must be later than or equal to the borrow date."
+                ]
+            if book is None:
+                item_errors["book"] = [
+                    f"Invalid pk \"{item['book']}\" - object does not exist."
+                ]
+            elif book.inventory < requested_copies[book.id]:
+                item_errors["book"] = [
+                    f"Only {book.inventory} copies available for this batch."
+                ]
+            if user is None:
+                item_errors["user"] = [
+                    f"Invalid pk \"{item['user']}\" - object does not exist."
+                ]
+            elif user.active_borrowings or requested_borrowings[user.id] > 1:
+                item_errors["user"] = ["User already has an active borrowing."]
+            errors.append(item_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        for item in attrs:
+            item["book"] = books[item["book"]]
+            item["user"] = users[item["user"]]
+        return attrs
+
+    def create(self, validated_data):
+        requested_copies = Counter(item["book"].id for item in validated_data)
+        if not Book.objects.take_copies(requested_copies):
+            raise serializers.ValidationError(
+                {"book": ["Inventory changed while the batch was validated."]}
+            )
+
+        try:
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(**item) for item in validated_data
+            )
+        except IntegrityError as e:
+            raise serializers.ValidationError({"non_field_errors": [str(e)]})
+
+        enqueue_telegram_messages(
+            [borrowing.creation_message() for borrowing in borrowings]
+        )
+        return borrowings
+
+
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    book = serializers.IntegerField()
+    user = serializers.IntegerField(required=False)
+    expected_return_date = serializers.DateField()
+
+    class Meta:
+        list_serializer_class = BorrowingBulkListSerializer
+
+    def to_representation(self, instance):
+        return BorrowingSerializer(instance).data
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000
+    )
+
+
+class BorrowingReturnOutcomeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(
+        choices=["returned", "already_returned", "not_found"]
+    )
+
+
+class BorrowingFeeSummarySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    borrowings = serializers.IntegerField()
+    fees = serializers.DecimalField(max_digits=14, decimal_places=2)
+    fines = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class BorrowingStatsQuerySerializer(serializers.Serializer):
+    top = serializers.IntegerField(
+        min_value=1, max_value=100, default=10, help_text="Books in the ranking"
+    )
+    days = serializers.IntegerField(
+        min_value=1, max_value=366, default=30, help_text="Days of the time series"
+    )
+    book = serializers.IntegerField(
+        required=False, help_text="Time series of this book"
+    )
+    user = serializers.IntegerField(
+        required=False, help_text="Time series of this user"
+    )
+
+    def validate(self, attrs):
+        if "book" in attrs and "user" in attrs:
+            raise serializers.ValidationError("Filter by a book or a user, not both.")
+        return attrs
+
+
+class BookStatsSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="book_id")
+    title = serializers.CharField(source="book.title")
+    borrowed = serializers.IntegerField()
+    returned = serializers.IntegerField()
+
+
+class DailyStatsSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    borrowed = serializers.IntegerField()
+    returned = serializers.IntegerField()
+
+
+class BorrowingStatsSerializer(serializers.Serializer):
+    top_books = BookStatsSerializer(many=True)
+    daily = DailyStatsSerializer(many=True)
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    holds_copy = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ["id", "book", "user", "created_at", "hold_expires_at", "holds_copy"]
+        read_only_fields = ["user", "hold_expires_at"]
+
+    def validate_book(self, book):
+        if book.inventory:
+            raise serializers.ValidationError(
+                "Copies are available; borrow one instead."
+            )
+        user = self.context["request"].user
+        if WaitlistEntry.objects.filter(book=book, user=user).exists():
+            raise serializers.ValidationError(
+                "You are already on the waitlist of this book."
+            )
+        return book
+
+    def create(self, validated_data):
+        validated_data["user"] = self.context["request"].user
+        return super().create(validated_data)
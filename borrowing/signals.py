@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from book_service.models import Book
+from borrowing.models import WaitlistEntry
+
+
+@receiver(post_save, sender=Book)
+def hand_out_restocked_copies(
+    sender, instance, created, using, update_fields=None, **kwargs
+):
+    # Returns hand their copies out themselves; copies added by editing the
+    # book must also go to the users in line before anyone else.
+    if created or instance.inventory <= 0:
+        return
+    if update_fields is not None and "inventory" not in update_fields:
+        return
+    with transaction.atomic(using=using):
+        WaitlistEntry.objects.hand_out_shelved({instance.pk: instance.inventory})
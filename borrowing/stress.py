@@ -0,0 +1,102 @@
+"""
+Multi-threaded borrow/return stress harness for the inventory engine.
+
+Every worker borrows a copy of one book for its users and queues each
+borrowing twice for return, so that concurrent duplicate returns race
+against each other as well as against new borrows.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils.timezone import now
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+
+
+def run_inventory_stress(book, users, workers=8, rounds=5):
+    """
+    Run ``rounds`` borrow attempts per user spread over ``workers`` threads.
+
+    Returns counts of each outcome, the elapsed time and whether the final
+    inventory matches the borrowings that are still active.
+    """
+    initial_inventory = book.inventory
+    expected_return_date = now().date() + timedelta(days=7)
+    returns = deque()
+    counts = {
+        "borrowed": 0,
+        "rejected": 0,
+        "returned": 0,
+        "duplicate_returns": 0,
+    }
+    lock = threading.Lock()
+
+    def count(outcome):
+        with lock:
+            counts[outcome] += 1
+
+    def return_one():
+        try:
+            borrowing = returns.popleft()
+        except IndexError:
+            return
+        try:
+            borrowing.return_borrowing()
+        except ValidationError:
+            count("duplicate_returns")
+        else:
+            count("returned")
+
+    def worker(worker_users):
+        try:
+            for _ in range(rounds):
+                for user in worker_users:
+                    try:
+                        borrowing = Borrowing.objects.create(
+                            book=Book.objects.get(pk=book.pk),
+                            user=user,
+                            expected_return_date=expected_return_date,
+                        )
+                    except ValidationError:
+                        count("rejected")
+                    else:
+                        count("borrowed")
+                        returns.append(borrowing)
+                        returns.append(Borrowing.objects.get(pk=borrowing.pk))
+                    return_one()
+            while returns:
+                return_one()
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(users[i::workers],))
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    book.refresh_from_db()
+    active = Borrowing.objects.filter(book=book, actual_return_date__isnull=True)
+    operations = counts["borrowed"] + counts["rejected"]
+    operations += counts["returned"] + counts["duplicate_returns"]
+    return {
+        **counts,
+        "inventory": book.inventory,
+        "consistent": (
+            book.inventory == initial_inventory - active.count()
+            and counts["returned"] == counts["borrowed"] - active.count()
+        ),
+        "elapsed": elapsed,
+        "operations_per_second": operations / elapsed,
+    }
@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
@@ -8,8 +11,10 @@ from rest_framework.test import APIClient
 from book_service.models import Book
 from borrowing.models import Borrowing
 from borrowing.serializers import BorrowingListSerializer
+from telegram_bot.models import NotificationOutbox
 
 BORROWING_URL = reverse("borrowing:borrowing-list")
+EXPECTED_RETURN_DATE = (now().date() + timedelta(days=9)).isoformat()
 
 
 def detail_url(borrowing_id):
@@ -22,8 +27,7 @@ def return_url(borrowing_id):
 
 def sample_borrowing(**params):
     defaults = {
-        "borrow_date": "2024-12-12",
-        "expected_return_date": "2024-12-21",
+        "expected_return_date": EXPECTED_RETURN_DATE,
         "book": sample_book(),
     }
     defaults.update(params)
@@ -77,8 +81,21 @@ class AuthenticatedBorrowingApiTests(TestCase):
         serializer = BorrowingListSerializer(borrowings, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(self.borrowing_2, res.data)
-        self.assertEqual(res.data, serializer.data)
+        self.assertNotIn(self.borrowing_2, res.data["results"])
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_list_output_matches_serializer(self):
+        self.borrowing_1.return_borrowing()
+        sample_borrowing(book=self.book_2, user=self.regular_user_1)
+
+        res = self.client.get(BORROWING_URL)
+
+        borrowings = Borrowing.objects.filter(user=self.regular_user_1).order_by(
+            "-borrow_date", "-id"
+        )
+        serializer = BorrowingListSerializer(borrowings, many=True)
+        self.assertEqual(res.data["results"], serializer.data)
+        self.assertIsNotNone(res.data["results"][1]["actual_return_date"])
 
     def test_return_borrowing_action(self):
         res = self.client.post(return_url(self.borrowing_1.id))
@@ -91,7 +108,7 @@ class AuthenticatedBorrowingApiTests(TestCase):
     def test_inventory_changes_on_borrowing(self):
         self.client.force_authenticate(self.regular_user_3)
         book = sample_book(inventory=2)
-        payload = {"book": book.id, "expected_return_date": "2024-12-31"}
+        payload = {"book": book.id, "expected_return_date": EXPECTED_RETURN_DATE}
         res = self.client.post(BORROWING_URL, payload)
         book.refresh_from_db()
 
@@ -105,6 +122,19 @@ class AuthenticatedBorrowingApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(book.inventory, 2)
 
+    def test_borrowing_creation_enqueues_notification(self):
+        self.client.force_authenticate(self.regular_user_3)
+        book = sample_book(title="queued")
+        NotificationOutbox.objects.all().delete()
+
+        payload = {"book": book.id, "expected_return_date": EXPECTED_RETURN_DATE}
+        res = self.client.post(BORROWING_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        notification = NotificationOutbox.objects.get()
+        self.assertIn("Book: queued", notification.text)
+        self.assertIn(self.regular_user_3.email, notification.text)
+
     def test_filter_borrowings_by_is_active(self):
         url = f"{BORROWING_URL}?is-active=True"
         res = self.client.get(url)
@@ -114,21 +144,21 @@ class AuthenticatedBorrowingApiTests(TestCase):
         )
         serializer = BorrowingListSerializer(active_borrowings, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_user_cannot_have_multiple_active_borrowings(self):
         self.client.force_authenticate(self.regular_user_3)
 
         payload_1 = {
             "book": self.book_1.id,
-            "expected_return_date": "2024-12-31",
+            "expected_return_date": EXPECTED_RETURN_DATE,
         }
         res_1 = self.client.post(BORROWING_URL, payload_1)
         self.assertEqual(res_1.status_code, status.HTTP_201_CREATED)
 
         payload_2 = {
             "book": self.book_2.id,
-            "expected_return_date": "2024-12-31",
+            "expected_return_date": EXPECTED_RETURN_DATE,
         }
         with self.assertRaises(ValidationError):
             res_2 = self.client.post(BORROWING_URL, payload_2)
@@ -162,8 +192,8 @@ class AdminBorrowingTests(TestCase):
         serializer_correct_user = BorrowingListSerializer(self.borrowing_2)
         serializer_wrong_user = BorrowingListSerializer(self.borrowing_1)
 
-        self.assertIn(serializer_correct_user.data, res.data)
-        self.assertNotIn(serializer_wrong_user.data, res.data)
+        self.assertIn(serializer_correct_user.data, res.data["results"])
+        self.assertNotIn(serializer_wrong_user.data, res.data["results"])
 
     def test_admin_cannot_delete_borrowing(self):
         res = self.client.delete(detail_url(self.borrowing_1.id))
@@ -0,0 +1,177 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.tests.test_borrowing_api import (
+    EXPECTED_RETURN_DATE,
+    sample_book,
+    sample_borrowing,
+)
+from telegram_bot.models import NotificationOutbox
+
+BULK_URL = reverse("borrowing:borrowing-bulk-create")
+
+
+def sample_users(count, prefix="student"):
+    return get_user_model().objects.bulk_create(
+        get_user_model()(email=f"{prefix}{i}@test.test") for i in range(count)
+    )
+
+
+class BulkBorrowingApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.book = sample_book(title="class set", inventory=30)
+
+    def payload(self, users, book=None):
+        return [
+            {
+                "book": (book or self.book).id,
+                "user": user.id,
+                "expected_return_date": EXPECTED_RETURN_DATE,
+            }
+            for user in users
+        ]
+
+    def test_bulk_create_borrowings(self):
+        users = sample_users(3)
+        NotificationOutbox.objects.all().delete()
+
+        res = self.client.post(BULK_URL, self.payload(users), format="json")
+
+        self.book.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(self.book.inventory, 27)
+        self.assertEqual(
+            Borrowing.objects.filter(book=self.book, is_active=True).count(), 3
+        )
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = self.payload(sample_users(2, prefix="small"))
+        large = self.payload(sample_users(20, prefix="large"))
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(BULK_URL, small, format="json")
+        with CaptureQueriesContext(connection) as large_queries:
+            res = self.client.post(BULK_URL, large, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_errors_are_reported_per_item_and_nothing_is_created(self):
+        free_user, busy_user = sample_users(2)
+        sample_borrowing(book=sample_book(), user=busy_user)
+        payload = self.payload([free_user, busy_user])
+        payload.append({"book": 0, "user": 0, "expected_return_date": "2000-01-01"})
+        borrowings_before = Borrowing.objects.count()
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.book.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(
+            res.data[1], {"user": ["User already has an active borrowing."]}
+        )
+        self.assertEqual(set(res.data[2]), {"book", "user", "expected_return_date"})
+        self.assertEqual(Borrowing.objects.count(), borrowings_before)
+        self.assertEqual(self.book.inventory, 30)
+
+    def test_batch_cannot_exceed_inventory(self):
+        book = sample_book(title="scarce", inventory=1)
+
+        res = self.client.post(
+            BULK_URL, self.payload(sample_users(2), book=book), format="json"
+        )
+
+        book.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("book", res.data[0])
+        self.assertEqual(book.inventory, 1)
+
+    def test_regular_user_cannot_bulk_create(self):
+        user = sample_users(1)[0]
+        self.client.force_authenticate(user)
+
+        res = self.client.post(BULK_URL, self.payload([user]), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+BULK_RETURN_URL = reverse("borrowing:borrowing-bulk-return")
+
+
+class BulkReturnBorrowingApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.book_1 = sample_book(title="first", inventory=5)
+        self.book_2 = sample_book(title="second", inventory=5)
+        users = sample_users(3)
+        self.borrowings = [
+            sample_borrowing(book=self.book_1, user=users[0]),
+            sample_borrowing(book=self.book_1, user=users[1]),
+            sample_borrowing(book=self.book_2, user=users[2]),
+        ]
+
+    def test_bulk_return_reports_outcome_per_id(self):
+        self.borrowings[2].return_borrowing()
+        ids = [borrowing.id for borrowing in self.borrowings] + [0]
+
+        res = self.client.post(BULK_RETURN_URL, {"ids": ids}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["status"] for item in res.data],
+            ["returned", "returned", "already_returned", "not_found"],
+        )
+        self.assertFalse(
+            Borrowing.objects.filter(
+                id__in=ids, actual_return_date__isnull=True
+            ).exists()
+        )
+        self.book_1.refresh_from_db()
+        self.book_2.refresh_from_db()
+        self.assertEqual(self.book_1.inventory, 5)
+        self.assertEqual(self.book_2.inventory, 5)
+
+    def test_repeated_bulk_return_does_not_add_inventory_twice(self):
+        ids = [borrowing.id for borrowing in self.borrowings[:2]]
+
+        self.client.post(BULK_RETURN_URL, {"ids": ids}, format="json")
+        res = self.client.post(BULK_RETURN_URL, {"ids": ids}, format="json")
+
+        self.book_1.refresh_from_db()
+        self.assertEqual(
+            [item["status"] for item in res.data],
+            ["already_returned", "already_returned"],
+        )
+        self.assertEqual(self.book_1.inventory, 5)
+
+    def test_regular_user_cannot_return_others_borrowings(self):
+        user = get_user_model().objects.create_user(
+            email="reader@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.post(
+            BULK_RETURN_URL, {"ids": [self.borrowings[0].id]}, format="json"
+        )
+
+        self.borrowings[0].refresh_from_db()
+        self.assertEqual(res.data[0]["status"], "not_found")
+        self.assertIsNone(self.borrowings[0].actual_return_date)
@@ -0,0 +1,181 @@
+import csv
+import io
+import json
+import os
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from borrowing.models import Borrowing
+from borrowing.tests.test_borrowing_api import sample_book, sample_borrowing
+
+EXPORT_URL = reverse("borrowing:borrowing-export")
+BORROWING_URL = reverse("borrowing:borrowing-list")
+
+
+def content(response):
+    return b"".join(response.streaming_content).decode()
+
+
+class BorrowingExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.test", password="Test1234!", is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email="user@test.test", password="Test1234!"
+        )
+        self.own = sample_borrowing(user=self.user, book=sample_book(title="Dune"))
+        self.other = sample_borrowing(user=self.admin, book=sample_book(title="Emma"))
+        Borrowing.objects.filter(pk=self.other.pk).update(
+            is_active=False, actual_return_date=now().date()
+        )
+
+    def export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_ndjson_rows_match_the_list(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.export()
+
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="borrowings.ndjson"', res["Content-Disposition"])
+        rows = [json.loads(line) for line in content(res).splitlines()]
+        listed = self.client.get(BORROWING_URL).data["results"]
+        self.assertEqual(rows, sorted(listed, key=lambda row: row["id"]))
+
+    def test_csv_has_header_and_rows(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.export(type="csv")
+
+        self.assertEqual(res["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(content(res))))
+        self.assertEqual([row["book"] for row in rows], ["Dune", "Emma"])
+        self.assertEqual(rows[1]["actual_return_date"], str(now().date()))
+
+    def test_csv_without_rows_has_header(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.export(type="csv", user=str(self.admin.id + self.user.id))
+
+        self.assertEqual(
+            content(res),
+            "id,borrow_date,expected_return_date,actual_return_date,book,user,"
+            "is_active\r\n",
+        )
+
+    def test_filters_and_staff_scoping_apply(self):
+        self.client.force_authenticate(self.admin)
+        for params, expected in (
+            ({"user": str(self.user.id)}, [self.own.id]),
+            ({"is-active": "False"}, [self.other.id]),
+        ):
+            rows = content(self.export(**params)).splitlines()
+            self.assertEqual([json.loads(row)["id"] for row in rows], expected)
+
+        self.client.force_authenticate(self.user)
+        rows = content(self.export()).splitlines()
+        self.assertEqual([json.loads(row)["id"] for row in rows], [self.own.id])
+
+    async def test_asgi_export_streams_asynchronously(self):
+        token = AccessToken.for_user(self.admin)
+
+        res = await self.async_client.get(
+            EXPORT_URL, headers={"authorization": f"Bearer {token}"}
+        )
+
+        self.assertTrue(res.is_async)
+        rows = b"".join([chunk async for chunk in res.streaming_content])
+        self.assertEqual(
+            [json.loads(row)["id"] for row in rows.splitlines()],
+            [self.own.id, self.other.id],
+        )
+
+    def test_unknown_type_is_rejected(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.get(EXPORT_URL, {"type": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anonymous_export_is_rejected(self):
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, since the last reset"""
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+
+def reset_peak_rss():
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+@skipUnless(os.path.exists("/proc/self/clear_refs"), "needs Linux peak RSS reset")
+class BorrowingExportMemoryTests(TestCase):
+    ROWS = 1_000_000
+
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_user(
+            email="admin@test.test", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(admin)
+        book = sample_book()
+        # Returned borrowings, so the one-active-per-user constraint holds.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH RECURSIVE seq(n) AS (
+                    SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s
+                )
+                INSERT INTO {Borrowing._meta.db_table} (
+                    borrow_date, expected_return_date, actual_return_date,
+                    book_id, user_id, is_active
+                )
+                SELECT %s, %s, %s, %s, %s, FALSE FROM seq
+                """,
+                [
+                    self.ROWS,
+                    now().date() - timedelta(days=14),
+                    now().date() - timedelta(days=7),
+                    now().date(),
+                    book.id,
+                    admin.id,
+                ],
+            )
+
+    def test_export_memory_does_not_grow_with_rows(self):
+        reset_peak_rss()
+        baseline = peak_rss()
+
+        res = self.client.get(EXPORT_URL, {"type": "csv"})
+        size = lines = 0
+        for chunk in res.streaming_content:
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+
+        self.assertEqual(lines, self.ROWS + 1)
+        # The export is ~55MB; building it in memory would take several
+        # times that.
+        self.assertGreater(size, 50 * 1024 * 1024)
+        self.assertLess(peak_rss() - baseline, 16 * 1024 * 1024)
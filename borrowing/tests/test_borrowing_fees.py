@@ -0,0 +1,163 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.tests.test_borrowing_api import sample_book, sample_borrowing
+
+FEES_SUMMARY_URL = reverse("borrowing:borrowing-fees-summary")
+TODAY = now().date()
+
+
+def detail_url(borrowing_id):
+    return reverse("borrowing:borrowing-detail", args=[borrowing_id])
+
+
+def dated_borrowing(user, book, borrowed, due, returned=None):
+    """Borrowing moved into the past; arguments are days before today"""
+    borrowing = sample_borrowing(book=book, user=user)
+    Borrowing.objects.filter(pk=borrowing.pk).update(
+        borrow_date=TODAY - timedelta(days=borrowed),
+        expected_return_date=TODAY - timedelta(days=due),
+        actual_return_date=(
+            TODAY - timedelta(days=returned) if returned is not None else None
+        ),
+        is_active=returned is None,
+    )
+    return borrowing
+
+
+class BorrowingFeeTestCase(TestCase):
+    def setUp(self):
+        self.alice = get_user_model().objects.create_user(
+            email="alice@test.test", password="Test1234!"
+        )
+        self.bob = get_user_model().objects.create_user(
+            email="bob@test.test", password="Test1234!"
+        )
+        self.dune = sample_book(title="Dune", daily_fee=10)
+        self.emma = sample_book(title="Emma", daily_fee=2)
+
+        # 4 days so far, due in 5 days: 4 * 10
+        self.on_time = dated_borrowing(self.alice, self.dune, borrowed=4, due=-5)
+        # returned after 5 days, 3 days late: 5 * 10 + 3 * 10 * 2
+        self.returned = dated_borrowing(
+            self.bob, self.dune, borrowed=10, due=8, returned=5
+        )
+        # 10 days, 3 of them overdue: 10 * 2 + 3 * 2 * 2
+        self.overdue = dated_borrowing(self.bob, self.emma, borrowed=10, due=3)
+
+
+class BorrowingFeeTests(BorrowingFeeTestCase):
+    def fees(self, borrowing):
+        return Borrowing.objects.with_fees().get(pk=borrowing.pk)
+
+    def test_fee_of_borrowing_within_due_date(self):
+        borrowing = self.fees(self.on_time)
+
+        self.assertEqual(borrowing.days_borrowed, 4)
+        self.assertEqual(borrowing.overdue_days, 0)
+        self.assertEqual(borrowing.fine, Decimal("0.00"))
+        self.assertEqual(borrowing.fee, Decimal("40.00"))
+
+    def test_overdue_days_are_fined_with_multiplier(self):
+        borrowing = self.fees(self.overdue)
+
+        self.assertEqual(borrowing.overdue_days, 3)
+        self.assertEqual(borrowing.fine, Decimal("12.00"))
+        self.assertEqual(borrowing.fee, Decimal("32.00"))
+
+    def test_returned_borrowing_is_charged_until_return(self):
+        borrowing = self.fees(self.returned)
+
+        self.assertEqual(borrowing.days_borrowed, 5)
+        self.assertEqual(borrowing.fee, Decimal("110.00"))
+
+    def test_same_day_borrowing_costs_one_day(self):
+        carol = get_user_model().objects.create_user(
+            email="carol@test.test", password="Test1234!"
+        )
+        borrowing = sample_borrowing(book=self.dune, user=carol)
+
+        self.assertEqual(self.fees(borrowing).fee, Decimal("10.00"))
+
+    @override_settings(OVERDUE_FEE_MULTIPLIER=Decimal("3"))
+    def test_multiplier_is_configurable(self):
+        self.assertEqual(self.fees(self.overdue).fine, Decimal("18.00"))
+
+    def test_retrieve_includes_fee(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+
+        res = client.get(detail_url(self.overdue.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["fee"], "32.00")
+
+
+class FeesSummaryApiTests(BorrowingFeeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="admin@test.test", password="Test1234!", is_staff=True
+            )
+        )
+
+    def test_summary_per_user_in_one_query(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(FEES_SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            [
+                {
+                    "id": self.alice.id,
+                    "name": "alice@test.test",
+                    "borrowings": 1,
+                    "fees": "40.00",
+                    "fines": "0.00",
+                },
+                {
+                    "id": self.bob.id,
+                    "name": "bob@test.test",
+                    "borrowings": 2,
+                    "fees": "142.00",
+                    "fines": "72.00",
+                },
+            ],
+        )
+
+    def test_summary_per_book(self):
+        res = self.client.get(FEES_SUMMARY_URL, {"group-by": "book"})
+
+        self.assertEqual(
+            [(row["name"], row["borrowings"], row["fees"]) for row in res.data],
+            [("Dune", 2, "150.00"), ("Emma", 1, "32.00")],
+        )
+
+    def test_summary_respects_list_filters(self):
+        res = self.client.get(FEES_SUMMARY_URL, {"overdue": "True"})
+
+        self.assertEqual([row["id"] for row in res.data], [self.bob.id])
+        self.assertEqual(res.data[0]["fees"], "32.00")
+
+    def test_invalid_group_by_is_rejected(self):
+        res = self.client.get(FEES_SUMMARY_URL, {"group-by": "cover"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_summary_is_staff_only(self):
+        self.client.force_authenticate(self.alice)
+
+        res = self.client.get(FEES_SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
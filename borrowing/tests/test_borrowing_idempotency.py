@@ -0,0 +1,166 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.views import BorrowingViewSet
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    EXPECTED_RETURN_DATE,
+    return_url,
+    sample_book,
+    sample_borrowing,
+)
+from library_service.idempotency import _response_key
+from telegram_bot.models import NotificationOutbox
+
+
+class BorrowingIdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=5)
+
+    def create(self, key, **data):
+        return self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": EXPECTED_RETURN_DATE,
+                **data,
+            },
+            headers={"Idempotency-Key": key},
+        )
+
+    def test_retried_create_is_replayed_without_queries(self):
+        first = self.create("create-1")
+
+        with self.assertNumQueries(0):
+            retry = self.create("create-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    def test_retried_return_is_replayed(self):
+        borrowing = sample_borrowing(user=self.user, book=self.book)
+        headers = {"Idempotency-Key": "return-1"}
+
+        first = self.client.post(return_url(borrowing.id), headers=headers)
+        with self.assertNumQueries(0):
+            retry = self.client.post(return_url(borrowing.id), headers=headers)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, first.data)
+        # One copy taken by the borrowing and put back once
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.create("create-1")
+        other_book = sample_book()
+
+        res = self.create("create-1", book=other_book.id)
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.create("create-1")
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="other@test.test")
+        )
+
+        res = self.create("create-1")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_failed_request_is_not_stored(self):
+        failed = self.create("create-1", book=self.book.id + 100)
+
+        res = self.create("create-1")
+
+        self.assertEqual(failed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_invalid_key_is_rejected(self):
+        res = self.create("x" * 256)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Borrowing.objects.exists())
+
+    @override_settings(IDEMPOTENCY_LOCK_SECONDS=5)
+    def test_concurrent_duplicate_waits_for_the_first_response(self):
+        first = self.create("create-1")
+        response_key = _response_key(self.user.pk, BORROWING_URL, "create-2")
+        # A first request holds the lock and stores its response shortly.
+        cache.add(f"{response_key}:lock", True)
+        stored = {
+            "fingerprint": cache.get(
+                _response_key(self.user.pk, BORROWING_URL, "create-1")
+            )["fingerprint"],
+            "status": status.HTTP_201_CREATED,
+            "data": first.data,
+        }
+        timer = threading.Timer(0.2, cache.set, [response_key, stored])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        res = self.create("create-2")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_LOCK_SECONDS=0.2)
+    def test_duplicate_of_a_stuck_request_gets_conflict(self):
+        response_key = _response_key(self.user.pk, BORROWING_URL, "create-1")
+        cache.add(f"{response_key}:lock", True, 60)
+
+        res = self.create("create-1")
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Borrowing.objects.exists())
+
+    @override_settings(IDEMPOTENCY_LOCK_SECONDS=1, IDEMPOTENCY_LOCK_TTL=600)
+    def test_lock_outlives_the_wait_of_duplicates(self):
+        with mock.patch.object(cache, "add", wraps=cache.add) as add:
+            self.create("create-1")
+
+        self.assertEqual(add.call_args.args[2], 600)
+
+    def test_request_leaves_a_lock_it_no_longer_holds(self):
+        lock_key = _response_key(self.user.pk, BORROWING_URL, "create-1") + ":lock"
+
+        def perform_create(view, serializer):
+            # The lock expired and another request took it.
+            cache.set(lock_key, "other request")
+            serializer.save()
+
+        with mock.patch.object(
+            BorrowingViewSet,
+            "perform_create",
+            autospec=True,
+            side_effect=perform_create,
+        ):
+            self.create("create-1")
+
+        self.assertEqual(cache.get(lock_key), "other request")
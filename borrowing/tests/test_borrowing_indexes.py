@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    sample_book,
+    sample_borrowing,
+)
+
+
+class BorrowingIndexTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+
+    def assertIndexSearch(self, queryset, index=""):
+        plan = queryset.explain()
+        self.assertIn(f"SEARCH borrowing_borrowing USING INDEX {index}", plan)
+
+    def test_active_borrowing_lookup_uses_index(self):
+        self.assertIndexSearch(
+            Borrowing.objects.filter(user=self.user, is_active=True),
+            "one_active_borrowing_per_user",
+        )
+
+    def test_user_filter_uses_index(self):
+        self.assertIndexSearch(Borrowing.objects.filter(user_id__in=[self.user.id, 0]))
+
+    def test_overdue_query_uses_index(self):
+        self.assertIndexSearch(
+            Borrowing.objects.filter(
+                is_active=True, expected_return_date__lt=now().date()
+            ),
+            "borrowing_active_due_idx",
+        )
+
+    def test_second_active_borrowing_is_rejected_by_constraint(self):
+        sample_borrowing(book=sample_book(), user=self.user)
+
+        with self.assertRaisesMessage(
+            ValidationError, "User already has an active borrowing."
+        ):
+            sample_borrowing(book=sample_book(), user=self.user)
+
+    def test_creating_borrowing_does_not_count_active_borrowings(self):
+        book = sample_book()
+
+        with CaptureQueriesContext(connection) as queries:
+            sample_borrowing(book=book, user=self.user)
+
+        for query in queries.captured_queries:
+            self.assertNotIn("COUNT(", query["sql"])
+        self.assertEqual(Borrowing.objects.filter(is_active=True).count(), 1)
+
+
+class OverdueFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(admin)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"reader{i}@test.test") for i in range(3)
+        )
+        book = sample_book()
+        self.overdue, self.on_time, self.returned = [
+            sample_borrowing(book=book, user=user) for user in users
+        ]
+        self.returned.return_borrowing()
+        Borrowing.objects.filter(pk__in=[self.overdue.pk, self.returned.pk]).update(
+            borrow_date=now().date() - timedelta(days=10),
+            expected_return_date=now().date() - timedelta(days=3),
+        )
+
+    def test_filter_overdue_borrowings(self):
+        res = self.client.get(BORROWING_URL, {"overdue": "True"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]], [self.overdue.id]
+        )
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from book_service import inventory_stream
+from borrowing.models import Borrowing, WaitlistEntry
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    EXPECTED_RETURN_DATE,
+    return_url,
+    sample_book,
+)
+from borrowing.tests.test_borrowing_bulk_api import sample_users
+
+
+class BorrowingInventoryStreamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=1)
+        self.publish = mock.patch.object(inventory_stream.broker, "publish").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def published(self):
+        return [event for call in self.publish.call_args_list for event in call[0][0]]
+
+    def borrow(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                BORROWING_URL,
+                {"book": self.book.id, "expected_return_date": EXPECTED_RETURN_DATE},
+            )
+
+    def test_borrow_and_return_publish_deltas(self):
+        self.borrow()
+        borrowing = Borrowing.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(return_url(borrowing.id))
+
+        self.assertEqual(
+            self.published(),
+            [
+                ("delta", {"book": self.book.id, "delta": -1}),
+                ("delta", {"book": self.book.id, "delta": 1}),
+            ],
+        )
+
+    def test_rolled_back_borrow_publishes_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Borrowing.objects.create(
+                book=self.book,
+                user=self.user,
+                expected_return_date=EXPECTED_RETURN_DATE,
+            )
+            transaction.set_rollback(True)
+
+        self.assertEqual(self.published(), [])
+
+    def test_copy_held_for_the_waitlist_is_not_put_back(self):
+        self.borrow()
+        borrowing = Borrowing.objects.get(user=self.user)
+        (waiting,) = sample_users(1)
+        WaitlistEntry.objects.create(book=self.book, user=waiting)
+        self.publish.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(return_url(borrowing.id))
+
+        self.assertEqual(self.published(), [])
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    sample_book,
+    sample_borrowing,
+)
+from library_service.pagination import KeysetPagination
+
+
+class BorrowingPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        book = sample_book(inventory=20)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"reader{i}@test.test") for i in range(7)
+        )
+        self.borrowings = [sample_borrowing(book=book, user=user) for user in users]
+        # Several borrowings share a borrow date so that ties are broken by id.
+        for i, borrowing in enumerate(self.borrowings):
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                borrow_date=now().date() - timedelta(days=i // 2)
+            )
+        self.borrowings[0].return_borrowing()
+
+    def walk(self, params):
+        ids = []
+        url = BORROWING_URL
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(item["id"] for item in res.data["results"])
+            url, params = res.data["next"], None
+        return ids
+
+    def test_pages_follow_borrow_date_then_id_without_gaps(self):
+        ids = self.walk({"page_size": 3})
+
+        expected = Borrowing.objects.order_by("-borrow_date", "-id")
+        self.assertEqual(ids, [borrowing.id for borrowing in expected])
+
+    def test_pagination_keeps_is_active_filter(self):
+        ids = self.walk({"page_size": 2, "is-active": "True"})
+
+        self.assertNotIn(self.borrowings[0].id, ids)
+        self.assertEqual(len(ids), 6)
+
+    def test_later_pages_seek_instead_of_offset(self):
+        first = self.client.get(BORROWING_URL, {"page_size": 2})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data["next"])
+
+        page_query = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("OFFSET", page_query)
+        self.assertIn("LIMIT 3", page_query)
+
+    def test_page_size_is_capped(self):
+        res = self.client.get(BORROWING_URL, {"page_size": 100000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 7)
+
+    def test_invalid_cursor(self):
+        res = self.client.get(BORROWING_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_wrong_types_is_invalid(self):
+        pagination = KeysetPagination()
+        for position in (
+            ["2024-01-01", "x"],
+            ["not a date", 1],
+            [{"a": 1}, 1],
+            ["2024-01-01", None],
+        ):
+            res = self.client.get(
+                BORROWING_URL, {"cursor": pagination.encode_cursor(position)}
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND, position)
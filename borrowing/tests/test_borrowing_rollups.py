@@ -0,0 +1,227 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from borrowing.models import (
+    BookDailyStats,
+    BookStats,
+    Borrowing,
+    LibraryDailyStats,
+    UserDailyStats,
+)
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    EXPECTED_RETURN_DATE,
+    return_url,
+    sample_book,
+)
+from borrowing.tests.test_borrowing_bulk_api import BULK_URL, sample_users
+
+STATS_URL = reverse("borrowing:borrowing-stats")
+BULK_RETURN_URL = reverse("borrowing:borrowing-bulk-return")
+
+
+def daily_counts(model, **filters):
+    return {
+        row[0]: row[1:]
+        for row in model.objects.filter(**filters).values_list(
+            "date", "borrowed", "returned"
+        )
+    }
+
+
+class BorrowingRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.book = sample_book(title="popular")
+        self.today = now().date()
+
+    def borrow(self, user, book=None):
+        self.client.force_authenticate(user)
+        res = self.client.post(
+            BORROWING_URL,
+            {
+                "book": (book or self.book).id,
+                "expected_return_date": EXPECTED_RETURN_DATE,
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Borrowing.objects.get(user=user, is_active=True)
+
+    def test_create_and_return_are_counted(self):
+        borrowing = self.borrow(self.user)
+
+        self.assertEqual(
+            daily_counts(BookDailyStats, book=self.book), {self.today: (1, 0)}
+        )
+        self.assertEqual(
+            daily_counts(UserDailyStats, user=self.user), {self.today: (1, 0)}
+        )
+
+        self.client.post(return_url(borrowing.id))
+
+        self.assertEqual(
+            daily_counts(BookDailyStats, book=self.book), {self.today: (1, 1)}
+        )
+        self.assertEqual(
+            daily_counts(UserDailyStats, user=self.user), {self.today: (1, 1)}
+        )
+        self.assertEqual(daily_counts(LibraryDailyStats), {self.today: (1, 1)})
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual((stats.borrowed, stats.returned), (1, 1))
+
+    def test_bulk_create_and_return_are_counted(self):
+        users = sample_users(3)
+        self.client.force_authenticate(self.admin)
+        self.client.post(
+            BULK_URL,
+            [
+                {
+                    "book": self.book.id,
+                    "user": user.id,
+                    "expected_return_date": EXPECTED_RETURN_DATE,
+                }
+                for user in users
+            ],
+            format="json",
+        )
+        ids = list(Borrowing.objects.values_list("id", flat=True))
+
+        self.client.post(BULK_RETURN_URL, {"ids": ids[:2]}, format="json")
+
+        self.assertEqual(
+            daily_counts(BookDailyStats, book=self.book), {self.today: (3, 2)}
+        )
+        self.assertEqual(
+            daily_counts(UserDailyStats, user=users[0]), {self.today: (1, 1)}
+        )
+        self.assertEqual(daily_counts(LibraryDailyStats), {self.today: (3, 2)})
+        self.assertEqual(BookStats.objects.get(book=self.book).borrowed, 3)
+
+    def test_rebuild_recounts_from_borrowings(self):
+        self.borrow(self.user)
+        old = Borrowing.objects.create(
+            book=self.book,
+            user=self.admin,
+            expected_return_date=self.today,
+            actual_return_date=self.today,
+        )
+        last_week = self.today - timedelta(days=7)
+        Borrowing.objects.filter(pk=old.pk).update(
+            borrow_date=last_week, expected_return_date=last_week
+        )
+        BookDailyStats.objects.update(borrowed=99)
+        LibraryDailyStats.objects.update(returned=99)
+        UserDailyStats.objects.create(
+            user=self.user, date=self.today - timedelta(days=400), borrowed=5
+        )
+        BookStats.objects.all().delete()
+
+        out = StringIO()
+        call_command("rebuild_rollups", "--days-per-chunk", "3", stdout=out)
+
+        self.assertEqual(
+            daily_counts(BookDailyStats, book=self.book),
+            {last_week: (1, 0), self.today: (1, 1)},
+        )
+        self.assertEqual(
+            daily_counts(UserDailyStats, user=self.user), {self.today: (1, 0)}
+        )
+        self.assertEqual(
+            daily_counts(LibraryDailyStats), {last_week: (1, 0), self.today: (1, 1)}
+        )
+        stats = BookStats.objects.get(book=self.book)
+        self.assertEqual((stats.borrowed, stats.returned), (2, 1))
+        self.assertIn("recounted 8 days in 4 chunks", out.getvalue())
+
+
+class BorrowingStatsApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.books = [sample_book(title=f"book {i}") for i in range(3)]
+        self.today = now().date()
+        for book, borrowed in zip(self.books, (2, 5, 1)):
+            BookStats.objects.create(book=book, borrowed=borrowed, returned=1)
+        BookDailyStats.objects.create(
+            book=self.books[0], date=self.today, borrowed=2, returned=1
+        )
+        BookDailyStats.objects.create(book=self.books[1], date=self.today, borrowed=3)
+        BookDailyStats.objects.create(
+            book=self.books[1], date=self.today - timedelta(days=2), borrowed=2
+        )
+        LibraryDailyStats.objects.create(date=self.today, borrowed=5, returned=1)
+        LibraryDailyStats.objects.create(
+            date=self.today - timedelta(days=2), borrowed=2
+        )
+
+    def test_stats_are_staff_only(self):
+        user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_top_books_are_ranked_by_borrowings(self):
+        res = self.client.get(STATS_URL, {"top": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(book["title"], book["borrowed"]) for book in res.data["top_books"]],
+            [("book 1", 5), ("book 0", 2)],
+        )
+
+    def test_daily_series_covers_every_day(self):
+        res = self.client.get(STATS_URL, {"days": 3})
+
+        self.assertEqual(
+            [
+                (day["date"], day["borrowed"], day["returned"])
+                for day in res.data["daily"]
+            ],
+            [
+                (str(self.today - timedelta(days=2)), 2, 0),
+                (str(self.today - timedelta(days=1)), 0, 0),
+                (str(self.today), 5, 1),
+            ],
+        )
+
+    def test_daily_series_of_a_book(self):
+        res = self.client.get(STATS_URL, {"days": 1, "book": self.books[0].id})
+
+        self.assertEqual(res.data["daily"][0]["borrowed"], 2)
+
+    def test_daily_series_of_a_user(self):
+        UserDailyStats.objects.create(user=self.admin, date=self.today, returned=4)
+
+        res = self.client.get(STATS_URL, {"days": 1, "user": self.admin.id})
+
+        self.assertEqual(res.data["daily"][0]["returned"], 4)
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({"top": 0}, {"days": 1000}, {"book": 1, "user": 1}):
+            res = self.client.get(STATS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_query_count_does_not_grow_with_history(self):
+        with self.assertNumQueries(2):
+            self.client.get(STATS_URL, {"days": 366})
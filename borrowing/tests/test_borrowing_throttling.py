@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    EXPECTED_RETURN_DATE,
+    sample_book,
+)
+
+
+@override_settings(THROTTLE_BUCKETS={"borrowing_create": {"user": "1/min"}})
+class BorrowingThrottlingTests(TestCase):
+    def setUp(self):
+        throttle_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(throttle_dir.cleanup)
+        overrider = override_settings(
+            THROTTLE_DATABASE=os.path.join(throttle_dir.name, "throttle.sqlite3")
+        )
+        overrider.enable()
+        self.addCleanup(overrider.disable)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            "book": sample_book().id,
+            "expected_return_date": EXPECTED_RETURN_DATE,
+        }
+
+    def test_create_is_throttled_per_user(self):
+        first = self.client.post(BORROWING_URL, self.payload)
+        second = self.client.post(BORROWING_URL, self.payload)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(second["Retry-After"], "60")
+
+        other = get_user_model().objects.create_user(
+            email="other@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(other)
+        res = self.client.post(BORROWING_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_reads_are_not_throttled(self):
+        self.client.post(BORROWING_URL, self.payload)
+
+        res = self.client.get(BORROWING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,223 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import WaitlistEntry
+from borrowing.tests.test_borrowing_api import (
+    BORROWING_URL,
+    EXPECTED_RETURN_DATE,
+    return_url,
+    sample_book,
+    sample_borrowing,
+)
+from borrowing.tests.test_borrowing_bulk_api import sample_users
+from telegram_bot.models import NotificationOutbox
+
+WAITLIST_URL = reverse("borrowing:waitlist-list")
+BULK_RETURN_URL = reverse("borrowing:borrowing-bulk-return")
+
+
+def book_detail_url(book_id):
+    return reverse("book:book-detail", args=[book_id])
+
+
+def waitlist_detail_url(entry_id):
+    return reverse("borrowing:waitlist-detail", args=[entry_id])
+
+
+@override_settings(WAITLIST_HOLD_HOURS=2)
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.book = sample_book(title="in demand", inventory=1)
+        self.reader, self.first, self.second = sample_users(3)
+        self.borrowing = sample_borrowing(book=self.book, user=self.reader)
+        self.entries = [
+            WaitlistEntry.objects.create(book=self.book, user=user)
+            for user in (self.first, self.second)
+        ]
+        NotificationOutbox.objects.all().delete()
+
+    def test_join_waitlist_of_unavailable_book(self):
+        user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.post(WAITLIST_URL, {"book": self.book.id})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["user"], user.id)
+        self.assertFalse(res.data["holds_copy"])
+
+        again = self.client.post(WAITLIST_URL, {"book": self.book.id})
+        available = self.client.post(WAITLIST_URL, {"book": sample_book().id})
+        self.assertEqual(again.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(available.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_users_see_only_their_entries(self):
+        self.client.force_authenticate(self.first)
+
+        res = self.client.get(WAITLIST_URL)
+
+        self.assertEqual(
+            [entry["id"] for entry in res.data["results"]], [self.entries[0].id]
+        )
+
+    def test_return_holds_copy_for_first_in_line(self):
+        self.client.force_authenticate(self.reader)
+
+        self.client.post(return_url(self.borrowing.id))
+
+        first, second = WaitlistEntry.objects.order_by("id")
+        self.assertTrue(first.holds_copy())
+        self.assertAlmostEqual(
+            first.hold_expires_at, now() + timedelta(hours=2), delta=timedelta(1)
+        )
+        self.assertIsNone(second.hold_expires_at)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        (message,) = NotificationOutbox.objects.values_list("text", flat=True)
+        self.assertIn("Book On Hold", message)
+        self.assertIn(self.first.email, message)
+
+    def test_holder_borrows_held_copy(self):
+        self.borrowing.return_borrowing()
+        self.client.force_authenticate(self.first)
+
+        res = self.client.post(
+            BORROWING_URL,
+            {"book": self.book.id, "expected_return_date": EXPECTED_RETURN_DATE},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(WaitlistEntry.objects.filter(user=self.first).exists())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_others_cannot_borrow_held_copy(self):
+        self.borrowing.return_borrowing()
+
+        with self.assertRaises(ValidationError):
+            sample_borrowing(book=self.book, user=self.second)
+
+    def test_borrowing_from_shelf_leaves_waitlist(self):
+        Book.objects.filter(pk=self.book.pk).update(inventory=1)
+
+        sample_borrowing(book=self.book, user=self.second)
+
+        self.assertFalse(WaitlistEntry.objects.filter(user=self.second).exists())
+
+    def test_expired_hold_passes_to_next_in_line(self):
+        self.borrowing.return_borrowing()
+        WaitlistEntry.objects.filter(user=self.first).update(
+            hold_expires_at=now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(WaitlistEntry.objects.release_expired_holds(), 1)
+
+        (entry,) = WaitlistEntry.objects.all()
+        self.assertEqual(entry.user, self.second)
+        self.assertTrue(entry.holds_copy())
+
+        WaitlistEntry.objects.update(hold_expires_at=now() - timedelta(minutes=1))
+        WaitlistEntry.objects.release_expired_holds()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_leaving_with_hold_passes_copy_on(self):
+        self.borrowing.return_borrowing()
+        self.client.force_authenticate(self.first)
+
+        res = self.client.delete(waitlist_detail_url(self.entries[0].id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(WaitlistEntry.objects.get(user=self.second).holds_copy())
+
+    def test_copies_added_by_staff_go_to_the_line_first(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.patch(book_detail_url(self.book.id), {"inventory": 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            all(entry.holds_copy() for entry in WaitlistEntry.objects.all())
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+    def test_edits_that_add_no_copies_leave_the_line(self):
+        self.book.refresh_from_db()
+        self.book.title = "renamed"
+        self.book.save()
+        self.book.inventory = 1
+        self.book.save(update_fields=["title"])
+
+        self.assertFalse(WaitlistEntry.objects.exclude(hold_expires_at=None).exists())
+
+    def test_bulk_return_hands_out_copies_per_book(self):
+        Book.objects.filter(pk=self.book.pk).update(inventory=1)
+        other_book = sample_book(title="other", inventory=1)
+        readers = sample_users(2, prefix="reader")
+        borrowings = [
+            self.borrowing,
+            sample_borrowing(book=self.book, user=readers[0]),
+            sample_borrowing(book=other_book, user=readers[1]),
+        ]
+        staff = get_user_model().objects.create_user(
+            email="admin@admin.admin", password="Test1234!", is_staff=True
+        )
+        self.client.force_authenticate(staff)
+        NotificationOutbox.objects.all().delete()
+
+        self.client.post(
+            BULK_RETURN_URL,
+            {"ids": [borrowing.id for borrowing in borrowings]},
+            format="json",
+        )
+
+        self.assertEqual(
+            WaitlistEntry.objects.filter(hold_expires_at__isnull=False).count(), 2
+        )
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual((self.book.inventory, other_book.inventory), (0, 1))
+
+    def test_return_cost_does_not_grow_with_line(self):
+        self.borrowing.return_borrowing()
+        short_line = sample_borrowing(book=self.book, user=self.first)
+        long_line = sample_borrowing(book=sample_book(inventory=1), user=self.second)
+        WaitlistEntry.objects.bulk_create(
+            WaitlistEntry(book=long_line.book, user=user)
+            for user in sample_users(500, prefix="waiting")
+        )
+
+        with CaptureQueriesContext(connection) as short_queries:
+            short_line.return_borrowing()
+        with CaptureQueriesContext(connection) as long_queries:
+            long_line.return_borrowing()
+
+        self.assertEqual(len(short_queries), len(long_queries))
+        plan = (
+            WaitlistEntry.objects.waiting()
+            .filter(book=self.book)
+            .order_by("id")[:1]
+            .explain()
+        )
+        self.assertIn("USING INDEX waitlist_waiting_idx", plan)
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from book_service.models import Book
+from borrowing.tests.test_borrowing_api import sample_book, sample_borrowing
+
+
+class ConditionalInventoryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+
+    def test_take_copy_never_goes_below_zero(self):
+        book = sample_book(inventory=1)
+
+        self.assertTrue(Book.objects.take_copy(book.id))
+        self.assertFalse(Book.objects.take_copy(book.id))
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_stale_instance_cannot_borrow_last_copy_twice(self):
+        book = sample_book(inventory=1)
+        stale_book = Book.objects.get(pk=book.pk)
+        sample_borrowing(book=book, user=self.user)
+        other_user = get_user_model().objects.create_user(
+            email="other@test.test", password="Test1234!"
+        )
+
+        with self.assertRaises(ValidationError):
+            sample_borrowing(book=stale_book, user=other_user)
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_duplicate_return_adds_inventory_once(self):
+        book = sample_book(inventory=1)
+        borrowing = sample_borrowing(book=book, user=self.user)
+        stale_borrowing = type(borrowing).objects.get(pk=borrowing.pk)
+
+        borrowing.return_borrowing()
+        with self.assertRaises(ValidationError):
+            stale_borrowing.return_borrowing()
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+
+from borrowing.models import Borrowing, OverdueScanCheckpoint
+from borrowing.overdue import scan_overdue
+from borrowing.tests.test_borrowing_api import sample_book, sample_borrowing
+from telegram_bot.models import NotificationOutbox
+
+TODAY = now().date()
+
+
+def overdue_borrowing(email, days_overdue, title="book"):
+    user = get_user_model().objects.create_user(email=email, password="Test1234!")
+    borrowing = sample_borrowing(book=sample_book(title=title), user=user)
+    Borrowing.objects.filter(pk=borrowing.pk).update(
+        borrow_date=TODAY - timedelta(days=30),
+        expected_return_date=TODAY - timedelta(days=days_overdue),
+    )
+    return borrowing
+
+
+class OverdueScanTests(TestCase):
+    def setUp(self):
+        self.late = overdue_borrowing("late@test.test", 3, title="Dune")
+        self.later = overdue_borrowing("later@test.test", 1, title="Emma")
+        self.due_today = overdue_borrowing("today@test.test", 0)
+        returned = overdue_borrowing("returned@test.test", 5)
+        returned.return_borrowing()
+        NotificationOutbox.objects.all().delete()
+
+    def test_scan_queues_reminders_for_overdue_borrowings(self):
+        result = scan_overdue()
+
+        self.assertEqual(result["rows"], 2)
+        self.assertEqual(result["reminders"], 2)
+        digest = NotificationOutbox.objects.get().text
+        self.assertIn("late@test.test", digest)
+        self.assertIn(f"- Dune (due {TODAY - timedelta(days=3)})", digest)
+        self.assertIn("later@test.test", digest)
+        self.assertNotIn("today@test.test", digest)
+        self.assertNotIn("returned@test.test", digest)
+
+    def test_rerun_only_scans_newly_overdue_borrowings(self):
+        scan_overdue()
+        checkpoint = OverdueScanCheckpoint.objects.get()
+        self.assertEqual(checkpoint.borrowing_id, self.later.id)
+
+        self.assertEqual(scan_overdue()["rows"], 0)
+
+        result = scan_overdue(today=TODAY + timedelta(days=1))
+
+        self.assertEqual(result["rows"], 1)
+        self.assertIn("today@test.test", NotificationOutbox.objects.last().text)
+
+    def test_full_scan_ignores_checkpoint(self):
+        scan_overdue()
+
+        self.assertEqual(scan_overdue(full=True)["rows"], 2)
+
+    def test_checkpoint_advances_with_every_chunk(self):
+        result = scan_overdue(chunk_size=1)
+
+        self.assertEqual(result["rows"], 2)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.assertEqual(
+            OverdueScanCheckpoint.objects.get().borrowing_id, self.later.id
+        )
+
+    def test_command_reports_scan_rate(self):
+        out = StringIO()
+
+        call_command("scan_overdue", stdout=out)
+
+        self.assertIn("scanned=2 reminders=2", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
@@ -2,11 +2,12 @@ from django.urls import path, include
 from rest_framework import viewsets
 from rest_framework.routers import DefaultRouter
 
-from borrowing.views import BorrowingViewSet
+from borrowing.views import BorrowingViewSet, WaitlistViewSet
 
 router = DefaultRouter()
 
 router.register("borrowings", BorrowingViewSet)
+router.register("waitlist", WaitlistViewSet, basename="waitlist")
 
 urlpatterns = [
     path("", include(router.urls)),
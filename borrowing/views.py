@@ -1,41 +1,88 @@
+from datetime import timedelta
+
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter
-from rest_framework import viewsets, mixins
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, WaitlistEntry
+from borrowing.rollups import daily_series, top_books
+from library_service.asyncviews import AsyncReadMixin
+from library_service.export import EXPORT_TYPES, export_response
+from library_service.idempotency import IDEMPOTENCY_KEY_PARAMETER, idempotent
+from library_service.pagination import KeysetPagination
+from library_service.projection import ProjectedListModelMixin
+from library_service.routers import ReplicaReadsMixin
+from library_service.throttling import TokenBucketThrottle
 from borrowing.serializers import (
     BorrowingSerializer,
     BorrowingDetailSerializer,
     BorrowingListSerializer,
+    BorrowingListProjection,
     BorrowingCreateSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkCreateSerializer,
+    BorrowingBulkReturnSerializer,
+    BorrowingReturnOutcomeSerializer,
+    BorrowingFeeSummarySerializer,
+    BorrowingStatsQuerySerializer,
+    BorrowingStatsSerializer,
+    WaitlistEntrySerializer,
 )
 
 
+class BorrowingPagination(KeysetPagination):
+    ordering = ("-borrow_date", "-id")
+
+
+# group-by value of the fees summary -> (key, name) lookups of the group
+FEE_SUMMARY_GROUPS = {
+    "user": ("user", "user__email"),
+    "book": ("book", "book__title"),
+}
+
+
 def _params_to_ints(qs):
     """Converts a list of string IDs to a list of integers"""
     return [int(str_id) for str_id in qs.split(",")]
 
 
+# Filters applied by BorrowingViewSet.get_queryset
+FILTER_PARAMETERS = [
+    OpenApiParameter(
+        name="is_active",
+        type=bool,
+        description="Filter by is-active state (e.g., ?is-active=True)",
+    ),
+    OpenApiParameter(
+        name="user",
+        type={"type": "array", "items": {"type": "number"}},
+        description="Filter by user IDs " "(e.g., ?user=1,3)",
+    ),
+    OpenApiParameter(
+        name="overdue",
+        type=bool,
+        description="Only active borrowings past their expected "
+        "return date (e.g., ?overdue=True)",
+    ),
+]
+
+
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                name="is_active",
-                type=bool,
-                description="Filter by is-active state (e.g., ?is-active=True)",
-            ),
-            OpenApiParameter(
-                name="user",
-                type={"type": "array", "items": {"type": "number"}},
-                description="Filter by user IDs " "(e.g., ?user=1,3)",
-            ),
-        ]
-    )
+    list=extend_schema(parameters=FILTER_PARAMETERS),
+    create=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
 )
 class BorrowingViewSet(
+    AsyncReadMixin,
+    ReplicaReadsMixin,
+    ProjectedListModelMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -43,6 +90,16 @@ class BorrowingViewSet(
 ):
     queryset = Borrowing.objects.all()
     permission_classes = [IsAuthenticated]
+    projection_class = BorrowingListProjection
+    pagination_class = BorrowingPagination
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "borrowing_create"
+
+    def get_throttles(self):
+        # Only borrowing one book at a time is open to every user.
+        if self.action != "create":
+            return []
+        return super().get_throttles()
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -53,6 +110,10 @@ class BorrowingViewSet(
             return BorrowingCreateSerializer
         if self.action == "return_borrowing":
             return BorrowingReturnSerializer
+        if self.action == "bulk_create":
+            return BorrowingBulkCreateSerializer
+        if self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
         return BorrowingSerializer
 
     def get_queryset(self):
@@ -60,23 +121,77 @@ class BorrowingViewSet(
 
         is_active = self.request.query_params.get("is-active")
         user = self.request.query_params.get("user")
+        overdue = self.request.query_params.get("overdue")
 
         if is_active:
             queryset = queryset.filter(is_active=is_active)
 
+        if overdue == "True":
+            queryset = queryset.filter(
+                is_active=True, expected_return_date__lt=now().date()
+            )
+
         if user:
             user_ids = _params_to_ints(user)
             queryset = queryset.filter(user_id__in=user_ids)
 
+        if self.action == "retrieve":
+            queryset = queryset.with_fees()
+
         if self.request.user.is_staff:
             return queryset
         return queryset.filter(user=self.request.user)
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="type",
+                type=str,
+                enum=list(EXPORT_TYPES),
+                description="NDJSON (default) or CSV (e.g., ?type=csv)",
+            ),
+            *FILTER_PARAMETERS,
+        ],
+        responses={
+            (200, media_type): OpenApiTypes.STR for media_type in EXPORT_TYPES.values()
+        },
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        pagination_class=None,
+    )
+    def export(self, request):
+        """
+        Stream all filtered borrowings, in id order, as NDJSON or CSV rows
+        like those of the list
+        """
+        export_type = request.query_params.get("type", "ndjson")
+        if export_type not in EXPORT_TYPES:
+            raise ValidationError(
+                {"type": f"Must be one of: {', '.join(EXPORT_TYPES)}."}
+            )
+
+        return export_response(
+            self.projection_class(),
+            self.filter_queryset(self.get_queryset()).order_by("id"),
+            export_type,
+            filename="borrowings",
+            asynchronous=isinstance(request._request, ASGIRequest),
+        )
+
+    @extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER])
     @action(
         methods=["POST"],
         detail=True,
         url_path="return-borrowing",
     )
+    @idempotent
     def return_borrowing(self, request, pk=None):
         borrowing = self.get_object()
         serializer = self.get_serializer(
@@ -88,3 +203,172 @@ class BorrowingViewSet(
         serializer.save()
 
         return Response(serializer.data)
+
+    @extend_schema(
+        request=BorrowingBulkCreateSerializer(many=True),
+        responses=BorrowingSerializer(many=True),
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_create(self, request):
+        """Create a batch of borrowings atomically; errors are reported per item"""
+        serializer = self.get_serializer(data=request.data, many=True)
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(responses=BorrowingReturnOutcomeSerializer(many=True))
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-return",
+    )
+    def bulk_return(self, request):
+        """Return a batch of borrowings, reporting the outcome of every id"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        outcomes = Borrowing.return_borrowings(
+            self.get_queryset(), serializer.validated_data["ids"]
+        )
+
+        return Response(
+            BorrowingReturnOutcomeSerializer(
+                [
+                    {"id": borrowing_id, "status": outcome}
+                    for borrowing_id, outcome in outcomes.items()
+                ],
+                many=True,
+            ).data
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="group-by",
+                type=str,
+                enum=list(FEE_SUMMARY_GROUPS),
+                description="Aggregate per user (default) or per book "
+                "(e.g., ?group-by=book)",
+            ),
+        ],
+        responses=BorrowingFeeSummarySerializer(many=True),
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="fees-summary",
+        permission_classes=[IsAdminUser],
+    )
+    def fees_summary(self, request):
+        """Fees and fines per user or per book, aggregated in one GROUP BY"""
+        group_by = request.query_params.get("group-by", "user")
+        if group_by not in FEE_SUMMARY_GROUPS:
+            raise ValidationError(
+                {"group-by": f"Must be one of: {', '.join(FEE_SUMMARY_GROUPS)}."}
+            )
+        key, name = FEE_SUMMARY_GROUPS[group_by]
+
+        rows = (
+            self.get_queryset()
+            .with_fees()
+            .values(key, name)
+            .annotate(borrowings=Count("id"), fees=Sum("fee"), fines=Sum("fine"))
+            .order_by(key)
+        )
+
+        return Response(
+            BorrowingFeeSummarySerializer(
+                [
+                    {
+                        "id": row[key],
+                        "name": row[name],
+                        "borrowings": row["borrowings"],
+                        "fees": row["fees"],
+                        "fines": row["fines"],
+                    }
+                    for row in rows
+                ],
+                many=True,
+            ).data
+        )
+
+    @extend_schema(
+        parameters=[BorrowingStatsQuerySerializer],
+        responses=BorrowingStatsSerializer,
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="stats",
+        permission_classes=[IsAdminUser],
+    )
+    def stats(self, request):
+        """
+        The most borrowed books of all time and the borrowings started and
+        returned per day over the last days, of a book, a user or the whole
+        library; read from rollups, so the cost does not grow with history
+        """
+        params = BorrowingStatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        today = now().date()
+
+        return Response(
+            BorrowingStatsSerializer(
+                {
+                    "top_books": top_books(params["top"]),
+                    "daily": daily_series(
+                        today - timedelta(days=params["days"] - 1),
+                        today,
+                        book=params.get("book"),
+                        user=params.get("user"),
+                    ),
+                }
+            ).data
+        )
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="book",
+                type={"type": "array", "items": {"type": "number"}},
+                description="Filter by book IDs (e.g., ?book=1,3)",
+            ),
+        ]
+    ),
+)
+class WaitlistViewSet(
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+):
+    """
+    First come, first served waitlists of books with no copies left; a
+    returned copy is held for the first user in line, who is notified
+    """
+
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = self.queryset
+        book = self.request.query_params.get("book")
+        if book:
+            queryset = queryset.filter(book_id__in=_params_to_ints(book))
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        instance.leave()
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class LibraryServiceConfig(AppConfig):
+    name = "library_service"
+
+    def ready(self):
+        from library_service import checks  # noqa: F401
+        from library_service.querycount import install_query_counter
+
+        connection_created.connect(install_query_counter)
@@ -1,7 +1,8 @@
 """
 ASGI config for library_service project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``,
+which serves the inventory stream of the books ahead of Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +10,13 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_service.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from book_service.inventory_stream import InventoryStreamMiddleware  # noqa: E402
+from library_service.asyncviews import AsyncReadASGIHandler  # noqa: E402
+
+application = InventoryStreamMiddleware(AsyncReadASGIHandler())
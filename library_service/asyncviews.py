@@ -0,0 +1,141 @@
+"""
+Async-native reads for viewsets served by the ASGI application.
+
+Under ASGI a sync view runs in a worker thread for the whole request. A
+viewset with ``AsyncReadMixin`` instead serves its ``async_actions`` as
+coroutines that only leave the event loop for their queries, made through
+the async ORM. The ASGI application routes through ``settings.ASGI_URLCONF``,
+which registers such viewsets with ``async_router``; under WSGI nothing
+changes. Authentication, permissions, filtering and pagination are those
+of the sync actions. Cache reads are awaited through the cache's async
+methods, as the shared cache may be a database table.
+"""
+
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.http import Http404
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    """Serve ``async_actions`` natively async when ``serve_async`` is set"""
+
+    # action -> coroutine method serving it
+    async_actions = {"list": "alist", "retrieve": "aretrieve"}
+    serve_async = False
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not cls.serve_async or not set(actions.values()) & set(cls.async_actions):
+            return view
+
+        # Other actions of the route, e.g. create on the list route, keep
+        # running in a thread.
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            if action is None and request.method == "HEAD":
+                action = actions.get("get")
+            if action not in cls.async_actions:
+                return await sync_view(request, *args, **kwargs)
+
+            self = cls(**initkwargs)
+            self.action_map = {**actions, request.method.lower(): action}
+            return await self.adispatch(request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """``dispatch`` for the actions in ``async_actions``"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(self, self.async_actions[self.action])
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """
+        ``initial``, or the ``ainitial`` of a later class, which awaits the
+        cache and database reads its ``initial`` would block the loop on
+        """
+        parent = getattr(super(), "ainitial", None)
+        if parent is not None:
+            await parent(request, *args, **kwargs)
+        else:
+            self.initial(request, *args, **kwargs)
+
+    async def aperform_authentication(self, request):
+        """
+        Authenticate ahead of ``initial``, awaiting authenticators that
+        provide ``aauthenticate``; the others run in a thread.
+        """
+        try:
+            for authenticator in request.authenticators:
+                if hasattr(authenticator, "aauthenticate"):
+                    user_auth = await authenticator.aauthenticate(request)
+                else:
+                    user_auth = await sync_to_async(authenticator.authenticate)(request)
+                if user_auth is not None:
+                    request._authenticator = authenticator
+                    request.user, request.auth = user_auth
+                    return
+        except Exception:
+            request._not_authenticated()
+            raise
+        request._not_authenticated()
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+def async_router(router):
+    """Copy of ``router`` whose ``AsyncReadMixin`` viewsets serve async"""
+    copy = type(router)()
+    for prefix, viewset, basename in router.registry:
+        if issubclass(viewset, AsyncReadMixin):
+            viewset = type(
+                viewset.__name__,
+                (viewset,),
+                {"serve_async": True, "__module__": viewset.__module__},
+            )
+        copy.register(prefix, viewset, basename)
+    return copy
+
+
+class AsyncReadASGIHandler(ASGIHandler):
+    """ASGI handler resolving requests with ``settings.ASGI_URLCONF``"""
+
+    async def get_response_async(self, request):
+        request.urlconf = settings.ASGI_URLCONF
+        return await super().get_response_async(request)
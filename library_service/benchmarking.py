@@ -0,0 +1,105 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway test database so they never touch the
+data in the configured ``default`` database.
+"""
+
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def isolated_database():
+    """Create a file-backed test database for the duration of the block"""
+    # Like the test runner, run with DEBUG off so neither query logging nor
+    # the debug toolbar distorts the measurements, and without throttling,
+    # which would turn away most of the load.
+    setup_test_environment(debug=False)
+    throttling_off = override_settings(THROTTLE_BUCKETS={})
+    throttling_off.enable()
+    test_settings = connection.settings_dict["TEST"]
+    previous_name = test_settings.get("NAME")
+    if connection.vendor == "sqlite":
+        test_settings["NAME"] = os.path.join(
+            tempfile.mkdtemp(prefix="library-bench-"), "bench.sqlite3"
+        )
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = previous_name
+        throttling_off.disable()
+        teardown_test_environment()
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an unsorted sample list"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+
+
+def format_summary(label, summary):
+    return (
+        f"{label}: n={summary['count']} "
+        f"mean={summary['mean_ms']:.2f}ms "
+        f"p50={summary['p50_ms']:.2f}ms "
+        f"p95={summary['p95_ms']:.2f}ms "
+        f"p99={summary['p99_ms']:.2f}ms"
+    )
+
+
+# Result metric -> +1 if it gets worse as it grows, -1 if as it shrinks
+REGRESSION_DIRECTIONS = {
+    "throughput": -1,
+    "p50_ms": 1,
+    "p95_ms": 1,
+    "p99_ms": 1,
+    "queries_per_request": 1,
+}
+# Metrics free of timing noise, which regress on any change
+EXACT_METRICS = {"queries_per_request"}
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compare ``results`` with ``baseline``, both mapping scenario names to
+    metrics, and return ``(scenario, metric, baseline, current)`` for every
+    metric that got worse by more than ``tolerance`` (a fraction)
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        previous = baseline.get(scenario)
+        if previous is None:
+            continue
+        for metric, direction in REGRESSION_DIRECTIONS.items():
+            if metric not in metrics or metric not in previous:
+                continue
+            allowed = 0 if metric in EXACT_METRICS else tolerance
+            change = (metrics[metric] - previous[metric]) * direction
+            if change > abs(previous[metric]) * allowed + 1e-9:
+                regressions.append(
+                    (scenario, metric, previous[metric], metrics[metric])
+                )
+    return regressions
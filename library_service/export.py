@@ -0,0 +1,79 @@
+"""
+Streaming exports of projection rows as NDJSON or CSV.
+
+Rows are read with a chunked ``iterator()`` and written out one chunk at a
+time, so memory use does not depend on the number of rows exported.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+# export type -> content type of the response
+EXPORT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def ndjson_chunks(batches, fieldnames):
+    for batch in batches:
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+
+def csv_chunks(batches, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Nothing was exported: only the header is pending.
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORT_WRITERS = {"ndjson": ndjson_chunks, "csv": csv_chunks}
+
+
+async def aiter_chunks(chunks):
+    """
+    Serve ``chunks`` to an ASGI server one at a time; Django would read a
+    sync iterator into memory first.
+    """
+    pull = sync_to_async(next)
+    while (chunk := await pull(chunks, None)) is not None:
+        yield chunk
+
+
+def export_response(projection, queryset, export_type, filename, asynchronous=False):
+    """
+    Stream the rows of ``queryset`` represented by ``projection`` as an
+    ``export_type`` attachment named ``filename``; ``asynchronous`` for
+    requests served over ASGI
+    """
+    rows = map(
+        projection.to_representation,
+        projection.values(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+    )
+    fieldnames = [name for name, _, _ in projection.columns]
+    chunks = EXPORT_WRITERS[export_type](_batches(rows, EXPORT_CHUNK_SIZE), fieldnames)
+    if asynchronous:
+        chunks = aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_TYPES[export_type])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_type}"'
+    return response
@@ -0,0 +1,127 @@
+"""
+``Idempotency-Key`` support for retried writes.
+
+The first successful response to a key is stored in the cache for
+``IDEMPOTENCY_KEY_TTL`` seconds and replayed to every retry of the same
+request, without running the view again. Keys are scoped to the user and
+the path. A duplicate that arrives while the first request is running
+waits up to ``IDEMPOTENCY_LOCK_SECONDS`` for its response. Failed requests
+change nothing, so they are not stored and may be retried with the same key.
+
+Retries may reach any worker, so the cache must be shared by all of them;
+the ``library_service.E001`` deploy check rejects a per-process cache.
+"""
+
+import functools
+import hashlib
+import json
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name=HEADER,
+    type=str,
+    location=OpenApiParameter.HEADER,
+    description="Unique key of the request; retries with the same key get "
+    "the first response back instead of repeating the write",
+)
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still in progress."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+def _response_key(user_pk, path, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{user_pk}:{path}:{digest}"
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReused()
+    return Response(
+        stored["data"], status=stored["status"], headers={REPLAYED_HEADER: "true"}
+    )
+
+
+def idempotent(method):
+    """Replay the stored response of view ``method`` to requests with a used key"""
+
+    @functools.wraps(method)
+    def view(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return method(self, request, *args, **kwargs)
+        if not 0 < len(key) <= MAX_KEY_LENGTH or not key.isprintable():
+            raise ValidationError(
+                {HEADER: f"Must be 1 to {MAX_KEY_LENGTH} printable characters."}
+            )
+
+        response_key = _response_key(request.user.pk, request.path, key)
+        lock_key = f"{response_key}:lock"
+        fingerprint = _fingerprint(request)
+
+        # The lock outlives any request, so that it only expires after the
+        # worker holding it died; the token keeps a request from releasing
+        # a lock taken by another one after that.
+        token = secrets.token_hex(16)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_SECONDS
+        while True:
+            stored = cache.get(response_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            if cache.add(lock_key, token, settings.IDEMPOTENCY_LOCK_TTL):
+                break
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInUse()
+            time.sleep(POLL_SECONDS)
+
+        try:
+            # The first request may have finished between the lookup and
+            # taking the lock.
+            stored = cache.get(response_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(
+                    response_key,
+                    {
+                        "fingerprint": fingerprint,
+                        "status": response.status_code,
+                        "data": response.data,
+                    },
+                    settings.IDEMPOTENCY_KEY_TTL,
+                )
+            return response
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    return view
@@ -0,0 +1,480 @@
+"""
+Streaming imports of NDJSON or CSV rows, validated by serializer rules.
+
+Rows are parsed one line at a time and saved in batches, so memory use does
+not depend on the size of the file. ``RowValidator`` applies the field rules
+of a serializer: plainly valid values take a fast path compiled from the
+fields, anything else goes through the field's own ``run_validation``, so
+accepted values and error messages are the serializer's. A fast path is
+only used once it agrees with ``run_validation`` on probe values made from
+the field's limits, so a change to the serializer can slow imports down
+but never change what they accept.
+"""
+
+import csv
+import io
+import json
+import re
+import time
+from decimal import Decimal
+from itertools import islice
+from operator import itemgetter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import (
+    MaxLengthValidator,
+    MaxValueValidator,
+    MinLengthValidator,
+    MinValueValidator,
+    ProhibitNullCharactersValidator,
+)
+from django.db import connections, models, router, transaction
+from django.db.models.constants import OnConflict
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField, empty, get_error_detail
+from rest_framework.settings import api_settings
+from rest_framework.validators import (
+    ProhibitSurrogateCharactersValidator,
+    UniqueValidator,
+)
+
+IMPORT_BATCH_SIZE = 5000
+# Rows whose errors are listed in a report; the rest are only counted.
+IMPORT_ERROR_LIMIT = 100
+
+# import type -> content type of its files
+IMPORT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class _Reader(io.RawIOBase):
+    """Raw binary stream over an object that only has ``read``, e.g. a request"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _text(stream, newline=None):
+    """
+    Text of the binary ``stream``; bytes that are not UTF-8 become lone
+    surrogates, which the validators of text fields reject
+    """
+    if not hasattr(stream, "readinto"):
+        stream = io.BufferedReader(_Reader(stream))
+    return io.TextIOWrapper(
+        stream, encoding="utf-8-sig", errors="surrogateescape", newline=newline
+    )
+
+
+def ndjson_rows(stream):
+    """(line number, object) of every non-blank line; None if it is not JSON"""
+    for number, line in enumerate(_text(stream), 1):
+        if not line or line.isspace():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def csv_rows(stream):
+    """(line number, row) of every record after the header"""
+    reader = csv.reader(_text(stream, newline=""))
+    header = next(reader, None)
+    for values in reader:
+        if values:
+            yield reader.line_num, dict(zip(header, values))
+
+
+IMPORT_READERS = {"ndjson": ndjson_rows, "csv": csv_rows}
+
+
+_SLOW = object()
+_SURROGATES = re.compile("[\ud800-\udfff]")
+_TEXT_VALIDATORS = (
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+)
+
+
+def _bounds(validators, lower_type, upper_type, ignored=()):
+    """
+    Tightest (lower, upper) limits of ``validators``, or None if one of them
+    has no fast check
+    """
+    lower = upper = None
+    for validator in validators:
+        if isinstance(validator, ignored):
+            continue
+        if type(validator) not in (lower_type, upper_type) or callable(
+            validator.limit_value
+        ):
+            return None
+        limit = validator.limit_value
+        if type(validator) is lower_type:
+            lower = limit if lower is None else max(lower, limit)
+        else:
+            upper = limit if upper is None else min(upper, limit)
+    return lower, upper
+
+
+def _fast_char(field):
+    bounds = _bounds(
+        field.validators, MinLengthValidator, MaxLengthValidator, _TEXT_VALIDATORS
+    )
+    if bounds is None:
+        return None
+    lower, upper = bounds
+    trim = field.trim_whitespace
+
+    def validate(value):
+        if type(value) is not str:
+            return _SLOW
+        if trim:
+            value = value.strip()
+        if (
+            not value
+            or "\x00" in value
+            or (not value.isascii() and _SURROGATES.search(value))
+            or (lower is not None and len(value) < lower)
+            or (upper is not None and len(value) > upper)
+        ):
+            return _SLOW
+        return value
+
+    lengths = {1, 2, *_around(lower), *_around(upper)}
+    validate.probes = [
+        *("x" * length for length in lengths if length >= 0),
+        *(" a ", "", " ", "a\x00", "\ud800", "é", 1, None),
+    ]
+    return validate
+
+
+def _fast_integer(field):
+    bounds = _bounds(field.validators, MinValueValidator, MaxValueValidator)
+    if bounds is None:
+        return None
+    lower, upper = bounds
+
+    def validate(value):
+        if type(value) is str and value.isascii() and value.isdigit():
+            value = int(value)
+        elif type(value) is not int:
+            return _SLOW
+        if (lower is not None and value < lower) or (
+            upper is not None and value > upper
+        ):
+            return _SLOW
+        return value
+
+    limits = {0, 5, 2**31, *_around(lower), *_around(upper)}
+    validate.probes = [
+        *limits,
+        *map(str, limits),
+        *("-1", "05", " 5", "5.0", "", True, 1.0, None),
+    ]
+    return validate
+
+
+def _fast_decimal(field):
+    bounds = _bounds(field.validators, MinValueValidator, MaxValueValidator)
+    if bounds is None or field.max_digits is None or field.decimal_places is None:
+        return None
+    whole_digits = field.max_digits - field.decimal_places
+    if whole_digits < 1:
+        return None
+    lower, upper = bounds
+    # Unsigned numbers whose digits fit, so quantizing is exact.
+    pattern = re.compile(
+        rf"\d{{1,{whole_digits}}}(\.\d{{1,{field.decimal_places}}})?"
+        if field.decimal_places
+        else rf"\d{{1,{whole_digits}}}"
+    )
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+
+    def validate(value):
+        if type(value) is int:
+            value = str(value)
+        if type(value) is not str or not pattern.fullmatch(value):
+            return _SLOW
+        value = Decimal(value).quantize(exponent)
+        if (lower is not None and value < lower) or (
+            upper is not None and value > upper
+        ):
+            return _SLOW
+        return value
+
+    places = field.decimal_places
+    validate.probes = [
+        *(str(limit) for limit in (*_around(lower), *_around(upper))),
+        "9" * whole_digits,
+        "9" * (whole_digits + 1),
+        "1." + "5" * places,
+        "1." + "5" * (places + 1),
+        *("0", "1", "01.50", "-1", "1e2", " 1", "", 3, 1.5, None),
+    ]
+    return validate
+
+
+def _fast_choice(field):
+    choices = field.choice_strings_to_values
+
+    def validate(value):
+        if type(value) is not str:
+            return _SLOW
+        return choices.get(value, _SLOW)
+
+    validate.probes = [*choices, *map(str, choices.values()), "", "?", 1, None]
+    return validate
+
+
+_FAST_PATHS = {
+    serializers.CharField: _fast_char,
+    serializers.IntegerField: _fast_integer,
+    serializers.DecimalField: _fast_decimal,
+    serializers.ChoiceField: _fast_choice,
+}
+
+
+def _around(limit):
+    return () if limit is None else (limit - 1, limit, limit + 1)
+
+
+def _agrees(field, validate):
+    """Whether every probe ``validate`` accepts is validated the same by ``field``"""
+    for probe in validate.probes:
+        fast = validate(probe)
+        if fast is _SLOW:
+            continue
+        try:
+            slow = field.run_validation(probe)
+        except (SkipField, ValidationError, DjangoValidationError):
+            return False
+        if type(slow) is not type(fast) or slow != fast:
+            return False
+    return True
+
+
+def _fast_path(field):
+    """Fast validation of ``field``, or None where it has none or would differ"""
+    factory = _FAST_PATHS.get(type(field))
+    validate = factory and factory(field)
+    if validate is None or not _agrees(field, validate):
+        return None
+    return validate
+
+
+class RowValidator:
+    """
+    Validate import rows by the writable fields of ``serializer_class``.
+
+    Uniqueness validators are left out, as imports upsert on their natural
+    key instead of querying once per row; the ``required`` fields must be
+    present and not null.
+    """
+
+    def __init__(self, serializer_class, required=()):
+        self.fields = []
+        for name, field in serializer_class().fields.items():
+            if field.read_only:
+                continue
+            field.validators = [
+                validator
+                for validator in field.validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+            if name in required:
+                field.required = True
+                field.allow_null = False
+            self.fields.append((name, field, _fast_path(field)))
+
+    def validate(self, row):
+        """Validated data of ``row``; ValidationError lists errors per field"""
+        if not isinstance(row, dict):
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Expected a JSON object."]}
+            )
+        data = {}
+        errors = {}
+        for name, field, fast_path in self.fields:
+            value = row.get(name, empty)
+            if fast_path is not None:
+                validated = fast_path(value)
+                if validated is not _SLOW:
+                    data[name] = validated
+                    continue
+            try:
+                data[name] = field.run_validation(value)
+            except SkipField:
+                pass
+            except ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+
+class ImportReport:
+    __slots__ = ("rows", "imported", "failed", "errors", "started")
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def add_error(self, line, detail):
+        self.failed += 1
+        if len(self.errors) < IMPORT_ERROR_LIMIT:
+            self.errors.append({"line": line, "errors": detail})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def import_rows(
+    rows, validator, save_batch, batch_size=IMPORT_BATCH_SIZE, on_progress=None
+):
+    """
+    Validate the ``(line number, row)`` pairs of ``rows`` and hand the valid
+    ones to ``save_batch`` ``batch_size`` at a time, each batch in its own
+    transaction; ``on_progress`` is called with the report after every batch
+    """
+    report = ImportReport()
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch_size)):
+        batch = []
+        for line, row in chunk:
+            try:
+                batch.append(validator.validate(row))
+            except ValidationError as exc:
+                report.add_error(line, exc.detail)
+        if batch:
+            with transaction.atomic():
+                save_batch(batch)
+        report.rows += len(chunk)
+        report.imported += len(batch)
+        if on_progress is not None:
+            on_progress(report)
+    return report
+
+
+# Fields whose validated values are bound to queries as they are
+_PLAIN_FIELDS = (
+    models.BooleanField,
+    models.CharField,
+    models.IntegerField,
+    models.TextField,
+)
+
+
+def _prepare_once(prepare, connection):
+    """``prepare`` of every distinct value called only once"""
+    prepared = {}
+
+    def prepare_value(value):
+        try:
+            return prepared[value]
+        except KeyError:
+            prepared[value] = result = prepare(value, connection)
+            return result
+        except TypeError:  # unhashable
+            return prepare(value, connection)
+
+    return prepare_value
+
+
+def insert_rows(model, fields, rows, on_conflict, using=None, params_of=list):
+    """
+    Insert ``rows`` of ``model``, values of ``fields``, with the
+    ``on_conflict`` clause appended, in as few statements as the backend's
+    parameter limit allows. ``params_of`` turns a row into its database
+    values, and is called one batch at a time.
+    """
+    if not rows:
+        return
+    connection = connections[using or router.db_for_write(model)]
+    ops = connection.ops
+    columns = ", ".join(ops.quote_name(field.column) for field in fields)
+    insert = (
+        f"{ops.insert_statement()} {ops.quote_name(model._meta.db_table)} ({columns})"
+    )
+    batch_size = ops.bulk_batch_size(fields, rows)
+    placeholders = ["%s"] * len(fields)
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            params = []
+            for row in batch:
+                params += params_of(row)
+            values_sql = ops.bulk_insert_sql(fields, [placeholders] * len(batch))
+            cursor.execute(f"{insert} {values_sql} {on_conflict}", params)
+
+
+def upsert(model, rows, unique_fields, update_fields, using=None):
+    """
+    Insert ``rows`` of ``model`` field values, or update the
+    ``update_fields`` of stored rows whose ``unique_fields`` match, like
+    ``bulk_create(update_conflicts=True)``.
+
+    The statement is put together from the backend's SQL for that
+    ``bulk_create`` and only the values are prepared per row, as building a
+    model instance and compiling every value costs several times what the
+    database takes to write the row. Values repeat a lot in imports (prices,
+    covers), so each distinct one is prepared once. Every row must have the
+    same fields; ``pre_save`` (e.g. ``auto_now``) is not applied.
+    """
+    if not rows:
+        return
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    opts = model._meta
+    names = list(rows[0])
+    fields = [opts.get_field(name) for name in names]
+    prepared = [
+        (index, _prepare_once(field.get_db_prep_save, connection))
+        for index, field in enumerate(fields)
+        if not isinstance(field, _PLAIN_FIELDS)
+    ]
+    values_of = itemgetter(*names)
+    if len(names) == 1:
+        values_of = lambda row, getter=values_of: (getter(row),)  # noqa: E731
+
+    def params_of(row):
+        values = list(values_of(row))
+        for index, prepare in prepared:
+            if values[index] is not None:
+                values[index] = prepare(values[index])
+        return values
+
+    on_conflict = connection.ops.on_conflict_suffix_sql(
+        fields,
+        OnConflict.UPDATE,
+        [opts.get_field(name).column for name in update_fields],
+        [opts.get_field(name).column for name in unique_fields],
+    )
+    insert_rows(model, fields, rows, on_conflict, using=using, params_of=params_of)
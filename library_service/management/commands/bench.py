@@ -0,0 +1,325 @@
+import json
+import os
+import platform
+import queue
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service.benchmarking import (
+    find_regressions,
+    format_summary,
+    isolated_database,
+    summarize,
+)
+from library_service.querycount import track_queries
+
+PASSWORD = "Bench1234!"
+SCENARIOS = (
+    "book-list",
+    "borrowing-list",
+    "borrowing-create",
+    "borrowing-return",
+    "token-obtain",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed books, users and borrowings, drive the API from many threads "
+        "through the test client and report throughput, latency percentiles "
+        "and queries per request per scenario; compare them with a saved "
+        "JSON baseline and fail on regressions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--borrowings", type=int, default=50_000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per scenario"
+        )
+        parser.add_argument(
+            "--token-requests",
+            type=int,
+            default=40,
+            help="Requests of token-obtain, which hashes a password each",
+        )
+        parser.add_argument(
+            "--scenario", choices=SCENARIOS, action="append", dest="scenarios"
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "bench-baseline.json"),
+        )
+        parser.add_argument(
+            "--save", action="store_true", help="Save the results as the baseline"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed relative worsening of timings before it is flagged",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 * options["requests"]:
+            raise CommandError(
+                "--users must be at least twice --requests: borrowing-create "
+                "and borrowing-return each need a user per request."
+            )
+        self.options = options
+        self.rng = random.Random(0)
+        results = {}
+
+        with isolated_database():
+            started = time.perf_counter()
+            self.seed()
+            self.stdout.write(
+                f"seeded {options['books']} books, {options['users']} users and "
+                f"{options['borrowings']} borrowings "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+            for scenario in options["scenarios"] or SCENARIOS:
+                jobs = getattr(self, f"prepare_{scenario.replace('-', '_')}")()
+                results[scenario] = self.run(jobs)
+                self.report(scenario, results[scenario])
+
+        self.compare(results)
+
+    def seed(self, batch_size=10_000):
+        options = self.options
+        today = now().date()
+        self.books = Book.objects.bulk_create(
+            (
+                Book(
+                    title=f"bench {i}",
+                    author=f"author {i % 500}",
+                    cover="hard",
+                    inventory=options["requests"] + 10,
+                    daily_fee=1,
+                )
+                for i in range(options["books"])
+            ),
+            batch_size=batch_size,
+        )
+        # Every user shares one real hash, so logins cost what they do in
+        # production without hashing once per seeded user.
+        password = make_password(PASSWORD)
+        self.users = get_user_model().objects.bulk_create(
+            (
+                get_user_model()(email=f"reader-{i}@bench.local", password=password)
+                for i in range(options["users"])
+            ),
+            batch_size=batch_size,
+        )
+        Borrowing.objects.bulk_create(
+            (
+                Borrowing(
+                    book=self.rng.choice(self.books),
+                    user=self.users[i % len(self.users)],
+                    expected_return_date=today + timedelta(days=i % 30),
+                    actual_return_date=today,
+                    is_active=False,
+                )
+                for i in range(options["borrowings"])
+            ),
+            batch_size=batch_size,
+        )
+        self.staff = get_user_model().objects.create(
+            email="desk@bench.local", is_staff=True
+        )
+        # The first --requests users create borrowings, the next ones
+        # return theirs.
+        requests = options["requests"]
+        self.creating_users = self.users[:requests]
+        self.returning_users = self.users[requests : 2 * requests]
+
+    # Jobs are (method, url, data, user, expected status) tuples.
+
+    def prepare_book_list(self):
+        url = reverse("book:book-list")
+        # Fill the catalog cache first, so that only the first of the
+        # concurrent requests does not count its misses.
+        APIClient().get(url, {"page_size": 20})
+        return [
+            ("get", url, {"page_size": 20}, None, 200)
+            for _ in range(self.options["requests"])
+        ]
+
+    def prepare_borrowing_list(self):
+        url = reverse("borrowing:borrowing-list")
+        readers = [self.staff, *self.users[2 * self.options["requests"] :]]
+        return [
+            ("get", url, {}, self.rng.choice(readers), 200)
+            for _ in range(self.options["requests"])
+        ]
+
+    def prepare_borrowing_create(self):
+        url = reverse("borrowing:borrowing-list")
+        expected_return_date = (now().date() + timedelta(days=14)).isoformat()
+        return [
+            (
+                "post",
+                url,
+                {
+                    "book": self.rng.choice(self.books).id,
+                    "expected_return_date": expected_return_date,
+                },
+                user,
+                201,
+            )
+            for user in self.creating_users
+        ]
+
+    def prepare_borrowing_return(self):
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                book=self.rng.choice(self.books),
+                user=user,
+                expected_return_date=now().date() + timedelta(days=7),
+                is_active=True,
+            )
+            for user in self.returning_users
+        )
+        return [
+            (
+                "post",
+                reverse("borrowing:borrowing-return-borrowing", args=[borrowing.id]),
+                {},
+                borrowing.user,
+                200,
+            )
+            for borrowing in borrowings
+        ]
+
+    def prepare_token_obtain(self):
+        url = reverse("user:token_get")
+        return [
+            ("post", url, {"email": user.email, "password": PASSWORD}, None, 200)
+            for user in self.rng.sample(self.users, self.options["token_requests"])
+        ]
+
+    def run(self, jobs):
+        pending = queue.SimpleQueue()
+        for job in jobs:
+            pending.put(job)
+        samples = []
+        queries = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            client = APIClient()
+            try:
+                while True:
+                    try:
+                        method, url, data, user, expected = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    client.force_authenticate(user)
+                    with track_queries() as tracked:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(url, data)
+                        elapsed = time.perf_counter() - started
+                    with lock:
+                        samples.append(elapsed)
+                        queries.append(tracked.count)
+                        if response.status_code != expected:
+                            errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(self.options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        summary = summarize(samples)
+        return {
+            "requests": len(samples),
+            "errors": len(errors),
+            "throughput": round(len(samples) / elapsed, 1),
+            "p50_ms": round(summary["p50_ms"], 2),
+            "p95_ms": round(summary["p95_ms"], 2),
+            "p99_ms": round(summary["p99_ms"], 2),
+            "queries_per_request": round(sum(queries) / len(queries), 2),
+            "summary": summary,
+        }
+
+    def report(self, scenario, result):
+        self.stdout.write(
+            format_summary(scenario, result.pop("summary"))
+            + f" {result['throughput']:.1f} req/s,"
+            f" {result['queries_per_request']:.2f} queries/request,"
+            f" {result['errors']} errors"
+        )
+
+    def compare(self, results):
+        path = self.options["baseline"]
+        run = {
+            "environment": {
+                "python": platform.python_version(),
+                "database": connection.vendor,
+                "cpus": os.cpu_count(),
+            },
+            "options": {
+                name: self.options[name]
+                for name in ("books", "users", "borrowings", "threads", "requests")
+            },
+            "results": results,
+        }
+
+        if self.options["save"]:
+            with open(path, "w") as file:
+                json.dump(run, file, indent=2)
+            self.stdout.write(f"saved baseline to {path}")
+            return
+        if not os.path.exists(path):
+            self.stdout.write(f"no baseline at {path}; save one with --save")
+            return
+
+        with open(path) as file:
+            baseline = json.load(file)
+        for section in ("environment", "options"):
+            if baseline.get(section) != run[section]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"baseline {section} differ: {baseline.get(section)} "
+                        f"!= {run[section]}"
+                    )
+                )
+        regressions = find_regressions(
+            results, baseline["results"], self.options["tolerance"]
+        )
+        for scenario, metric, previous, current in regressions:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"REGRESSION {scenario} {metric}: {previous} -> {current}"
+                )
+            )
+        errors = [name for name, result in results.items() if result["errors"]]
+        if regressions or errors:
+            raise CommandError(
+                f"{len(regressions)} regressions against {path}"
+                + (f"; errors in {', '.join(errors)}" if errors else "")
+            )
+        self.stdout.write(self.style.SUCCESS(f"no regressions against {path}"))
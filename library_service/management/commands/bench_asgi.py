@@ -0,0 +1,147 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service.asyncviews import AsyncReadASGIHandler
+from library_service.benchmarking import format_summary, isolated_database, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of book and borrowing reads served by the "
+        "WSGI handler from threads with the ASGI handler's async views, "
+        "at increasing numbers of concurrent clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument("--borrowings", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # The debug toolbar middleware is sync-only and would put every
+        # ASGI request through a thread; it is not deployed either.
+        middleware = [m for m in settings.MIDDLEWARE if "debug_toolbar" not in m]
+        with isolated_database(), override_settings(MIDDLEWARE=middleware):
+            staff = self.seed(options["borrowings"])
+            headers = {"authorization": f"Bearer {AccessToken.for_user(staff)}"}
+            urls = [
+                reverse("borrowing:borrowing-list"),
+                reverse("borrowing:borrowing-detail", args=[1]),
+                reverse("book:book-detail", args=[1]),
+            ]
+            # Connections are opened per request by both handlers.
+            connection.close()
+
+            for concurrency in options["concurrency"]:
+                for label, run in (
+                    ("wsgi", self.run_wsgi),
+                    ("asgi, sync views", partial(self.run_asgi, ASGIHandler())),
+                    (
+                        "asgi, async views",
+                        partial(self.run_asgi, AsyncReadASGIHandler()),
+                    ),
+                ):
+                    started = time.perf_counter()
+                    samples = run(urls, headers, options["requests"], concurrency)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        format_summary(f"{label} x{concurrency}", summarize(samples))
+                        + f" ({len(samples) / elapsed:.0f} req/s)"
+                    )
+
+    @staticmethod
+    def run_wsgi(urls, headers, count, concurrency):
+        handler = WSGIHandler()
+        environs = [RequestFactory().get(url, headers=headers).environ for url in urls]
+
+        def start_response(status, response_headers, exc_info=None):
+            assert status.startswith("200"), status
+
+        def request(i):
+            started = time.perf_counter()
+            response = handler(dict(environs[i % len(environs)]), start_response)
+            b"".join(response)
+            response.close()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            return list(executor.map(request, range(count)))
+
+    @staticmethod
+    def run_asgi(handler, urls, headers, count, concurrency):
+        scopes = [AsyncRequestFactory().get(url, headers=headers).scope for url in urls]
+
+        async def request(i):
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    # No disconnect: the client waits for the response.
+                    await asyncio.Future()
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    assert message["status"] == 200, message["status"]
+
+            started = time.perf_counter()
+            await handler(dict(scopes[i % len(scopes)]), receive, send)
+            return time.perf_counter() - started
+
+        async def client(worker, samples):
+            for i in range(worker, count, concurrency):
+                samples.append(await request(i))
+
+        async def main():
+            samples = []
+            await asyncio.gather(*(client(w, samples) for w in range(concurrency)))
+            return samples
+
+        return asyncio.run(main())
+
+    @staticmethod
+    def seed(count):
+        staff = get_user_model().objects.create(email="desk@bench.local", is_staff=True)
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"asgi-{i}",
+                author="bench",
+                cover="hard",
+                inventory=10,
+                daily_fee=1,
+            )
+            for i in range(100)
+        )
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"asgi-{i}@bench.local") for i in range(count // 5)
+        )
+        today = now().date()
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                book=books[i % len(books)],
+                user=users[i % len(users)],
+                expected_return_date=today + timedelta(days=i % 20),
+                actual_return_date=today if i >= len(users) else None,
+                is_active=i < len(users),
+            )
+            for i in range(count)
+        )
+        return staff
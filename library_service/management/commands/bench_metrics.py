@@ -0,0 +1,56 @@
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from library_service.metrics import MetricsMiddleware
+from library_service.querycount import count_query, track_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time MetricsMiddleware adds to a request, with the "
+        "registry flushing in the background, and to every query it tracks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200_000)
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        response = HttpResponse()
+        request = RequestFactory().get(reverse("borrowing:borrowing-list"))
+        request.resolver_match = resolve(request.path)
+        middleware = MetricsMiddleware(lambda request: response)
+
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(
+            METRICS_DIR=metrics_dir
+        ):
+            bare = self.measure(lambda: response, count)
+            instrumented = self.measure(lambda: middleware(request), count)
+        self.stdout.write(
+            f"MetricsMiddleware: +{(instrumented - bare) * 1e6:.2f}us per request"
+        )
+
+        context = {"connection": connection}
+
+        def query():
+            return count_query(lambda *args: None, "", None, False, context)
+
+        untracked = self.measure(query, count)
+        with track_queries():
+            tracked = self.measure(query, count)
+        self.stdout.write(
+            f"query tracking: +{(tracked - untracked) * 1e6:.2f}us per query"
+        )
+
+    @staticmethod
+    def measure(call, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            call()
+        return (time.perf_counter() - started) / count
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from rest_framework.request import Request
+from rest_framework.throttling import UserRateThrottle
+
+from library_service.throttling import TokenBucketThrottle, store
+
+SCOPE = "bench"
+
+
+class View:
+    throttle_scope = SCOPE
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time TokenBucketThrottle takes per request next to "
+        "DRF's UserRateThrottle, at a low and a high rate, and the "
+        "throughput of the shared buckets with several processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=20_000)
+        parser.add_argument("--rates", nargs="+", default=["10/min", "1000/min"])
+        parser.add_argument("--processes", type=int, default=4)
+
+    def handle(self, *args, **options):
+        count = options["checks"]
+        request = Request(RequestFactory().post("/"))
+        request.user = get_user_model()(pk=1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "throttle.sqlite3")
+            with override_settings(THROTTLE_DATABASE=path):
+                for rate in options["rates"]:
+                    with override_settings(THROTTLE_BUCKETS={SCOPE: {"user": rate}}):
+                        store.clear()
+                        bucket = self.measure(TokenBucketThrottle, request, count)
+                    local = self.measure(
+                        self.drf_throttle(rate, LocMemCache("bench", {})),
+                        request,
+                        count,
+                    )
+                    shared = self.measure(
+                        self.drf_throttle(
+                            rate, FileBasedCache(os.path.join(directory, rate), {})
+                        ),
+                        request,
+                        count // 10,
+                    )
+                    self.stdout.write(
+                        f"{rate}: token bucket {bucket * 1e6:.1f}us, "
+                        f"UserRateThrottle on locmem {local * 1e6:.1f}us, "
+                        f"on files {shared * 1e6:.1f}us per check"
+                    )
+
+                with override_settings(THROTTLE_BUCKETS={SCOPE: {"user": "1000000/s"}}):
+                    self.measure_processes(request, count, options["processes"])
+
+    @staticmethod
+    def drf_throttle(rate, cache):
+        class Throttle(UserRateThrottle):
+            THROTTLE_RATES = {"user": rate}
+
+        Throttle.cache = cache
+        return Throttle
+
+    @staticmethod
+    def measure(throttle_class, request, count):
+        view = View()
+        started = time.perf_counter()
+        for _ in range(count):
+            throttle_class().allow_request(request, view)
+        return (time.perf_counter() - started) / count
+
+    def measure_processes(self, request, count, processes):
+        # Every process takes tokens of the same bucket, the worst case for
+        # the store's write lock.
+        context = multiprocessing.get_context("fork")
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            pool.starmap(
+                self.measure, [(TokenBucketThrottle, request, count)] * processes
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"token bucket x{processes} processes: "
+            f"{count * processes / elapsed:.0f} checks/s in total"
+        )
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from library_service.routers import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the read replica, standing "
+        "in for replication in development"
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_READ_REPLICA:
+            raise CommandError("No read replica is configured")
+        copy_sqlite_database()
+        self.stdout.write(f"Copied primary onto {settings.DATABASE_READ_REPLICA!r}")
@@ -0,0 +1,344 @@
+"""
+Request metrics in the Prometheus text format.
+
+Every process aggregates its histograms in memory, and a background
+thread writes them to the process's own file in ``settings.METRICS_DIR``
+every ``METRICS_FLUSH_SECONDS`` if they changed, and when it exits, so
+requests never wait for a file write. ``/metrics`` sums the files of all
+processes, so any worker can answer a scrape. On POSIX systems the files of
+processes that are gone are added to a single archive file and removed,
+which keeps the totals of exited workers while a scrape reads one file per
+live worker; elsewhere the files are kept. Processes are told apart by pid,
+so the directory must not be shared between hosts.
+
+Scrapes are only answered for ``METRICS_ALLOWED_IPS`` or with the bearer
+token ``METRICS_TOKEN``.
+"""
+
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from library_service.querycount import track_queries
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+ARCHIVE_FILE = "archive.json"
+ARCHIVE_LOCK_FILE = "archive.lock"
+
+
+class Histogram:
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry.histograms[name] = self
+
+    def observe(self, value, *labelvalues):
+        self.registry.observe(self, labelvalues, value)
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+
+class Registry:
+    """Histograms of this process, shared with the others through files"""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # (name, label values) -> [count per bucket..., count above, sum]
+        self._series = {}
+        self._changed = False
+        self._file = f"{os.getpid()}-{uuid.uuid4().hex}.json"
+        # Threads do not survive a fork; the child starts its own.
+        self._flusher = None
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    def observe(self, histogram, labelvalues, value):
+        key = (histogram.name, labelvalues)
+        index = bisect_left(histogram.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(histogram.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+            self._changed = True
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name="metrics-flush", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            if self._changed:
+                self.flush()
+
+    def flush(self):
+        """Write this process's series to its file in ``METRICS_DIR``"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._changed = False
+                entries = [
+                    [name, list(labels), list(series)]
+                    for (name, labels), series in self._series.items()
+                ]
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=settings.METRICS_DIR, suffix=".tmp", delete=False
+            ) as file:
+                json.dump(entries, file)
+            os.replace(file.name, os.path.join(settings.METRICS_DIR, self._file))
+        finally:
+            self._flush_lock.release()
+
+    def _flush_at_exit(self):
+        if self._series:
+            self.flush()
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _is_gone(filename):
+        pid, _, rest = filename.partition("-")
+        if not pid.isdigit() or not rest:
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def archive(self):
+        """Add the files of processes that are gone to the archive file"""
+        # Without fcntl there is no file lock, nor a safe os.kill probe.
+        if fcntl is None:
+            return
+        directory = settings.METRICS_DIR
+        gone = [
+            filename
+            for filename in os.listdir(directory)
+            if filename.endswith(".json") and self._is_gone(filename)
+        ]
+        if not gone:
+            return
+        with open(os.path.join(directory, ARCHIVE_LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = os.path.join(directory, ARCHIVE_FILE)
+            archive = self._read(path) or {"merged": [], "entries": []}
+            # A file is added once, even if its removal failed before.
+            merged = set(archive["merged"]) & set(os.listdir(directory))
+            totals = {
+                (name, tuple(labels)): series
+                for name, labels, series in archive["entries"]
+            }
+            for filename in gone:
+                entries = self._read(os.path.join(directory, filename))
+                if filename in merged or entries is None:
+                    continue
+                for name, labels, series in entries:
+                    _add(totals.setdefault((name, tuple(labels)), []), series)
+                merged.add(filename)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=directory, suffix=".tmp", delete=False
+            ) as file:
+                json.dump(
+                    {
+                        "merged": sorted(merged),
+                        "entries": [
+                            [name, list(labels), series]
+                            for (name, labels), series in totals.items()
+                        ],
+                    },
+                    file,
+                )
+            os.replace(file.name, path)
+            for filename in gone:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass
+
+    def collect(self):
+        """Series of all processes, summed per histogram and label values"""
+        self.flush()
+        self.archive()
+        totals = {}
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith(".json"):
+                continue
+            entries = self._read(os.path.join(settings.METRICS_DIR, filename))
+            if entries is None:
+                continue
+            if filename == ARCHIVE_FILE:
+                entries = entries["entries"]
+            for name, labels, series in entries:
+                if name not in self.histograms:
+                    continue
+                _add(totals.setdefault((name, tuple(labels)), []), series)
+        return totals
+
+    def render(self):
+        lines = []
+        totals = self.collect()
+        for name, histogram in self.histograms.items():
+            lines.append(f"# HELP {name} {histogram.documentation}")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labelvalues), series in sorted(totals.items()):
+                if series_name != name:
+                    continue
+                labels = [
+                    f'{label}="{_escape(value)}"'
+                    for label, value in zip(histogram.labelnames, labelvalues)
+                ]
+                cumulative = 0
+                for bound, count in zip(
+                    (*histogram.buckets, "+Inf"), series[:-1], strict=True
+                ):
+                    cumulative += count
+                    bucket_labels = ",".join([*labels, f'le="{bound}"'])
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+                joined = ",".join(labels)
+                lines.append(f"{name}_sum{{{joined}}} {series[-1]}")
+                lines.append(f"{name}_count{{{joined}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _add(total, series):
+    if not total:
+        total.extend([0] * len(series))
+    for i, value in enumerate(series):
+        total[i] += value
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+registry = Registry()
+# Counts since the last flush would be lost with the process.
+atexit.register(registry._flush_at_exit)
+
+REQUEST_SECONDS = registry.histogram(
+    "library_http_request_duration_seconds",
+    "Time to respond, per view and method",
+    ["view", "method"],
+)
+REQUEST_QUERIES = registry.histogram(
+    "library_http_request_queries",
+    "Database queries per request, per view and method",
+    ["view", "method"],
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_QUERY_SECONDS = registry.histogram(
+    "library_http_request_query_duration_seconds",
+    "Time spent in database queries per request, per view and method",
+    ["view", "method"],
+)
+TELEGRAM_SECONDS = registry.histogram(
+    "library_telegram_send_duration_seconds",
+    "Time to send a Telegram message or digest",
+    ["call"],
+)
+
+
+def _view_name(request):
+    match = request.resolver_match
+    return match.view_name if match is not None else "<unresolved>"
+
+
+class MetricsMiddleware:
+    """Record the latency and the queries of every request per view"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with track_queries() as queries:
+            response = self.get_response(request)
+        self.record(request, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with track_queries() as queries:
+            response = await self.get_response(request)
+        self.record(request, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def record(request, duration, queries):
+        labels = (_view_name(request), request.method)
+        REQUEST_SECONDS.observe(duration, *labels)
+        REQUEST_QUERIES.observe(queries.count, *labels)
+        REQUEST_QUERY_SECONDS.observe(queries.duration, *labels)
+
+
+def scrape_allowed(request):
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    )
+
+
+def metrics_view(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,175 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on a unique, indexed ordering key.
+
+    The cursor is the opaque encoding of the last row's key, and the next
+    page is fetched with ``WHERE key > cursor ORDER BY key LIMIT n``, so
+    every page costs the same as the first one. ``ordering`` must end with
+    a unique field, usually ``id``.
+    """
+
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, position):
+        payload = json.dumps(
+            [
+                value.isoformat() if isinstance(value, datetime.date) else value
+                for value in position
+            ],
+            default=str,
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def ordering_field(queryset, name):
+        """Model field or annotation output field an ordering key sorts by"""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        opts = queryset.model._meta
+        *path, last = name.split("__")
+        for part in path:
+            opts = opts.get_field(part).related_model._meta
+        return opts.pk if last == "pk" else opts.get_field(last)
+
+    def to_python(self, queryset, position):
+        """
+        Cursor ``position`` converted by the fields of the ordering; a
+        tampered cursor, with values of the wrong type, is invalid
+        """
+        values = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (dict, list)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values.append(
+                    self.ordering_field(queryset, field.lstrip("-")).to_python(value)
+                )
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def after(self, position):
+        """Condition selecting the rows that sort after ``position``"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def key_value(row, field):
+        name = field.lstrip("-")
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def seek(self, queryset, request, view=None):
+        """
+        Order, filter and slice ``queryset`` for the requested page without
+        evaluating it; the caller passes the rows on to ``set_page``.
+        """
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(self.to_python(queryset, position)))
+        # One extra row tells whether there is a next page.
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, rows):
+        rows = list(rows)
+        page = rows[: self.page_size]
+        self.next_position = None
+        if len(rows) > self.page_size:
+            self.next_position = [
+                self.key_value(page[-1], field) for field in self.ordering
+            ]
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(self.seek(queryset, request, view))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of results per page, at most {self.max_page_size}.",
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -0,0 +1,91 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+class Projection:
+    """
+    Read-only fast path that turns ``values()`` rows into response dicts.
+
+    The output fields and their formatting are taken from
+    ``serializer_class`` so the result is identical to the serializer's,
+    without instantiating model objects or running field machinery for
+    values that are already in their final form. ``lookups`` maps output
+    fields that live on related models to their ORM lookups.
+    """
+
+    serializer_class = None
+    lookups = {}
+
+    # Fields whose database value differs from the serialized one.
+    formatted_fields = (
+        serializers.DateField,
+        serializers.DateTimeField,
+        serializers.DecimalField,
+    )
+
+    def __init__(self):
+        # Columns depend only on the class, so they are built once per class.
+        cls = type(self)
+        if "_columns" not in cls.__dict__:
+            cls._columns = cls.build_columns()
+        self.columns = cls._columns
+
+    @classmethod
+    def build_columns(cls):
+        columns = []
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            formatter = None
+            if isinstance(field, cls.formatted_fields):
+                formatter = field.to_representation
+            columns.append((name, cls.lookups.get(name, name), formatter))
+        return columns
+
+    def values(self, queryset):
+        # Annotations are kept for ordering and pagination; they are not
+        # part of the representation.
+        return queryset.values(
+            *(lookup for _, lookup, _ in self.columns), *queryset.query.annotations
+        )
+
+    def to_representation(self, row):
+        data = {}
+        for name, lookup, formatter in self.columns:
+            value = row[lookup]
+            if formatter is not None and value is not None:
+                value = formatter(value)
+            data[name] = value
+        return data
+
+    def represent(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class ProjectedListModelMixin:
+    """List action served through ``projection_class`` instead of a serializer"""
+
+    projection_class = None
+
+    def list(self, request, *args, **kwargs):
+        projection = self.projection_class()
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.represent(page))
+        return Response(projection.represent(queryset))
+
+    async def alist(self, request, *args, **kwargs):
+        """``list`` for async views, reading the page with the async ORM"""
+        projection = self.projection_class()
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+
+        paginator = self.paginator
+        if paginator is None:
+            return Response(
+                projection.represent([row async for row in queryset.aiterator()])
+            )
+        rows = paginator.seek(queryset, request, self)
+        page = paginator.set_page([row async for row in rows.aiterator()])
+        return self.get_paginated_response(projection.represent(page))
@@ -0,0 +1,67 @@
+"""
+Per-alias counters of the queries executed by this process.
+
+A wrapper is installed on every new database connection, so the counts
+cover the ORM, raw cursors and every thread alike. Inside ``track_queries``
+the wrapper also adds the number and duration of the queries to a
+``QueryStats``, e.g. those of one request; nested blocks also add to the
+blocks around them.
+"""
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_lock = threading.Lock()
+_counts = Counter()
+_tracked = ContextVar("tracked_queries", default=None)
+
+
+class QueryStats:
+    __slots__ = ("count", "duration", "outer")
+
+    def __init__(self, outer=None):
+        self.count = 0
+        self.duration = 0.0
+        self.outer = outer
+
+
+def count_query(execute, sql, params, many, context):
+    with _lock:
+        _counts[context["connection"].alias] += 1
+    stats = _tracked.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            stats = stats.outer
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def query_counts() -> dict[str, int]:
+    """Snapshot of the number of queries executed per database alias"""
+    with _lock:
+        return dict(_counts)
+
+
+@contextmanager
+def track_queries():
+    """Collect the queries of the block, including those of the async ORM"""
+    stats = QueryStats(_tracked.get())
+    token = _tracked.set(stats)
+    try:
+        yield stats
+    finally:
+        _tracked.reset(token)
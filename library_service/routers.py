@@ -0,0 +1,122 @@
+"""
+Routing of API reads to a read replica.
+
+Only reads inside ``replica_reads()`` go to ``DATABASE_READ_REPLICA``; the
+``ReplicaReadsMixin`` enters it for the list and retrieve actions of a
+viewset. Writes, reads in transactions and everything else stay on the
+primary. After a user writes through such a viewset, their reads are
+pinned to the primary for ``DATABASE_REPLICA_PIN_SECONDS`` so that they
+see their own changes despite replication lag. Without a replica the mixin
+does nothing, and costs no cache round-trip.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Send the reads of the block to the replica, or to the primary"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def primary_reads():
+    return replica_reads(enabled=False)
+
+
+def _pin_key(user_id):
+    return f"primary-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    cache.set(_pin_key(user.pk), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user) -> bool:
+    return user.is_authenticated and cache.get(_pin_key(user.pk), False)
+
+
+async def ais_pinned_to_primary(user) -> bool:
+    return user.is_authenticated and await cache.aget(_pin_key(user.pk), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = settings.DATABASE_READ_REPLICA
+        if (
+            replica
+            and _use_replica.get()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Never the database an instance was read from: that may be the
+        # replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica receives its schema from the primary.
+        return db != settings.DATABASE_READ_REPLICA
+
+
+class ReplicaReadsMixin:
+    """Serve ``replica_actions`` from the replica unless the user is pinned"""
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self._may_read_replica() and not is_pinned_to_primary(request.user):
+            self._replica_token = _use_replica.set(True)
+
+    async def ainitial(self, request, *args, **kwargs):
+        """``initial`` of async views, which must not block on the cache"""
+        super(ReplicaReadsMixin, self).initial(request, *args, **kwargs)
+        if self._may_read_replica() and not await ais_pinned_to_primary(request.user):
+            self._replica_token = _use_replica.set(True)
+
+    def _may_read_replica(self):
+        return (
+            bool(settings.DATABASE_READ_REPLICA) and self.action in self.replica_actions
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _use_replica.reset(token)
+            self._replica_token = None
+        if (
+            settings.DATABASE_READ_REPLICA
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def copy_sqlite_database(source=DEFAULT_DB_ALIAS, target=None):
+    """
+    Replication stand-in for SQLite: copy ``source`` onto ``target`` with
+    the online backup API.
+    """
+    target = target or settings.DATABASE_READ_REPLICA
+    for alias in (source, target):
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
+from decimal import Decimal
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -28,7 +30,7 @@ SECRET_KEY = os.getenv(
 )
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "True") == "True"
 
 ALLOWED_HOSTS = []
 
@@ -46,26 +48,51 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    "library_service",
     "book_service",
     "user",
     "borrowing",
     "telegram_bot",
     "drf_spectacular",
-    "debug_toolbar",
 ]
 
 MIDDLEWARE = [
+    "library_service.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "user.middleware.PasswordHashingBusyMiddleware",
 ]
 
+# The debug toolbar instruments every request; it is only for development.
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(2, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
+# Every process writes its request metrics to this directory from a thread,
+# every METRICS_FLUSH_SECONDS and on exit; /metrics sums them and, on POSIX,
+# archives the files of exited processes. Use a directory of its own on
+# every host.
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "library-service-metrics")
+)
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 1))
+# /metrics answers these client addresses (REMOTE_ADDR, i.e. the proxy when
+# behind one) and requests with "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_ALLOWED_IPS = [
+    ip.strip()
+    for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if ip.strip()
+]
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 ROOT_URLCONF = "library_service.urls"
+# The ASGI application serves book and borrowing reads as async views.
+ASGI_URLCONF = "library_service.urls_async"
 
 TEMPLATES = [
     {
@@ -92,6 +119,42 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock at BEGIN so that concurrent borrows wait on
+            # the busy timeout instead of failing to upgrade a read lock.
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+            "init_command": "PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL",
+        },
+    }
+}
+
+# List and retrieve reads of the book and borrowing APIs go to the replica
+# when DATABASE_REPLICA_NAME is set; see library_service/routers.py.
+
+DATABASE_REPLICA_NAME = os.getenv("DATABASE_REPLICA_NAME")
+if DATABASE_REPLICA_NAME:
+    DATABASES["replica"] = {**DATABASES["default"], "NAME": DATABASE_REPLICA_NAME}
+
+DATABASE_READ_REPLICA = "replica" if DATABASE_REPLICA_NAME else None
+# Seconds a user's reads stay on the primary after they write
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", 5))
+DATABASE_ROUTERS = ["library_service.routers.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The catalog version counter and Idempotency-Key responses must be shared
+# by all workers, so production deployments must point this at a shared
+# backend, e.g. CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+# with CACHE_LOCATION=library_service_cache (python manage.py
+# createcachetable) or Redis; check --deploy fails on a per-process cache.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "library-service"),
     }
 }
 
@@ -113,6 +176,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# Hashes run in a process pool of PASSWORD_HASHING_WORKERS processes (0
+# runs them inline); at most PASSWORD_HASHING_QUEUE more may wait before
+# requests are rejected with 503. Changing PASSWORD_HASH_ITERATIONS
+# rehashes each password on its next login.
+
+PASSWORD_HASHERS = [
+    "user.hashers.TunablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 870_000))
+PASSWORD_HASHING_WORKERS = int(
+    os.getenv("PASSWORD_HASHING_WORKERS", min(os.cpu_count() or 1, 2))
+)
+PASSWORD_HASHING_QUEUE = int(os.getenv("PASSWORD_HASHING_QUEUE", 8))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -136,13 +218,65 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "user.User"
 
+# Every overdue day is charged the book's daily fee times this multiplier,
+# on top of the regular daily fee.
+OVERDUE_FEE_MULTIPLIER = Decimal(os.getenv("OVERDUE_FEE_MULTIPLIER", "2"))
+
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.CachedJWTAuthentication",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "library_service.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
+# Authenticated users are cached per process for this many seconds, which
+# bounds how long other processes may see a user's previous state.
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 60))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10_000))
+
+# Successful borrowing creates and returns sent with an Idempotency-Key are
+# replayed to retries for this many seconds; a duplicate arriving while the
+# first is still running waits for its response up to the lock time. Both
+# need a cache shared by all workers.
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 10))
+# Seconds the lock of a running request is kept; it only expires if its
+# worker died, so it must be well above the request timeout.
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", 10 * 60))
+
+# Token buckets of the throttled endpoints, per scope: a bucket per "user",
+# per client "ip" and for the whole "endpoint", for each rate given. "N/min"
+# refills N tokens a minute (s, min, hour, day) up to N; "N/min burst B"
+# holds up to B. The buckets of all workers are kept in the SQLite file
+# THROTTLE_DATABASE.
+THROTTLE_BUCKETS = {
+    "borrowing_create": {"user": "10/min burst 20", "ip": "60/min burst 120"},
+    "token_obtain": {"ip": "10/min burst 20", "endpoint": "50/s burst 100"},
+    "registration": {"ip": "5/hour burst 10"},
+}
+THROTTLE_DATABASE = os.getenv(
+    "THROTTLE_DATABASE",
+    os.path.join(tempfile.gettempdir(), "library-service-throttle.sqlite3"),
+)
+# Throttling is left to the tests that check it.
+TEST_RUNNER = "library_service.testrunner.TestRunner"
+
+# A copy returned while users wait for its book is held for the first of
+# them for this many hours; release_expired_holds passes it on afterwards.
+WAITLIST_HOLD_HOURS = int(os.getenv("WAITLIST_HOLD_HOURS", 24))
+
+# The inventory stream of the ASGI application replays up to this many of
+# the latest events to a client reconnecting with Last-Event-ID, sends idle
+# clients a keepalive comment at this interval, and serves at most this many
+# streams per process, each holding a connection and its buffers.
+INVENTORY_STREAM_HISTORY = int(os.getenv("INVENTORY_STREAM_HISTORY", 1000))
+INVENTORY_STREAM_KEEPALIVE_SECONDS = float(
+    os.getenv("INVENTORY_STREAM_KEEPALIVE_SECONDS", 15)
+)
+INVENTORY_STREAM_MAX_CONNECTIONS = int(
+    os.getenv("INVENTORY_STREAM_MAX_CONNECTIONS", 10_000)
+)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
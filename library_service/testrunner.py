@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    The default runner with throttling off, as the buckets would outlive
+    the test databases; tests of throttling set ``THROTTLE_BUCKETS`` and
+    their own ``THROTTLE_DATABASE``
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._throttle_buckets = settings.THROTTLE_BUCKETS
+        settings.THROTTLE_BUCKETS = {}
+
+    def teardown_test_environment(self, **kwargs):
+        settings.THROTTLE_BUCKETS = self._throttle_buckets
+        super().teardown_test_environment(**kwargs)
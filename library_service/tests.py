@@ -0,0 +1,622 @@
+import copy
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service import checks, metrics, routers, throttling
+from library_service.benchmarking import find_regressions
+from library_service.querycount import query_counts, track_queries
+from library_service.routers import copy_sqlite_database
+from telegram_bot import telegram_helper
+from user.authentication import user_cache
+
+REPLICA = "replica"
+# The replica alias only exists for these tests; the runner creates its
+# test database, a separate SQLite file, like any other.
+connections.settings.setdefault(
+    REPLICA,
+    {
+        **copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS]),
+        "TEST": {
+            **connections.settings[DEFAULT_DB_ALIAS]["TEST"],
+            "NAME": os.path.join(
+                tempfile.gettempdir(), f"library-replica-{os.getpid()}.sqlite3"
+            ),
+        },
+    },
+)
+BOOK_URL = reverse("book:book-list")
+BORROWING_URL = reverse("borrowing:borrowing-list")
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "book",
+        "author": "author",
+        "inventory": 10,
+        "cover": "hard",
+        "daily_fee": 10.00,
+    }
+    defaults.update(params)
+    return Book.objects.create(**defaults)
+
+
+@override_settings(DATABASE_READ_REPLICA=REPLICA)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The replica is a second SQLite file that only changes when the test
+    copies the primary onto it, standing in for replication lag.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.test", password="Test1234!", is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email="user@test.test", password="Test1234!"
+        )
+        self.book = sample_book(title="Dune")
+        copy_sqlite_database(DEFAULT_DB_ALIAS, REPLICA)
+
+    def borrow(self, user):
+        return Borrowing.objects.create(
+            book=self.book,
+            user=user,
+            expected_return_date=now().date() + timedelta(days=7),
+        )
+
+    def test_list_reads_go_to_replica(self):
+        self.borrow(self.user)
+        copy_sqlite_database(DEFAULT_DB_ALIAS, REPLICA)
+        self.borrow(self.admin)
+        self.client.force_authenticate(self.admin)
+        before = query_counts().get(REPLICA, 0)
+
+        res = self.client.get(BORROWING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [borrowing["user"] for borrowing in res.data["results"]],
+            ["user@test.test"],
+        )
+        self.assertGreater(query_counts()[REPLICA], before)
+
+    def test_retrieve_reads_go_to_replica(self):
+        Book.objects.filter(pk=self.book.pk).update(title="Emma")
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.get(reverse("book:book-detail", args=[self.book.id]))
+
+        self.assertEqual(res.data["title"], "Dune")
+
+    def test_writes_go_to_primary_and_pin_reads_of_the_writer(self):
+        self.client.force_authenticate(self.user)
+        replica_before = query_counts().get(REPLICA, 0)
+
+        res = self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": now().date() + timedelta(days=7),
+            },
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(query_counts().get(REPLICA, 0), replica_before)
+
+        res = self.client.get(BORROWING_URL)
+        self.assertEqual(len(res.data["results"]), 1)
+
+        cache.clear()
+        res = self.client.get(BORROWING_URL)
+        self.assertEqual(len(res.data["results"]), 0)
+
+    def test_cached_catalog_is_built_from_primary(self):
+        sample_book(title="Emma")
+
+        res = self.client.get(BOOK_URL)
+
+        self.assertEqual(
+            [book["title"] for book in res.data["results"]], ["Dune", "Emma"]
+        )
+
+    @override_settings(DATABASE_READ_REPLICA=None)
+    def test_reads_stay_on_primary_without_replica(self):
+        self.borrow(self.user)
+        self.client.force_authenticate(self.admin)
+        before = query_counts().get(REPLICA, 0)
+
+        with mock.patch.object(
+            routers, "is_pinned_to_primary"
+        ) as is_pinned, mock.patch.object(routers, "pin_to_primary") as pin:
+            res = self.client.get(BORROWING_URL)
+            created = self.client.post(
+                BORROWING_URL,
+                {"book": self.book.id, "expected_return_date": now().date()},
+            )
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(query_counts().get(REPLICA, 0), before)
+        is_pinned.assert_not_called()
+        pin.assert_not_called()
+
+
+@override_settings(ROOT_URLCONF=settings.ASGI_URLCONF)
+class AsyncReadViewTests(TestCase):
+    """Reads served by the async views of the ASGI URLconf"""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@test.test", password="Test1234!", is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email="user@test.test", password="Test1234!"
+        )
+        self.book = sample_book(title="Dune")
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=now().date() + timedelta(days=7),
+        )
+        Borrowing.objects.create(
+            book=sample_book(title="Emma"),
+            user=self.admin,
+            expected_return_date=now().date() + timedelta(days=7),
+        )
+
+    @staticmethod
+    def auth(user):
+        return {"authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+    def sync_get(self, user, url, params):
+        with override_settings(ROOT_URLCONF="library_service.urls"):
+            client = APIClient()
+            client.force_authenticate(user)
+            return client.get(url, params)
+
+    def test_reads_resolve_to_async_views(self):
+        for url in (
+            BOOK_URL,
+            BORROWING_URL,
+            reverse("borrowing:borrowing-detail", args=[self.borrowing.id]),
+        ):
+            self.assertTrue(iscoroutinefunction(resolve(url).func))
+        self.assertFalse(
+            iscoroutinefunction(resolve(BORROWING_URL, "library_service.urls").func)
+        )
+
+    async def test_borrowing_list_matches_sync_view(self):
+        for user, params in (
+            (self.admin, {}),
+            (self.admin, {"user": str(self.user.id)}),
+            (self.user, {}),
+            (self.admin, {"is-active": "False"}),
+        ):
+            res = await self.async_client.get(
+                BORROWING_URL, params, headers=self.auth(user)
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            expected = await sync_to_async(self.sync_get)(user, BORROWING_URL, params)
+            self.assertEqual(res.json(), expected.json())
+
+    async def test_list_pages_follow_the_cursor(self):
+        res = await self.async_client.get(
+            BORROWING_URL, {"page_size": 1}, headers=self.auth(self.admin)
+        )
+        self.assertEqual(len(res.json()["results"]), 1)
+
+        res = await self.async_client.get(
+            res.json()["next"], headers=self.auth(self.admin)
+        )
+
+        self.assertEqual(len(res.json()["results"]), 1)
+        self.assertIsNone(res.json()["next"])
+
+    async def test_borrowing_retrieve_is_limited_to_own_borrowings(self):
+        url = reverse("borrowing:borrowing-detail", args=[self.borrowing.id])
+        other = await get_user_model().objects.acreate(email="other@test.test")
+
+        own = await self.async_client.get(url, headers=self.auth(self.user))
+        foreign = await self.async_client.get(url, headers=self.auth(other))
+
+        self.assertEqual(own.status_code, status.HTTP_200_OK)
+        self.assertEqual(own.json()["book"]["title"], "Dune")
+        self.assertEqual(own.json()["fee"], "10.00")
+        self.assertEqual(foreign.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_anonymous_borrowing_reads_are_rejected(self):
+        res = await self.async_client.get(BORROWING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_book_reads_keep_their_permissions_and_cache(self):
+        detail = reverse("book:book-detail", args=[self.book.id])
+
+        res = await self.async_client.get(detail, headers=self.auth(self.user))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        res = await self.async_client.get(detail, headers=self.auth(self.admin))
+        self.assertEqual(res.json()["title"], "Dune")
+
+        res = await self.async_client.get(BOOK_URL)
+        self.assertEqual(
+            [book["title"] for book in res.json()["results"]], ["Dune", "Emma"]
+        )
+        res = await self.async_client.get(
+            BOOK_URL, headers={"if-none-match": res["ETag"]}
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_writes_on_async_routes_still_work(self):
+        user = await get_user_model().objects.acreate(email="other@test.test")
+
+        res = await self.async_client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": str(now().date() + timedelta(days=7)),
+            },
+            content_type="application/json",
+            headers=self.auth(user),
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "library_service_cache",
+        }
+    }
+)
+class AsyncReadViewSharedCacheTests(AsyncReadViewTests):
+    """The async views with a database cache, whose sync calls would raise"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command("createcachetable", verbosity=0)
+
+    @override_settings(DATABASE_READ_REPLICA=DEFAULT_DB_ALIAS)
+    async def test_replica_reads_await_the_primary_pin(self):
+        await sync_to_async(routers.pin_to_primary)(self.user)
+
+        res = await self.async_client.get(BORROWING_URL, headers=self.auth(self.user))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(await routers.ais_pinned_to_primary(self.user))
+
+
+def metric_value(text, sample, **labels):
+    """Value of ``sample`` with exactly ``labels`` in Prometheus text, or 0"""
+    joined = ",".join(f'{label}="{value}"' for label, value in labels.items())
+    prefix = f"{sample}{{{joined}}} "
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix) :])
+    return 0
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        overrider = override_settings(METRICS_DIR=metrics_dir.name)
+        overrider.enable()
+        self.addCleanup(overrider.disable)
+        self.client = APIClient()
+
+    def scrape(self):
+        res = self.client.get("/metrics")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return res.content.decode()
+
+    def test_requests_are_recorded_per_view(self):
+        labels = {"view": "borrowing:borrowing-list", "method": "GET"}
+        before = self.scrape()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@test.test")
+        )
+
+        self.client.get(BORROWING_URL)
+        self.client.get(BORROWING_URL)
+        after = self.scrape()
+
+        for sample in (
+            "library_http_request_duration_seconds_count",
+            "library_http_request_queries_count",
+        ):
+            self.assertEqual(
+                metric_value(after, sample, **labels)
+                - metric_value(before, sample, **labels),
+                2,
+            )
+        self.assertGreater(
+            metric_value(after, "library_http_request_queries_sum", **labels),
+            metric_value(before, "library_http_request_queries_sum", **labels),
+        )
+        self.assertGreater(
+            metric_value(
+                after,
+                "library_http_request_duration_seconds_bucket",
+                **labels,
+                le="+Inf",
+            ),
+            0,
+        )
+
+    def test_histograms_of_all_processes_are_summed(self):
+        workers = [metrics.Registry(), metrics.Registry()]
+        for latency, worker in zip((0.003, 0.2), workers):
+            histogram = worker.histogram("test_seconds", "Test", ["view"])
+            histogram.observe(latency, "books")
+            worker.flush()
+
+        text = workers[0].render()
+
+        self.assertEqual(metric_value(text, "test_seconds_count", view="books"), 2)
+        self.assertEqual(
+            metric_value(text, "test_seconds_bucket", view="books", le="0.005"), 1
+        )
+        self.assertEqual(
+            metric_value(text, "test_seconds_bucket", view="books", le="0.25"), 2
+        )
+        self.assertAlmostEqual(
+            metric_value(text, "test_seconds_sum", view="books"), 0.203
+        )
+
+    def test_files_of_exited_processes_are_archived(self):
+        exited = []
+        for latency in (0.003, 0.2):
+            process = subprocess.Popen([sys.executable, "-c", ""])
+            process.wait()
+            worker = metrics.Registry()
+            worker._file = f"{process.pid}-{uuid.uuid4().hex}.json"
+            worker.histogram("test_seconds", "Test", ["view"]).observe(latency, "books")
+            worker.flush()
+            exited.append(worker)
+        live = metrics.Registry()
+        live.histogram("test_seconds", "Test", ["view"]).observe(0.01, "books")
+
+        for _ in range(2):
+            text = live.render()
+            self.assertEqual(metric_value(text, "test_seconds_count", view="books"), 3)
+            self.assertAlmostEqual(
+                metric_value(text, "test_seconds_sum", view="books"), 0.213
+            )
+        files = set(os.listdir(settings.METRICS_DIR))
+        self.assertLessEqual({metrics.ARCHIVE_FILE, live._file}, files)
+        self.assertFalse(files & {worker._file for worker in exited})
+
+    @mock.patch.object(metrics, "fcntl", None)
+    def test_files_are_kept_without_file_locks(self):
+        worker = metrics.Registry()
+        worker._file = "999999999-gone.json"
+        worker.histogram("test_seconds", "Test").observe(0.1)
+        worker.flush()
+
+        worker.render()
+
+        self.assertIn(worker._file, os.listdir(settings.METRICS_DIR))
+
+    @override_settings(METRICS_FLUSH_SECONDS=0.01)
+    def test_observations_are_flushed_in_the_background(self):
+        worker = metrics.Registry()
+        path = os.path.join(settings.METRICS_DIR, worker._file)
+
+        with mock.patch.object(worker, "flush", wraps=worker.flush) as flush:
+            worker.histogram("test_seconds", "Test").observe(0.1)
+            flush.assert_not_called()
+            for _ in range(500):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.01)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertNotEqual(flush.call_args_list, [])
+        self.assertFalse(worker._changed)
+
+    def test_scrapes_are_only_answered_for_allowed_clients(self):
+        res = self.client.get("/metrics", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            res = self.client.get(
+                "/metrics", REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer no"
+            )
+            self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+            res = self.client.get(
+                "/metrics",
+                REMOTE_ADDR="203.0.113.7",
+                HTTP_AUTHORIZATION="Bearer secret",
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_telegram_send_time_is_recorded(self):
+        before = metric_value(
+            self.scrape(),
+            "library_telegram_send_duration_seconds_count",
+            call="message",
+        )
+
+        with mock.patch.object(telegram_helper._background, "run"):
+            telegram_helper.send_telegram_message("hello")
+
+        self.assertEqual(
+            metric_value(
+                self.scrape(),
+                "library_telegram_send_duration_seconds_count",
+                call="message",
+            ),
+            before + 1,
+        )
+
+
+class BenchmarkTests(TestCase):
+    def test_nested_query_tracking_adds_to_outer_blocks(self):
+        with track_queries() as outer:
+            Book.objects.count()
+            with track_queries() as inner:
+                Book.objects.count()
+
+        self.assertEqual((outer.count, inner.count), (2, 1))
+        self.assertGreaterEqual(outer.duration, inner.duration)
+
+    def test_regressions_beyond_tolerance_are_flagged(self):
+        baseline = {
+            "book-list": {"throughput": 100, "p99_ms": 10, "queries_per_request": 2},
+            "removed": {"throughput": 100},
+        }
+        results = {
+            "book-list": {"throughput": 85, "p99_ms": 12, "queries_per_request": 2},
+            "added": {"throughput": 1},
+        }
+
+        self.assertEqual(find_regressions(results, baseline, 0.25), [])
+        self.assertEqual(
+            find_regressions(results, baseline, 0.1),
+            [("book-list", "throughput", 100, 85), ("book-list", "p99_ms", 10, 12)],
+        )
+
+    def test_any_change_of_queries_is_a_regression(self):
+        self.assertEqual(
+            find_regressions(
+                {"borrowing-list": {"queries_per_request": 2.02}},
+                {"borrowing-list": {"queries_per_request": 2}},
+                0.5,
+            ),
+            [("borrowing-list", "queries_per_request", 2, 2.02)],
+        )
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttle_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(throttle_dir.cleanup)
+        self.path = os.path.join(throttle_dir.name, "throttle.sqlite3")
+        overrider = override_settings(THROTTLE_DATABASE=self.path)
+        overrider.enable()
+        self.addCleanup(overrider.disable)
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate("10/min"), (10, 10 / 60))
+        self.assertEqual(throttling.parse_rate("5/hour burst 10"), (10, 5 / 3600))
+        self.assertEqual(throttling.parse_rate("2/s"), (2, 2))
+        for rate in ("0/min", "10/fortnight", "10 per minute"):
+            with self.assertRaises(ImproperlyConfigured):
+                throttling.parse_rate(rate)
+
+    def test_bucket_allows_burst_then_throttles(self):
+        for _ in range(3):
+            self.assertEqual(throttling.store.take("key", 3, 0.5, now=1000), 0)
+
+        self.assertEqual(throttling.store.take("key", 3, 0.5, now=1000), 2)
+
+    def test_bucket_refills_at_rate(self):
+        throttling.store.take("key", 1, 0.5, now=1000)
+
+        self.assertEqual(throttling.store.take("key", 1, 0.5, now=1001), 1)
+        self.assertEqual(throttling.store.take("key", 1, 0.5, now=1002), 0)
+
+    def test_refill_stops_at_burst(self):
+        throttling.store.take("key", 2, 1, now=1000)
+
+        self.assertEqual(throttling.store.take("key", 2, 1, now=2000), 0)
+        self.assertEqual(throttling.store.take("key", 2, 1, now=2000), 0)
+        self.assertEqual(throttling.store.take("key", 2, 1, now=2000), 1)
+
+    def test_buckets_are_separate_per_key(self):
+        throttling.store.take("a", 1, 1, now=1000)
+
+        self.assertEqual(throttling.store.take("b", 1, 1, now=1000), 0)
+
+    def test_no_token_is_taken_unless_every_bucket_has_one(self):
+        throttling.store.take("drained", 1, 1, now=1000)
+
+        self.assertEqual(
+            throttling.store.take_all([("a", 2, 1), ("drained", 1, 1)], now=1000),
+            1,
+        )
+        self.assertEqual(throttling.store.take("a", 2, 1, now=1000), 0)
+        self.assertEqual(throttling.store.take("a", 2, 1, now=1000), 0)
+        self.assertEqual(
+            throttling.store.take_all([("a", 2, 1), ("b", 1, 1)], now=1000), 1
+        )
+        self.assertEqual(throttling.store.take("b", 1, 1, now=1000), 0)
+
+    def test_buckets_are_shared_by_connections(self):
+        throttling.store.take("key", 1, 1, now=1000)
+        waits = []
+        thread = threading.Thread(
+            target=lambda: waits.append(throttling.store.take("key", 1, 1, now=1000))
+        )
+        thread.start()
+        thread.join()
+
+        self.assertEqual(waits, [1])
+
+    @mock.patch.object(throttling, "PRUNE_SECONDS", 0)
+    def test_full_buckets_are_pruned(self):
+        throttling.store.take("full", 2, 1, now=1000)
+        throttling.store.take("drained", 2, 1, now=1001.5)
+        throttling.store.take("drained", 2, 1, now=1001.5)
+
+        with sqlite3.connect(self.path) as connection:
+            keys = connection.execute("SELECT key FROM throttle_bucket").fetchall()
+        self.assertEqual(keys, [("drained",)])
+
+    def test_unreadable_store_lets_requests_through(self):
+        with override_settings(THROTTLE_DATABASE=os.path.dirname(self.path)):
+            for _ in range(3):
+                self.assertEqual(throttling.store.take("key", 1, 1, now=1000), 0)
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_per_process_cache_fails_the_deploy_check(self):
+        self.assertEqual(
+            [error.id for error in checks.check_shared_cache(None)],
+            ["library_service.E001"],
+        )
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "library_service_cache",
+            }
+        }
+    )
+    def test_shared_cache_passes(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
@@ -0,0 +1,190 @@
+"""
+Token-bucket throttling with buckets shared by all worker processes.
+
+A bucket holds up to its burst of tokens and refills at its rate; every
+request takes one token, and is throttled while the bucket is empty. Each
+bucket is a single row of an SQLite table in ``settings.THROTTLE_DATABASE``,
+refilled and debited by one UPSERT, so a check costs the same whatever the
+rate and window, and every process sees the same buckets. The buckets of a
+request are debited in one transaction, which is rolled back if any of them
+is empty, so a throttled request takes no token. Buckets that have
+refilled to their burst are the same as missing ones and are pruned.
+"""
+
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+RATE = re.compile(
+    r"(?P<tokens>\d+)/(?P<period>s|sec|second|m|min|minute|h|hour|d|day)"
+    r"(?:\s+burst\s+(?P<burst>\d+))?"
+)
+PERIOD_SECONDS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+# Seconds a process waits for another one's write before letting a request
+# through unthrottled.
+LOCK_TIMEOUT = 0.5
+PRUNE_SECONDS = 60
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS throttle_bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    full_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+# Refill the bucket for the time since its last request and take a token;
+# returns no row if the bucket had less than one. Every expression of the
+# update reads the stored values.
+TAKE_SQL = """
+INSERT INTO throttle_bucket (key, tokens, updated, full_at)
+VALUES (:key, :burst - 1, :now, :now + 1 / :rate)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:burst, tokens + max(:now - updated, 0) * :rate) - 1,
+    updated = :now,
+    full_at = :now
+        + (:burst + 1 - min(:burst, tokens + max(:now - updated, 0) * :rate))
+        / :rate
+WHERE min(:burst, tokens + max(:now - updated, 0) * :rate) >= 1
+RETURNING tokens
+"""
+LEVEL_SQL = """
+SELECT min(:burst, tokens + max(:now - updated, 0) * :rate)
+FROM throttle_bucket WHERE key = :key
+"""
+PRUNE_SQL = "DELETE FROM throttle_bucket WHERE full_at <= :now"
+
+
+@functools.lru_cache
+def parse_rate(rate):
+    """
+    (burst, tokens per second) of a rate like ``"10/min"``, which refills 10
+    tokens a minute up to 10, or ``"10/min burst 30"``, which holds up to 30
+    """
+    match = RATE.fullmatch(rate.strip())
+    if match is None or int(match["tokens"]) < 1:
+        raise ImproperlyConfigured(f"Invalid throttle rate: {rate!r}")
+    tokens = int(match["tokens"])
+    burst = int(match["burst"] or tokens)
+    return max(burst, 1), tokens / PERIOD_SECONDS[match["period"][0]]
+
+
+class BucketStore:
+    """Token buckets in the SQLite file at ``settings.THROTTLE_DATABASE``"""
+
+    def __init__(self):
+        self._reset()
+        # A forked server worker must not share its parent's connections.
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        path = settings.THROTTLE_DATABASE
+        local = self._local
+        if getattr(local, "path", None) != path:
+            if getattr(local, "connection", None) is not None:
+                local.connection.close()
+            connection = sqlite3.connect(
+                path, timeout=LOCK_TIMEOUT, isolation_level=None
+            )
+            # Buckets are cheap to lose, so writes are not synced to disk.
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(SCHEMA_SQL)
+            local.connection = connection
+            local.path = path
+            local.pruned_at = time.monotonic()
+        return local.connection
+
+    def take(self, key, burst, rate, now=None):
+        """
+        Take a token of the ``key`` bucket; returns 0 if there was one,
+        otherwise the seconds until there is
+        """
+        return self.take_all([(key, burst, rate)], now=now)
+
+    def take_all(self, buckets, now=None):
+        """
+        Take a token of every ``(key, burst, rate)`` bucket if each has one
+        and return 0, otherwise take none and return the seconds until the
+        first empty bucket has one
+        """
+        now = time.time() if now is None else now
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for key, burst, rate in buckets:
+                    params = {"key": key, "burst": burst, "rate": rate, "now": now}
+                    if not connection.execute(TAKE_SQL, params).fetchall():
+                        (level,) = connection.execute(LEVEL_SQL, params).fetchone() or (
+                            0,
+                        )
+                        return max(1 - level, 0) / rate
+                self._prune(connection, now)
+                connection.execute("COMMIT")
+            finally:
+                # Puts back the tokens of the buckets before an empty one.
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+        except sqlite3.Error:
+            # A busy or broken store must not take the API down with it.
+            return 0
+        return 0
+
+    def _prune(self, connection, now):
+        if time.monotonic() - self._local.pruned_at >= PRUNE_SECONDS:
+            self._local.pruned_at = time.monotonic()
+            connection.execute(PRUNE_SQL, {"now": now})
+
+    def clear(self):
+        self._connection().execute("DELETE FROM throttle_bucket")
+
+
+store = BucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle a view by the buckets of its ``throttle_scope`` in
+    ``settings.THROTTLE_BUCKETS``: a bucket per user, per client IP and for
+    the whole endpoint, for each of them that the scope has a rate for. A
+    request is allowed if each of its buckets has a token, and then takes
+    one of each; anonymous requests have no user bucket.
+    """
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        scope = getattr(view, "throttle_scope", None)
+        buckets = []
+        for kind, rate in settings.THROTTLE_BUCKETS.get(scope, {}).items():
+            ident = self.get_bucket_ident(kind, request)
+            if ident is None:
+                continue
+            buckets.append((f"{scope}:{kind}:{ident}", *parse_rate(rate)))
+        if buckets:
+            self.wait_seconds = store.take_all(buckets)
+        return not self.wait_seconds
+
+    def get_bucket_ident(self, kind, request):
+        if kind == "user":
+            user = request.user
+            return user.pk if user and user.is_authenticated else None
+        if kind == "ip":
+            return self.get_ident(request)
+        if kind == "endpoint":
+            return "*"
+        raise ImproperlyConfigured(f"Unknown throttle bucket: {kind!r}")
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,28 @@
+"""
+URL configuration of the ASGI application (``settings.ASGI_URLCONF``).
+
+It serves the URLs of ``library_service.urls``, with the book and
+borrowing viewsets registered to serve their reads as async views.
+"""
+
+from django.urls import include, path
+
+from book_service.urls import router as book_router
+from borrowing.urls import router as borrowing_router
+from library_service.asyncviews import async_router
+from library_service.urls import urlpatterns as sync_urlpatterns
+
+ASYNC_ROUTERS = {"book": book_router, "borrowing": borrowing_router}
+
+urlpatterns = [
+    path("api/book-service/", include((async_router(book_router).urls, "book"))),
+    path(
+        "api/borrowing-service/",
+        include((async_router(borrowing_router).urls, "borrowing")),
+    ),
+    *(
+        pattern
+        for pattern in sync_urlpatterns
+        if getattr(pattern, "namespace", None) not in ASYNC_ROUTERS
+    ),
+]
@@ -1,3 +1,5 @@
 from django.contrib import admin
 
-# Register your models here.
+from telegram_bot.models import NotificationOutbox
+
+admin.site.register(NotificationOutbox)
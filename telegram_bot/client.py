@@ -0,0 +1,213 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+
+import aiohttp
+
+# Telegram allows about 30 messages per second per bot and one message per
+# second in a single chat; group chats are further limited to 20 per minute.
+# Notifications usually go to a group, so by default a chat gets one message
+# at once and 19 more a minute: a bucket sends at most burst + rate * 60
+# messages in any minute, here the group limit of 20. A private chat can use
+# TELEGRAM_CHAT_RATE=1 (per second) and a TELEGRAM_CHAT_BURST of a few.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 19 / 60))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "1"))
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "10"))
+
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n"
+MAX_RETRY_AFTER_ATTEMPTS = 3
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Async token bucket refilled at ``rate`` tokens per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        current_time = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (current_time - self.updated_at) * self.rate,
+        )
+        self.updated_at = current_time
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+def coalesce(items: list, text=lambda item: item, limit: int = MAX_MESSAGE_LENGTH):
+    """
+    Group consecutive items into digests whose joined text fits one message.
+
+    ``text`` extracts the message text from an item. An item that is too
+    long on its own gets a digest of its own and is truncated on send.
+    """
+    groups = []
+    current = []
+    length = 0
+    for item in items:
+        size = len(text(item))
+        if current and length + len(DIGEST_SEPARATOR) + size > limit:
+            groups.append(current)
+            current = []
+        length = size if not current else length + len(DIGEST_SEPARATOR) + size
+        current.append(item)
+    if current:
+        groups.append(current)
+    return groups
+
+
+class TelegramClient:
+    """
+    Bot API client sharing one aiohttp connection pool.
+
+    Every request takes a token from the global bucket and from the bucket
+    of its chat, so bursts are smoothed instead of rejected with 429.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        api_url: str,
+        timeout: float,
+        max_connections: int = TELEGRAM_MAX_CONNECTIONS,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: int = TELEGRAM_CHAT_BURST,
+    ):
+        self.base_url = f"{api_url}/bot{token}"
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, max(1, int(global_rate)))
+        self.chat_buckets = {}
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        if chat_id not in self.chat_buckets:
+            self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self.chat_buckets[chat_id]
+
+    async def send_message(self, chat_id, text: str) -> None:
+        for _ in range(MAX_RETRY_AFTER_ATTEMPTS):
+            await self._chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            async with self.session.post(
+                f"{self.base_url}/sendMessage",
+                data={"chat_id": chat_id, "text": text},
+            ) as response:
+                if response.status == 200:
+                    return
+                body = await response.text()
+                if response.status != 429:
+                    raise TelegramError(f"Error sending message: {body}")
+                retry_after = await self._retry_after(response)
+            await asyncio.sleep(retry_after)
+        raise TelegramError(f"Error sending message: {body}")
+
+    @staticmethod
+    async def _retry_after(response) -> float:
+        try:
+            payload = await response.json(content_type=None)
+            return float(payload["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return 1.0
+
+    async def send_digest(self, chat_id, texts: list[str]) -> int:
+        """Send texts coalesced into digests, returning the digest count"""
+        groups = coalesce(texts)
+        for group in groups:
+            digest = DIGEST_SEPARATOR.join(group)
+            await self.send_message(chat_id, digest[:MAX_MESSAGE_LENGTH])
+        return len(groups)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class BackgroundLoop:
+    """
+    Event loop on a daemon thread that lets synchronous code drive one
+    long-lived ``TelegramClient`` and reuse its connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._client = None
+        self._client_key = None
+        atexit.register(self.close)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked worker inherits the object but not the thread.
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._client = None
+                self._client_key = None
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="telegram-client",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def client(self, token: str, api_url: str, timeout: float) -> TelegramClient:
+        key = (token, api_url, timeout)
+        loop = self._ensure_loop()
+        with self._lock:
+            if self._client_key != key:
+                if self._client is not None:
+                    asyncio.run_coroutine_threadsafe(self._client.close(), loop)
+                self._client = TelegramClient(token, api_url, timeout)
+                self._client_key = key
+            return self._client
+
+    def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(
+                timeout=5
+            )
+            self._client = None
+            self._client_key = None
+
+    def run(self, coroutine_factory):
+        """Run ``coroutine_factory()`` on the loop and wait for its result"""
+        loop = self._ensure_loop()
+
+        async def runner():
+            return await coroutine_factory()
+
+        return asyncio.run_coroutine_threadsafe(runner(), loop).result()
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from telegram_bot.client import TelegramClient
+from telegram_bot.stub_server import StubTelegramServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Telegram delivery throughput against a local fake Bot API: "
+        "one requests.post per message, the pooled async client and digests"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=20,
+            help="Fake Bot API response time in milliseconds",
+        )
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=10_000,
+            help="Token bucket rate; lower it to see the limiter in effect",
+        )
+
+    def handle(self, *args, **options):
+        texts = [f"New Borrowing Created: #{i}" for i in range(options["messages"])]
+        with StubTelegramServer(latency=options["latency"] / 1000) as server:
+            self.report("requests.post", texts, self.legacy, server.url, options)
+            self.report("pooled client", texts, self.pooled, server.url, options)
+            self.report("digests", texts, self.digests, server.url, options)
+
+    def report(self, label, texts, runner, url, options):
+        started = time.perf_counter()
+        requests_made = runner(texts, url, options)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label}: {len(texts) / elapsed:.0f} messages/s "
+            f"({requests_made} HTTP requests in {elapsed:.2f}s)"
+        )
+
+    @staticmethod
+    def legacy(texts, url, options):
+        for text in texts:
+            requests.post(
+                f"{url}/botbench/sendMessage", data={"chat_id": 1, "text": text}
+            )
+        return len(texts)
+
+    @staticmethod
+    def client(url, options):
+        return TelegramClient(
+            "bench",
+            url,
+            timeout=10,
+            max_connections=options["concurrency"],
+            global_rate=options["rate"],
+            chat_rate=options["rate"],
+            chat_burst=options["concurrency"],
+        )
+
+    def pooled(self, texts, url, options):
+        async def run():
+            client = self.client(url, options)
+            semaphore = asyncio.Semaphore(options["concurrency"])
+
+            async def send(text):
+                async with semaphore:
+                    await client.send_message(1, text)
+
+            await asyncio.gather(*(send(text) for text in texts))
+            await client.close()
+
+        asyncio.run(run())
+        return len(texts)
+
+    def digests(self, texts, url, options):
+        async def run():
+            client = self.client(url, options)
+            sent = await client.send_digest(1, texts)
+            await client.close()
+            return sent
+
+        return asyncio.run(run())
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from telegram_bot import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Telegram notifications from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=outbox.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=outbox.DEFAULT_MAX_ATTEMPTS,
+            help="Attempts before a message is dead-lettered",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=outbox.DEFAULT_BACKOFF_SECONDS,
+            help="Base retry delay in seconds, doubled on every failure",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the currently due messages and exit",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            counts = outbox.dispatch_batch(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                backoff_seconds=options["backoff"],
+            )
+            processed = sum(counts.values())
+            if processed:
+                self.stdout.write(
+                    f"sent={counts['sent']} "
+                    f"retry={counts['pending']} "
+                    f"dead={counts['dead']}"
+                )
+            if processed < options["batch_size"]:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
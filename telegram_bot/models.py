@@ -1,3 +1,37 @@
+import enum
+
 from django.db import models
+from django.utils.timezone import now
+
+
+class OutboxStatus(enum.Enum):
+    pending = "PENDING"
+    sent = "SENT"
+    dead = "DEAD"
+
+
+class NotificationOutbox(models.Model):
+    """Telegram message waiting to be delivered by the dispatcher."""
+
+    text = models.TextField()
+    status = models.CharField(
+        max_length=7,
+        choices=[(tag.name, tag.value) for tag in OutboxStatus],
+        default=OutboxStatus.pending.name,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="outbox_status_next_attempt_idx",
+            ),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.get_status_display()} notification #{self.pk}"
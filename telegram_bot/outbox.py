@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from telegram_bot import telegram_helper
+from telegram_bot.client import coalesce
+from telegram_bot.models import NotificationOutbox, OutboxStatus
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 3600
+LEASE_SECONDS = 60
+
+
+def enqueue_telegram_message(text: str) -> NotificationOutbox:
+    """Store a message for the dispatcher, in the caller's transaction"""
+    return NotificationOutbox.objects.create(text=text)
+
+
+def enqueue_telegram_messages(texts: list[str]) -> list[NotificationOutbox]:
+    """Store several messages with a single INSERT"""
+    return NotificationOutbox.objects.bulk_create(
+        NotificationOutbox(text=text) for text in texts
+    )
+
+
+def backoff_delay(attempts: int, base_seconds: float) -> timedelta:
+    """Exponential backoff: base, 2 * base, 4 * base, ... capped"""
+    seconds = min(base_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=seconds)
+
+
+def claim_batch(batch_size: int = DEFAULT_BATCH_SIZE) -> list[NotificationOutbox]:
+    """
+    Lease due pending messages so that concurrent dispatchers skip them.
+
+    The lease is a short write transaction; delivery happens after it
+    commits, so no lock is held while waiting on Telegram.
+    """
+    current_time = now()
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=OutboxStatus.pending.name,
+                next_attempt_at__lte=current_time,
+            )
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        NotificationOutbox.objects.filter(
+            id__in=[message.id for message in batch]
+        ).update(next_attempt_at=current_time + timedelta(seconds=LEASE_SECONDS))
+    return batch
+
+
+def deliver(
+    messages: list[NotificationOutbox],
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+) -> list[str]:
+    """
+    Send leased messages as one digest and record the outcome of each.
+
+    Returns the resulting status of every message.
+    """
+    try:
+        telegram_helper.send_telegram_digest([message.text for message in messages])
+    except Exception as e:
+        error = str(e)
+    else:
+        error = None
+
+    current_time = now()
+    for message in messages:
+        message.attempts += 1
+        if error is None:
+            message.status = OutboxStatus.sent.name
+            message.sent_at = current_time
+        else:
+            message.last_error = error
+            if message.attempts >= max_attempts:
+                message.status = OutboxStatus.dead.name
+            else:
+                message.next_attempt_at = current_time + backoff_delay(
+                    message.attempts, backoff_seconds
+                )
+    NotificationOutbox.objects.bulk_update(
+        messages,
+        ["attempts", "status", "sent_at", "last_error", "next_attempt_at"],
+    )
+    return [message.status for message in messages]
+
+
+def dispatch_batch(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+) -> dict[str, int]:
+    """
+    Drain one batch of the outbox, coalescing it into digest messages.
+
+    Returns counts of messages per resulting status.
+    """
+    counts = {tag.name: 0 for tag in OutboxStatus}
+    batch = claim_batch(batch_size)
+    for group in coalesce(batch, text=lambda message: message.text):
+        for status in deliver(group, max_attempts, backoff_seconds):
+            counts[status] += 1
+    return counts
@@ -0,0 +1,86 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Pooled clients drop idle keep-alive connections on shutdown.
+        pass
+
+
+class StubTelegramServer:
+    """
+    Local stand-in for the Telegram Bot API, used by tests and benchmarks.
+
+    Accepts ``sendMessage`` calls, records their payloads and answers after
+    ``latency`` seconds. The next ``fail_next`` calls are answered with 500.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_next: int = 0):
+        self.latency = latency
+        self.fail_next = fail_next
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode()
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    failing = stub.fail_next > 0
+                    if failing:
+                        stub.fail_next -= 1
+                    else:
+                        payload = {
+                            key: values[0] for key, values in parse_qs(body).items()
+                        }
+                        stub.messages.append(payload)
+                if failing:
+                    self._reply(500, b'{"ok": false}')
+                else:
+                    self._reply(200, b'{"ok": true, "result": {}}')
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,16 +1,31 @@
-import requests
 import os
 from dotenv import load_dotenv
 
+from library_service.metrics import TELEGRAM_SECONDS
+from telegram_bot.client import BackgroundLoop
+
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
+
+_background = BackgroundLoop()
+
+
+def _client():
+    return _background.client(TELEGRAM_TOKEN, TELEGRAM_API_URL, TELEGRAM_TIMEOUT)
 
 
 def send_telegram_message(text: str) -> None:
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text}
-    response = requests.post(url, data=payload)
-    if response.status_code != 200:
-        raise Exception(f"Error sending message: {response.text}")
+    client = _client()
+    with TELEGRAM_SECONDS.time("message"):
+        _background.run(lambda: client.send_message(TELEGRAM_CHAT_ID, text))
+
+
+def send_telegram_digest(texts: list[str]) -> int:
+    """Send a burst of messages coalesced into as few digests as possible"""
+    client = _client()
+    with TELEGRAM_SECONDS.time("digest"):
+        return _background.run(lambda: client.send_digest(TELEGRAM_CHAT_ID, texts))
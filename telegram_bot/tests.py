@@ -1,3 +1,114 @@
-from django.test import TestCase
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils.timezone import now
+
+from telegram_bot import outbox, telegram_helper
+from telegram_bot import client
+from telegram_bot.client import MAX_MESSAGE_LENGTH, TokenBucket, coalesce
+from telegram_bot.models import NotificationOutbox, OutboxStatus
+from telegram_bot.stub_server import StubTelegramServer
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.server = StubTelegramServer().start()
+        patcher = mock.patch(
+            "telegram_bot.telegram_helper.TELEGRAM_API_URL", self.server.url
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+    def test_dispatch_sends_pending_messages(self):
+        outbox.enqueue_telegram_message("first")
+        outbox.enqueue_telegram_message("second")
+
+        counts = outbox.dispatch_batch()
+
+        self.assertEqual(counts["sent"], 2)
+        self.assertEqual(
+            [message["text"] for message in self.server.messages],
+            ["first\n\nsecond"],
+        )
+        self.assertFalse(
+            NotificationOutbox.objects.exclude(status=OutboxStatus.sent.name).exists()
+        )
+
+    def test_failed_message_is_retried_with_backoff(self):
+        self.server.fail_next = 1
+        message = outbox.enqueue_telegram_message("retry me")
+
+        counts = outbox.dispatch_batch(backoff_seconds=10)
+        message.refresh_from_db()
+
+        self.assertEqual(counts["pending"], 1)
+        self.assertEqual(message.status, OutboxStatus.pending.name)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, now() + timedelta(seconds=5))
+        self.assertEqual(outbox.dispatch_batch()["sent"], 0)
+
+        NotificationOutbox.objects.update(next_attempt_at=now())
+        self.assertEqual(outbox.dispatch_batch()["sent"], 1)
+        self.assertEqual(self.server.messages[0]["text"], "retry me")
+
+    def test_message_is_dead_lettered_after_max_attempts(self):
+        self.server.fail_next = 2
+        message = outbox.enqueue_telegram_message("doomed")
+
+        outbox.dispatch_batch(max_attempts=2)
+        NotificationOutbox.objects.update(next_attempt_at=now())
+        counts = outbox.dispatch_batch(max_attempts=2)
+        message.refresh_from_db()
+
+        self.assertEqual(counts["dead"], 1)
+        self.assertEqual(message.status, OutboxStatus.dead.name)
+        self.assertEqual(message.attempts, 2)
+        self.assertIn("Error sending message", message.last_error)
+        self.assertEqual(self.server.messages, [])
+
+    def test_batch_size_limits_claimed_messages(self):
+        for i in range(3):
+            outbox.enqueue_telegram_message(f"message {i}")
+
+        self.assertEqual(outbox.dispatch_batch(batch_size=2)["sent"], 2)
+        self.assertEqual(outbox.dispatch_batch(batch_size=2)["sent"], 1)
+
+    def test_sync_facade_reuses_client(self):
+        telegram_helper.send_telegram_message("one")
+        telegram_helper.send_telegram_message("two")
+
+        self.assertIs(telegram_helper._client(), telegram_helper._client())
+        self.assertEqual(
+            [message["text"] for message in self.server.messages], ["one", "two"]
+        )
+
+
+class TelegramClientTests(SimpleTestCase):
+    def test_coalesce_respects_message_limit(self):
+        texts = ["a" * 3000, "b" * 1000, "c" * 100, "d" * 10]
+
+        groups = coalesce(texts)
+
+        self.assertEqual(groups, [["a" * 3000, "b" * 1000], ["c" * 100, "d" * 10]])
+        for group in groups:
+            self.assertLessEqual(len("\n\n".join(group)), MAX_MESSAGE_LENGTH)
+
+    def test_token_bucket_limits_rate(self):
+        async def acquire_many():
+            bucket = TokenBucket(rate=50, capacity=1)
+            started = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(acquire_many()), 0.09)
+
+    def test_chats_stay_within_the_group_limit_by_default(self):
+        telegram = client.TelegramClient("token", "http://telegram.test", timeout=1)
+        chat = telegram._chat_bucket("-100")
+
+        self.assertLessEqual(chat.capacity + chat.rate * 60, 20)
@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Per-process LRU cache of users whose entries expire after ``ttl``
+    seconds.
+
+    Writes in this process invalidate their user; the TTL bounds how long
+    other processes may serve the previous state.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(str(user_id))
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[str(user_id)]
+                return None
+            self._entries.move_to_end(str(user_id))
+            return user
+
+    def set(self, user_id, user, generation: int) -> None:
+        """
+        Store ``user`` loaded while the cache was at ``generation``; it is
+        dropped if an invalidation happened in the meantime.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[str(user_id)] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(str(user_id))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(str(user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication resolving users from ``user_cache``"""
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            generation = user_cache.generation
+            user = super().get_user(validated_token)
+            user_cache.set(
+                validated_token[api_settings.USER_ID_CLAIM], user, generation
+            )
+
+        # Requests get their own instance so that nothing set on it leaks
+        # into the cache or into concurrent requests.
+        return copy.copy(user)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views; only cache misses leave the loop"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            return await sync_to_async(self.authenticate)(request)
+        return copy.copy(user), validated_token
+
+    def get_cached_user(self, validated_token):
+        """The cached user of the token, or None when it is not cached"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if (
+            user is not None
+            and api_settings.CHECK_REVOKE_TOKEN
+            and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Documents CachedJWTAuthentication like the plain JWT authentication"""
+
+    target_class = CachedJWTAuthentication
@@ -0,0 +1,118 @@
+"""
+Password hashing off the request thread.
+
+Hashing and verification run in a bounded process pool, so a login storm
+uses at most PASSWORD_HASHING_WORKERS cores and cannot starve the other
+endpoints. At most PASSWORD_HASHING_QUEUE operations wait for a worker;
+beyond that ``PasswordHashingBusy`` is raised at once, which the API views
+and ``PasswordHashingBusyMiddleware`` answer with 503.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PasswordHashingBusy(Exception):
+    """Every worker of the pool is busy and its queue is full"""
+
+
+class HashingPool:
+    """
+    Process pool admitting at most ``workers + queue_size`` operations.
+
+    With no workers, operations run inline on the calling thread.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(workers + queue_size, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A forked server worker must not reuse its parent's pool.
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            return self.executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+
+pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+
+
+def make_password(password) -> str:
+    """``django.contrib.auth.hashers.make_password`` run in the pool"""
+    if password is None:
+        return hashers.make_password(None)
+    hasher = hashers.get_hasher()
+    args = (password, hasher.salt())
+    if isinstance(hasher, hashers.PBKDF2PasswordHasher):
+        # Resolved here so that workers do not depend on settings.
+        args += (hasher.iterations,)
+    return pool.run(hasher.encode, *args)
+
+
+def check_password(password, encoded, setter=None) -> bool:
+    """
+    ``django.contrib.auth.hashers.check_password`` run in the pool.
+
+    ``setter`` is called with the password when the hash was made with
+    other hasher settings than the current ones.
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    preferred = hashers.get_hasher()
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = pool.run(hasher.verify, password, encoded)
+
+    # As Django does, a wrong password costs as much as one hashed with the
+    # current settings, so that their change does not show in the timing.
+    if not is_correct and not hasher_changed and must_update:
+        harden_runtime(hasher, password, encoded)
+    if is_correct and must_update and setter is not None:
+        setter(password)
+    return is_correct
+
+
+def harden_runtime(hasher, password, encoded):
+    """``hasher.harden_runtime`` run in the pool"""
+    if isinstance(hasher, hashers.PBKDF2PasswordHasher):
+        # The iteration count is resolved here, as in ``make_password``.
+        decoded = hasher.decode(encoded)
+        extra_iterations = hasher.iterations - decoded["iterations"]
+        if extra_iterations > 0:
+            pool.run(hasher.encode, password, decoded["salt"], extra_iterations)
+    else:
+        pool.run(hasher.harden_runtime, password, encoded)
@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from borrowing.views import BorrowingViewSet
+from library_service.benchmarking import isolated_database
+from user.authentication import CachedJWTAuthentication, user_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second on the borrowing list with the plain "
+        "and the cached JWT authentication"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            user = get_user_model().objects.create_user(
+                email="reader@bench.local", password="!"
+            )
+            book = Book.objects.create(
+                title="bench", author="bench", cover="hard", inventory=1, daily_fee=1
+            )
+            Borrowing.objects.create(
+                book=book, user=user, expected_return_date=now().date() + timedelta(7)
+            )
+            client = APIClient()
+            client.credentials(
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}"
+            )
+            url = reverse("borrowing:borrowing-list")
+
+            for authentication in (JWTAuthentication, CachedJWTAuthentication):
+                user_cache.clear()
+                with mock.patch.object(
+                    BorrowingViewSet, "authentication_classes", [authentication]
+                ):
+                    client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for _ in range(options["requests"]):
+                            client.get(url)
+                        elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{authentication.__name__}: "
+                    f"{options['requests'] / elapsed:.0f} requests/s, "
+                    f"{len(queries) / options['requests']:.1f} queries/request"
+                )
@@ -0,0 +1,121 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.timezone import now
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from library_service.benchmarking import format_summary, isolated_database, summarize
+from user import hashing
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure token endpoint throughput and latency under a login storm "
+        "while borrowings are read concurrently, with inline and pooled "
+        "password hashing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--login-threads", type=int, default=8)
+        parser.add_argument("--read-threads", type=int, default=4)
+        parser.add_argument(
+            "--workers", type=int, default=settings.PASSWORD_HASHING_WORKERS
+        )
+        parser.add_argument(
+            "--queue", type=int, default=settings.PASSWORD_HASHING_QUEUE
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            credentials = {"email": "login@bench.local", "password": "Bench1234!"}
+            get_user_model().objects.create_user(**credentials)
+            reader = get_user_model().objects.create_user(email="reader@bench.local")
+            book = Book.objects.create(
+                title="bench", author="bench", cover="hard", inventory=1, daily_fee=1
+            )
+            Borrowing.objects.create(
+                book=book, user=reader, expected_return_date=now().date() + timedelta(7)
+            )
+
+            for label, pool in (
+                ("inline", hashing.HashingPool(workers=0, queue_size=0)),
+                (
+                    f"pool of {options['workers']}+{options['queue']}",
+                    hashing.HashingPool(options["workers"], options["queue"]),
+                ),
+            ):
+                with mock.patch.object(hashing, "pool", pool):
+                    results = self.run_load(credentials, reader, options)
+                pool.shutdown()
+                self.report(label, results, options["duration"])
+
+    def run_load(self, credentials, reader, options):
+        results = {"token": [], "rejected": 0, "read": []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+
+        def login():
+            client = APIClient()
+            url = reverse("user:token_get")
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    res = client.post(url, credentials)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if res.status_code == 200:
+                            results["token"].append(elapsed)
+                        else:
+                            results["rejected"] += 1
+            finally:
+                connection.close()
+
+        def read():
+            client = APIClient()
+            client.force_authenticate(reader)
+            url = reverse("borrowing:borrowing-list")
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    client.get(url)
+                    with lock:
+                        results["read"].append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=login) for _ in range(options["login_threads"])
+        ]
+        threads += [
+            threading.Thread(target=read) for _ in range(options["read_threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, label, results, duration):
+        self.stdout.write(f"{label}:")
+        if results["token"]:
+            self.stdout.write(
+                "  "
+                + format_summary("tokens", summarize(results["token"]))
+                + f" ({len(results['token']) / duration:.1f}/s, "
+                f"{results['rejected'] / duration:.1f} rejected/s)"
+            )
+        self.stdout.write(
+            "  "
+            + format_summary("borrowing reads", summarize(results["read"]))
+            + f" ({len(results['read']) / duration:.0f}/s)"
+        )
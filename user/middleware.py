@@ -0,0 +1,20 @@
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from user.hashing import PasswordHashingBusy
+
+
+class PasswordHashingBusyMiddleware(MiddlewareMixin):
+    """
+    Answer a saturated hashing pool with 503 outside the API views, e.g. on
+    admin logins, which reach it through ``ModelBackend``
+    """
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashingBusy):
+            return HttpResponse(
+                "Too many password operations in progress, try again later.",
+                status=503,
+                content_type="text/plain",
+            )
+        return None
@@ -1,3 +1,253 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user import hashing
+from user.authentication import UserCache, user_cache
+from user.hashing import HashingPool
+
+ME_URL = reverse("user:manage")
+REGISTER_URL = reverse("user:register")
+TOKEN_URL = reverse("user:token_get")
+FEES_SUMMARY_URL = reverse("borrowing:borrowing-fees-summary")
+
+
+class UserCacheTests(TestCase):
+    def test_entries_expire(self):
+        cache = UserCache(maxsize=10, ttl=0)
+        cache.set(1, "user", cache.generation)
+
+        self.assertIsNone(cache.get(1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = UserCache(maxsize=2, ttl=60)
+        cache.set(1, "first", cache.generation)
+        cache.set(2, "second", cache.generation)
+        cache.get(1)
+        cache.set(3, "third", cache.generation)
+
+        self.assertEqual(cache.get(1), "first")
+        self.assertIsNone(cache.get(2))
+
+    def test_load_overlapping_invalidation_is_not_cached(self):
+        cache = UserCache(maxsize=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate(1)
+        cache.set(1, "stale", generation)
+
+        self.assertIsNone(cache.get(1))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.test", password="Test1234!"
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_user_is_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], "test@test.test")
+
+    def test_requests_get_their_own_user_instance(self):
+        self.client.get(ME_URL)
+        res = self.client.get(ME_URL)
+
+        self.assertIsNot(res.wsgi_request.user, user_cache.get(self.user.id))
+
+    def test_update_through_manage_view_invalidates_cache(self):
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(ME_URL, {"email": "new@test.test"})
+
+        self.assertIsNone(user_cache.get(self.user.id))
+        self.assertEqual(self.client.get(ME_URL).data["email"], "new@test.test")
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_promotion_to_staff_takes_effect(self):
+        res = self.client.get(FEES_SUMMARY_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+
+        res = self.client.get(FEES_SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.credentials = {"email": "test@test.test", "password": "Test1234!"}
+        self.user = get_user_model().objects.create_user(**self.credentials)
+
+    def test_passwords_are_hashed_in_worker_processes(self):
+        self.assertNotEqual(hashing.pool.run(os.getpid), os.getpid())
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(self.user.check_password("Test1234!"))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+    def test_login_rehashes_password_with_new_iterations(self):
+        res = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(self.user.check_password("Test1234!"))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+    def test_failed_login_does_not_rehash(self):
+        self.client.post(TOKEN_URL, {**self.credentials, "password": "wrong"})
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+    def test_failed_check_costs_the_current_iterations(self):
+        with mock.patch.object(hashing.pool, "run", wraps=hashing.pool.run) as run:
+            self.assertFalse(self.user.check_password("wrong"))
+
+        fn, password, _, iterations = run.call_args.args
+        self.assertEqual((fn.__name__, password, iterations), ("encode", "wrong", 1000))
+
+    def test_saturated_pool_rejects_at_once(self):
+        busy = HashingPool(workers=1, queue_size=0)
+        busy._slots.acquire()
+
+        with mock.patch.object(hashing, "pool", busy):
+            login = self.client.post(TOKEN_URL, self.credentials)
+            registration = self.client.post(
+                REGISTER_URL, {"email": "new@test.test", "password": "Test1234!"}
+            )
+
+        self.assertEqual(login.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(registration.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(
+            get_user_model().objects.filter(email="new@test.test").exists()
+        )
+
+    def test_saturated_pool_fails_admin_login_with_503(self):
+        busy = HashingPool(workers=1, queue_size=0)
+        busy._slots.acquire()
+
+        with mock.patch.object(hashing, "pool", busy):
+            res = Client().post(
+                reverse("admin:login"),
+                {"username": "test@test.test", "password": "Test1234!"},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_pool_without_workers_runs_inline(self):
+        self.assertEqual(
+            HashingPool(workers=0, queue_size=0).run(os.getpid), os.getpid()
+        )
+
+
+@override_settings(
+    PASSWORD_HASH_ITERATIONS=1000,
+    THROTTLE_BUCKETS={
+        "token_obtain": {"ip": "2/min", "endpoint": "3/min"},
+        "registration": {"ip": "1/hour"},
+    },
+)
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttle_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(throttle_dir.cleanup)
+        self.path = os.path.join(throttle_dir.name, "throttle.sqlite3")
+        overrider = override_settings(THROTTLE_DATABASE=self.path)
+        overrider.enable()
+        self.addCleanup(overrider.disable)
+        self.client = APIClient()
+        self.credentials = {"email": "test@test.test", "password": "Test1234!"}
+        get_user_model().objects.create_user(**self.credentials)
+
+    def test_login_is_throttled_per_ip(self):
+        for _ in range(2):
+            res = self.client.post(TOKEN_URL, self.credentials)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "30")
+        other_ip = self.client.post(TOKEN_URL, self.credentials, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(other_ip.status_code, status.HTTP_200_OK)
+
+    def test_login_is_throttled_per_endpoint(self):
+        for i in range(3):
+            self.client.post(TOKEN_URL, self.credentials, REMOTE_ADDR=f"10.0.0.{i}")
+
+        res = self.client.post(TOKEN_URL, self.credentials, REMOTE_ADDR="10.0.0.9")
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "20")
+
+    def test_login_throttled_per_endpoint_keeps_its_ip_tokens(self):
+        for i in range(3):
+            self.client.post(TOKEN_URL, self.credentials, REMOTE_ADDR=f"10.0.0.{i}")
+
+        res = self.client.post(TOKEN_URL, self.credentials, REMOTE_ADDR="10.0.0.0")
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        with sqlite3.connect(self.path) as connection:
+            (tokens,) = connection.execute(
+                "SELECT tokens FROM throttle_bucket WHERE key = ?",
+                ["token_obtain:ip:10.0.0.0"],
+            ).fetchone()
+        self.assertAlmostEqual(tokens, 1, places=1)
+
+    def test_failed_logins_take_tokens(self):
+        for _ in range(2):
+            self.client.post(TOKEN_URL, {**self.credentials, "password": "wrong"})
+
+        res = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_registration_is_throttled_per_ip(self):
+        first = self.client.post(
+            REGISTER_URL, {"email": "new@test.test", "password": "Test1234!"}
+        )
+        second = self.client.post(
+            REGISTER_URL, {"email": "other@test.test", "password": "Test1234!"}
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(
+            get_user_model().objects.filter(email="other@test.test").exists()
+        )
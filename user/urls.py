@@ -1,7 +1,7 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
+from rest_framework_simplejwt.views import TokenRefreshView
 
-from user.views import CreateUserView, ManageUserView
+from user.views import CreateUserView, ManageUserView, TokenObtainPairView
 
 urlpatterns = [
     path("", CreateUserView.as_view(), name="register"),
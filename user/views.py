@@ -1,15 +1,41 @@
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt import views as jwt_views
 
+from library_service.throttling import TokenBucketThrottle
+from user.hashing import PasswordHashingBusy
 from user.serializers import UserSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class PasswordHashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many password operations in progress, try again later."
+    default_code = "password_hashing_busy"
+
+
+class PasswordHashingMixin:
+    """Answer a saturated hashing pool with 503, as an API error"""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, PasswordHashingBusy):
+            exc = PasswordHashingUnavailable()
+        return super().handle_exception(exc)
+
+
+class CreateUserView(PasswordHashingMixin, generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "registration"
+
+
+class TokenObtainPairView(PasswordHashingMixin, jwt_views.TokenObtainPairView):
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "token_obtain"
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(PasswordHashingMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 